@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+from server.asgi import create_asgi_app
+
+# Optional ASGI entry point, alongside app.py's WSGI app: `uvicorn asgi:app`. Needs
+# uvicorn and the async driver for the database (aiosqlite, or asyncpg for PostgreSQL).
+app = create_asgi_app()
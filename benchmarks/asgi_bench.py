@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# The same read traffic from --connections concurrent keep-alive connections against
+# gunicorn with sync workers (the default deployment), gunicorn with threaded workers
+# and uvicorn serving asgi.py, each as a real server process on one local SQLite file.
+# Each connection waits --think seconds (on average) between requests, like a browser
+# tab, while --slow clients send their requests a header line every half second, like
+# a phone on a bad network. The mix is one-row reads, keyset pages and ?ids= multi-gets
+# (answered on the async engine under ASGI) plus a sorted listing (handed to the Flask
+# app on its thread pool). Reports throughput, latency percentiles per kind of request,
+# and failed requests (refused, reset or timed-out connections). --think 0 --slow 0
+# measures saturated throughput instead.
+#
+#   python benchmarks/asgi_bench.py [--connections 1000] [--think 5] [--slow 50] [--seconds 20]
+#
+# Needs uvicorn and aiosqlite; the client and the servers share the machine's cores.
+
+# Standard library imports
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORKDIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'bench.db')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.synthetic import generate  # noqa: E402
+
+HOST = '127.0.0.1'
+TIMEOUT = 30
+# A slow client's request takes SLOW_LINES * SLOW_INTERVAL seconds to arrive
+SLOW_LINES = 20
+SLOW_INTERVAL = 0.5
+# Requests are drawn from the first HOT_BOOKS books
+HOT_BOOKS = 5000
+
+
+def urls(rng):
+    ids = lambda count: ','.join(str(rng.randint(1, HOT_BOOKS)) for _ in range(count))
+    return [
+        ('one row', f'/books/{rng.randint(1, HOT_BOOKS)}'),
+        ('keyset page', f'/books?limit=20&after={rng.randint(0, HOT_BOOKS)}'),
+        ('multi-get', f'/books?ids={ids(10)}'),
+        ('sorted (Flask)', '/books?sort=rating&limit=20'),
+    ]
+
+
+def servers(port, workers, threads):
+    # {name: (label, command)}
+    python = sys.executable
+    return {
+        'sync': ('gunicorn, sync workers', [python, '-m', 'gunicorn', 'app:app', '-b', f'{HOST}:{port}', '-w', str(workers),
+                                    '-k', 'sync', '--threads', '1']),
+        'gthread': (f'gunicorn, {threads} threads/worker', [python, '-m', 'gunicorn', 'app:app', '-b', f'{HOST}:{port}',
+                                                 '-w', str(workers), '-k', 'gthread', '--threads', str(threads),
+                                                 '--keep-alive', '30', '--worker-connections', '2000']),
+        'asgi': ('uvicorn, asgi.py', [python, '-m', 'uvicorn', 'asgi:app', '--host', HOST, '--port', str(port),
+                              '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+                              '--timeout-keep-alive', '30', '--backlog', '4096']),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, process):
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'server exited with {process.returncode}')
+        try:
+            with socket.create_connection((HOST, port), timeout=1) as s:
+                s.sendall(b'GET / HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+                if s.recv(12).startswith(b'HTTP/1.1 200'):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit('server did not start')
+
+
+async def client(port, seed, start_at, deadline, think, results):
+    rng = random.Random(seed)
+    reader = writer = None
+    if think:
+        await asyncio.sleep(rng.uniform(0, think))
+    while time.monotonic() < deadline:
+        if writer is None:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                results['failed'] += time.monotonic() >= start_at
+                await asyncio.sleep(0.1)
+                continue
+        kind, url = rng.choice(urls(rng))
+        began = time.perf_counter()
+        try:
+            writer.write(f'GET {url} HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode())
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), TIMEOUT)
+            headers = dict(line.split(': ', 1) for line in head.decode('latin-1').split('\r\n')[1:] if ': ' in line)
+            headers = {name.lower(): value for name, value in headers.items()}
+            await asyncio.wait_for(reader.readexactly(int(headers.get('content-length', 0))), TIMEOUT)
+            ok = head.startswith(b'HTTP/1.1 200')
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            writer.close()
+            reader = writer = None
+            results['failed'] += time.monotonic() >= start_at
+            continue
+        if time.monotonic() >= start_at:
+            if ok:
+                results[kind].append(time.perf_counter() - began)
+            else:
+                results['failed'] += 1
+        # Sync workers close the connection after every response
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+            reader = writer = None
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(port, deadline):
+    # Holds whatever reads its request for SLOW_LINES * SLOW_INTERVAL seconds, over and over
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(HOST, port)
+            writer.write(f'GET /books/1 HTTP/1.1\r\nHost: {HOST}\r\n'.encode())
+            for line in range(SLOW_LINES):
+                await asyncio.sleep(SLOW_INTERVAL)
+                writer.write(f'X-Slow-{line}: 1\r\n'.encode())
+            writer.write(b'Connection: close\r\n\r\n')
+            await asyncio.wait_for(reader.read(), TIMEOUT)
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            await asyncio.sleep(0.1)
+
+
+async def load(port, connections, think, slow, warmup, seconds):
+    now = time.monotonic()
+    start_at, deadline = now + warmup, now + warmup + seconds
+    results = {kind: [] for kind, _ in urls(random.Random(0))}
+    results['failed'] = 0
+    await asyncio.gather(*(client(port, seed, start_at, deadline, think, results) for seed in range(connections)),
+                         *(slow_client(port, deadline) for _ in range(slow)))
+    return results
+
+
+def report(label, results, seconds):
+    failed = results.pop('failed')
+    done = sum(len(samples) for samples in results.values())
+    print(f'  {label:<28} {done / seconds:8,.0f} req/s  {failed:6,} failed')
+    for kind, samples in results.items():
+        if samples:
+            samples.sort()
+            print(f'    {kind:<16} {len(samples):8,}  mean {statistics.mean(samples) * 1000:8.1f}ms  '
+                  f'p50 {samples[len(samples) // 2] * 1000:8.1f}ms  p99 {samples[int(len(samples) * 0.99)] * 1000:8.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--think', type=float, default=5, help='mean seconds between requests on a connection')
+    parser.add_argument('--slow', type=int, default=50, help='clients that take 10s to send each request')
+    parser.add_argument('--seconds', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--servers', default='sync,gthread,asgi', help='any of sync, gthread, asgi')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            generate(connection, users=2000, categories=20, authors=1000, books=args.books, reviews=args.books * 5,
+                     collections=args.books * 2, report=lambda line: None)
+        db.engine.dispose()
+    print(f'{args.connections:,} keep-alive connections ({args.think:g}s think time) and {args.slow} slow clients, '
+          f'{args.workers} workers, {args.seconds}s after {args.warmup}s warm-up, {args.books:,} books')
+
+    env = dict(os.environ, ASGI_THREADS=str(args.threads))
+    try:
+        choices = servers(free_port(), args.workers, args.threads)
+        for label, command in (choices[name] for name in args.servers.split(',')):
+            port = int(command[command.index('-b') + 1].rsplit(':', 1)[1]) if '-b' in command \
+                else int(command[command.index('--port') + 1])
+            process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+            try:
+                wait_ready(port, process)
+                results = asyncio.run(load(port, args.connections, args.think, args.slow, args.warmup, args.seconds))
+                report(label, results, args.seconds)
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
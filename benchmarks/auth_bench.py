@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Login and authenticated-request latency: sequential and concurrent logins through the
+# KDF admission limit, then GET /me with and without the verified-token cache.
+#
+#   python benchmarks/auth_bench.py [--logins 50] [--threads 16] [--requests 2000]
+
+# Standard library imports
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+
+CREDENTIALS = {'username': 'bench', 'password': 'correct horse battery staple'}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    status = fn()
+    return time.perf_counter() - start, status
+
+
+def report(label, samples, wall=None):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    rate = f'  {len(samples) / wall:>8,.0f} req/s' if wall else ''
+    print(f'  {label:<30} mean {statistics.mean(samples) * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms{rate}')
+
+
+def login(client):
+    return client.post('/login', json=CREDENTIALS).status_code
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post('/users', json={**CREDENTIALS, 'email': 'bench@example.com'})
+
+    print(f'POST /login x{args.logins}')
+    samples = [timed(lambda: login(client))[0] for _ in range(args.logins)]
+    report('sequential', samples)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(lambda _: timed(lambda: login(app.test_client())), range(args.logins)))
+    wall = time.perf_counter() - start
+    statuses = [status for _, status in results]
+    report(f'{args.threads} concurrent', [elapsed for elapsed, _ in results], wall)
+    print(f'  {"":<30} {statuses.count(200)} ok, {statuses.count(503)} refused with 503')
+
+    token = client.post('/login', json=CREDENTIALS).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    cache = app.extensions['token_cache']
+    print(f'GET /me x{args.requests}')
+    for label, max_entries in (('token cache off', 0), ('token cache on', cache.max_entries)):
+        cache.max_entries = max_entries
+        cache.discard_users({1})
+        samples = [timed(lambda: client.get('/me', headers=headers).status_code)[0] for _ in range(args.requests)]
+        report(label, samples)
+
+
+if __name__ == '__main__':
+    main()
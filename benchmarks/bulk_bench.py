@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Insert throughput: one POST /books per row vs bulk POST /books (JSON array and NDJSON).
+#
+#   python benchmarks/bulk_bench.py [--rows 5000] [--batch 1000]
+
+# Standard library imports
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+
+
+def books(start, count):
+    return [
+        {'title': f'Book {i}', 'description': 'x' * 80, 'author_id': 1, 'category_id': 1, 'created_by': 1}
+        for i in range(start, start + count)
+    ]
+
+
+def report(label, rows, elapsed, baseline=None):
+    speedup = f'  ({baseline / elapsed:.1f}x)' if baseline else ''
+    print(f'  {label:<22} {elapsed:8.3f}s  {rows / elapsed:>10,.0f} rows/s{speedup}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post('/users', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'x'})
+    client.post('/authors', json={'name': 'Bench Author'})
+    client.post('/categories', json={'name': 'Bench'})
+
+    print(f'POST /books, {args.rows:,} rows')
+    start = time.perf_counter()
+    for item in books(0, args.rows):
+        assert client.post('/books', json=item).status_code == 201
+    single = time.perf_counter() - start
+    report('one row per request', args.rows, single)
+
+    start = time.perf_counter()
+    for offset in range(0, args.rows, args.batch):
+        response = client.post('/books', json=books(offset, min(args.batch, args.rows - offset)))
+        assert response.status_code == 201, response.json
+    report(f'JSON array x{args.batch}', args.rows, time.perf_counter() - start, single)
+
+    start = time.perf_counter()
+    for offset in range(0, args.rows, args.batch):
+        body = '\n'.join(json.dumps(item) for item in books(offset, min(args.batch, args.rows - offset)))
+        response = client.post('/books', data=body, content_type='application/x-ndjson')
+        assert response.status_code == 201, response.json
+    report(f'NDJSON x{args.batch}', args.rows, time.perf_counter() - start, single)
+
+    with app.app_context():
+        ids = [row[0] for row in db.session.execute(db.text('SELECT id FROM books ORDER BY id'))]
+    start = time.perf_counter()
+    for offset in range(0, len(ids), args.batch):
+        batch = ids[offset:offset + args.batch]
+        response = client.patch('/books', json=[{'id': id, 'publication_year': 2000} for id in batch])
+        assert response.status_code == 200, response.json
+    report(f'bulk PATCH x{args.batch}', len(ids), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for offset in range(0, len(ids), args.batch):
+        response = client.delete('/books', json={'ids': ids[offset:offset + args.batch]})
+        assert response.status_code == 200, response.json
+    report(f'bulk DELETE x{args.batch}', len(ids), time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Deleting an author with --books books (and their reviews and shelf entries), three ways,
+# each on a fresh copy of the same database in a forked child: the ORM cascade as it was
+# (every book, review and shelf entry loaded and deleted row by row), the ON DELETE
+# CASCADE foreign keys behind one DELETE, and the batched background purge. Reports the
+# time, the longest single transaction (how long writers queue behind it) and the peak
+# anonymous RSS growth.
+#
+#   python benchmarks/cascade_bench.py [--books 50000] [--reviews 200000] [--collections 100000]
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKDIR = tempfile.mkdtemp()
+DATABASE = os.path.join(WORKDIR, 'bench.db')
+PRISTINE = os.path.join(WORKDIR, 'pristine.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE
+os.environ.setdefault('SLOW_QUERY_MS', '0')  # the ORM cascade would log every statement
+
+# Remote library imports
+from sqlalchemy import event, select, text  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+# Local imports
+from server import purge  # noqa: E402
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.models import Author, Book, recompute_rating_aggregates  # noqa: E402
+from server.recommendations import rebuild_recommendations  # noqa: E402
+from server.search import rebuild_index  # noqa: E402
+from server.synthetic import generate  # noqa: E402
+
+AUTHOR_ID = 1
+
+
+def anon_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def orm_cascade():
+    # What delete-orphan without passive_deletes did: load the whole subtree, delete each row
+    author = db.session.execute(select(Author).where(Author.id == AUTHOR_ID).options(
+        selectinload(Author.books).selectinload(Book.reviews),
+        selectinload(Author.books).selectinload(Book.user_collections),
+    )).scalar_one()
+    for book in author.books:
+        for child in book.reviews + book.user_collections:
+            db.session.delete(child)
+        db.session.delete(book)
+    db.session.delete(author)
+    db.session.commit()
+
+
+def db_cascade():
+    db.session.delete(db.session.get(Author, AUTHOR_ID))
+    db.session.commit()
+
+
+def background_purge():
+    purge.purge(Author, AUTHOR_ID)
+
+
+def measured(app, label, work, queue):
+    # Runs in the child, on a fresh copy of the database
+    with app.app_context():
+        db.engine.dispose(close=False)
+        longest, opened = 0.0, {}
+
+        @event.listens_for(db.engine, 'begin')
+        def begin(connection):
+            opened[connection] = time.perf_counter()
+
+        @event.listens_for(db.engine, 'commit')
+        def commit(connection):
+            nonlocal longest
+            longest = max(longest, time.perf_counter() - opened.pop(connection, time.perf_counter()))
+
+        before = peak = anon_rss_mb()
+        done = threading.Event()
+
+        def sample():
+            nonlocal peak
+            while not done.wait(0.02):
+                peak = max(peak, anon_rss_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        work()
+        seconds = time.perf_counter() - start
+        done.set()
+        sampler.join()
+        left = db.session.execute(text('SELECT count(*) FROM books WHERE author_id = :id'), {'id': AUTHOR_ID}).scalar()
+    queue.put((label, seconds, longest, max(peak, anon_rss_mb()) - before, left))
+
+
+def run(app, label, work):
+    # The last run's WAL would be replayed over the fresh copy
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(DATABASE + suffix):
+            os.remove(DATABASE + suffix)
+    shutil.copyfile(PRISTINE, DATABASE)
+    context = multiprocessing.get_context('fork')
+    queue = context.SimpleQueue()
+    child = context.Process(target=measured, args=(app, label, work, queue))
+    child.start()
+    child.join()
+    label, seconds, longest, growth, left = queue.get()
+    print(f'  {label:<24} {seconds:8.2f}s  longest transaction {longest:6.2f}s  peak heap +{growth:4.0f}MB'
+          + (f'  ({left} books left!)' if left else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--books', type=int, default=50000, help="the author's books")
+    parser.add_argument('--reviews', type=int, default=200000)
+    parser.add_argument('--collections', type=int, default=100000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            generate(connection, users=args.users, categories=20, authors=100, books=args.books * 2,
+                     reviews=args.reviews, collections=args.collections, skew='uniform',
+                     report=lambda line: None)
+        with db.engine.begin() as connection:
+            connection.execute(text('UPDATE books SET author_id = :id WHERE id <= :n'),
+                               {'id': AUTHOR_ID, 'n': args.books})
+            recompute_rating_aggregates(connection)
+            rebuild_index(connection)
+            rebuild_recommendations(connection)
+            counts = [connection.execute(text(f'SELECT count(*) FROM {table} WHERE book_id IN '
+                                              f'(SELECT id FROM books WHERE author_id = {AUTHOR_ID})')).scalar()
+                      for table in ('reviews', 'user_book_collections')]
+        db.engine.dispose()
+    shutil.copyfile(DATABASE, PRISTINE)
+    print(f'Deleting an author with {args.books:,} books, {counts[0]:,} reviews and {counts[1]:,} shelf entries')
+
+    try:
+        run(app, 'ORM cascade (before)', orm_cascade)
+        run(app, 'ON DELETE CASCADE', db_cascade)
+        run(app, f'purge, batches of {purge.PURGE_BATCH_SIZE:,}', background_purge)
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
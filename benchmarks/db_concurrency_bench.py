@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Concurrent reads and writes on one SQLite file from several processes (as gunicorn
+# workers would): driver defaults (rollback journal) vs the tuned profile (WAL + pragmas).
+#
+#   python benchmarks/db_concurrency_bench.py [--readers 4] [--writers 2] [--seconds 5] [--dir .]
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_app(path, tuned):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ['DATABASE_TUNING'] = '1' if tuned else '0'
+    from server.app import create_app
+
+    return create_app()
+
+
+def seed(path, tuned, books):
+    from server.config import db
+    from server.models import Author, Book, Category, User
+
+    app = make_app(path, tuned)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'u{i}', 'email': f'u{i}@x', 'password': 'p', 'role': 'reader'} for i in range(50)])
+        db.session.execute(Category.__table__.insert(), [{'name': 'c'}])
+        db.session.execute(Author.__table__.insert(), [{'name': 'a'}])
+        db.session.execute(Book.__table__.insert(), [
+            {'title': f'Book {i}', 'description': 'x' * 200, 'author_id': 1, 'category_id': 1, 'created_by': 1}
+            for i in range(books)])
+        db.session.commit()
+
+
+def worker(args):
+    path, tuned, role, index, seconds, books = args
+    app = make_app(path, tuned)
+    client = app.test_client()
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        start = time.perf_counter()
+        if role == 'read':
+            response = client.get(f'/books?limit=50&after={(i * 37) % books}')
+        else:
+            response = client.post('/reviews', json={
+                'rating': i % 5 + 1, 'content': 'y' * 100, 'user_id': index % 50 + 1, 'book_id': i % books + 1})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors += 1
+    return role, latencies, errors
+
+
+def run(tuned, args):
+    path = os.path.join(tempfile.mkdtemp(dir=args.dir), 'bench.db')
+    seed(path, tuned, args.books)
+    jobs = [(path, tuned, 'read', i, args.seconds, args.books) for i in range(args.readers)]
+    jobs += [(path, tuned, 'write', i, args.seconds, args.books) for i in range(args.writers)]
+    with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+        results = pool.map(worker, jobs)
+
+    print('tuned profile (WAL, synchronous=NORMAL, mmap, cache, busy_timeout)' if tuned else 'driver defaults (rollback journal)')
+    for role in ('read', 'write'):
+        latencies = sorted(l for r, ls, _ in results if r == role for l in ls)
+        errors = sum(e for r, _, e in results if r == role)
+        if not latencies:
+            continue
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+        print(f'  {role + "s":<7} {len(latencies) / args.seconds:>8,.0f}/s  mean {statistics.mean(latencies) * 1000:7.2f}ms  '
+              f'p95 {p95 * 1000:7.2f}ms  max {latencies[-1] * 1000:8.2f}ms  errors {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--dir', help='Directory for the database files (use a real disk, not tmpfs)')
+    args = parser.parse_args()
+    print(f'{args.readers} reader and {args.writers} writer processes, {args.seconds:g}s each')
+    run(False, args)
+    run(True, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# End-to-end API benchmark: mixed traffic over /books, /books/<id>, /reviews,
+# /collections and /login against databases seeded at several scales, run in-process
+# (Flask test client) and through a local gunicorn. Reports p50/p95/p99 latency,
+# throughput and peak RSS per endpoint; compares against a stored JSON baseline.
+#
+#   python benchmarks/e2e_bench.py --scales 1k,100k --save-baseline benchmarks/baseline.json
+#   python benchmarks/e2e_bench.py --scales 1k,100k --baseline benchmarks/baseline.json --threshold 0.2
+#
+# Seeded databases are kept in --data-dir and reused by later runs.
+
+# Standard library imports
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+# endpoint -> share of the traffic
+MIX = {
+    'GET /books': 30,
+    'GET /books/<id>': 30,
+    'GET /reviews': 15,
+    'GET /collections': 15,
+    'POST /login': 2,
+}
+# Lower is better for these; throughput is compared the other way round
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+COMPARED = ('p95_ms', 'p99_ms', 'throughput', 'peak_rss_mb')
+SYNTHETIC_PASSWORD = 'password'
+
+
+def scale_counts(books, reviews_per_book):
+    return {
+        'users': max(100, books // 10),
+        'categories': 50,
+        'authors': max(50, books // 20),
+        'books': books,
+        'reviews': books * reviews_per_book,
+        'collections': books,
+    }
+
+
+def seed(path, counts):
+    if os.path.exists(path):
+        return
+    # Seed under a temporary name so an interrupted run is never reused
+    partial = path + '.partial'
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + partial, FLASK_APP='app')
+    subprocess.run([sys.executable, '-m', 'flask', 'init-db'], env=env, cwd=ROOT, check=True, capture_output=True)
+    args = [f'--{name}={count}' for name, count in counts.items()]
+    print(f'seeding {path} ...', flush=True)
+    subprocess.run([sys.executable, '-m', 'flask', 'seed-synthetic', *args], env=env, cwd=ROOT, check=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(partial + suffix):
+            os.replace(partial + suffix, path + suffix)
+
+
+def plan(counts, requests, seed_value):
+    # The same (endpoint, method, url, body) sequence for every mode and run
+    rng = random.Random(seed_value)
+    endpoints = rng.choices(list(MIX), weights=list(MIX.values()), k=requests)
+    calls = []
+    for endpoint in endpoints:
+        if endpoint == 'GET /books':
+            calls.append((endpoint, 'GET', f'/books?limit=50&after={rng.randrange(counts["books"])}', None))
+        elif endpoint == 'GET /books/<id>':
+            calls.append((endpoint, 'GET', f'/books/{rng.randrange(1, counts["books"] + 1)}', None))
+        elif endpoint == 'GET /reviews':
+            calls.append((endpoint, 'GET', f'/reviews?limit=50&after={rng.randrange(counts["reviews"])}', None))
+        elif endpoint == 'GET /collections':
+            calls.append((endpoint, 'GET', f'/collections?limit=50&after={rng.randrange(counts["collections"])}', None))
+        else:
+            user = rng.randrange(1, counts['users'] + 1)
+            calls.append((endpoint, 'POST', '/login', {'username': f'user{user}', 'password': SYNTHETIC_PASSWORD}))
+    return calls
+
+
+def rss_mb(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+class RSSSampler(threading.Thread):
+    # Polls the RSS of the serving processes; samples are attributed to the endpoints in flight
+
+    def __init__(self, pids, interval=0.05):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.current = rss_mb(pids())
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.current = rss_mb(self.pids())
+
+
+def summarize(samples, wall):
+    results = {}
+    for endpoint in list(MIX) + ['all']:
+        rows = samples if endpoint == 'all' else [s for s in samples if s[0] == endpoint]
+        if not rows:
+            continue
+        latencies = sorted(latency for _, latency, _, _ in rows)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+        results[endpoint] = {
+            'count': len(rows),
+            'errors': sum(1 for _, _, status, _ in rows if status >= 400),
+            'p50_ms': pct(0.50),
+            'p95_ms': pct(0.95),
+            'p99_ms': pct(0.99),
+            'throughput': round(len(rows) / wall, 1),
+            'peak_rss_mb': round(max(rss for _, _, _, rss in rows), 1),
+        }
+    return results
+
+
+def run_in_process(path, calls):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    from server.app import create_app
+
+    client = create_app().test_client()
+    sampler = RSSSampler(lambda: [os.getpid()])
+    sampler.start()
+    samples = []
+    start = time.perf_counter()
+    for endpoint, method, url, body in calls:
+        began = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        samples.append((endpoint, time.perf_counter() - began, response.status_code, sampler.current))
+    wall = time.perf_counter() - start
+    sampler.stopped.set()
+    return summarize(samples, wall)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def run_gunicorn(path, calls, workers, concurrency):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + path, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(200):
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/')
+                connection.getresponse().read()
+                break
+            except OSError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError('gunicorn did not start')
+
+        sampler = RSSSampler(lambda: [server.pid, *_children(server.pid)])
+        sampler.start()
+
+        def call(item):
+            endpoint, method, url, body = item
+            began = time.perf_counter()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            payload = json.dumps(body) if body is not None else None
+            connection.request(method, url, body=payload, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            return endpoint, time.perf_counter() - began, response.status, sampler.current
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(call, calls))
+        wall = time.perf_counter() - start
+        sampler.stopped.set()
+        return summarize(samples, wall)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results, baseline, threshold):
+    failures = []
+    for scale, modes in results.items():
+        for mode, endpoints in modes.items():
+            for endpoint, metrics in endpoints.items():
+                base = baseline.get(scale, {}).get(mode, {}).get(endpoint)
+                if not base:
+                    continue
+                for metric in COMPARED:
+                    old, new = base.get(metric), metrics.get(metric)
+                    if not old or new is None:
+                        continue
+                    change = (new - old) / old
+                    regressed = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+                    if regressed:
+                        failures.append(f'{scale} {mode} {endpoint} {metric}: {old} -> {new} ({change:+.0%})')
+    return failures
+
+
+def print_table(scale, mode, endpoints):
+    print(f'\n{scale} / {mode}')
+    print(f'  {"endpoint":<20} {"count":>6} {"err":>4} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"RSS MB":>7}')
+    for endpoint, m in endpoints.items():
+        print(f'  {endpoint:<20} {m["count"]:>6} {m["errors"]:>4} {m["p50_ms"]:>8} {m["p95_ms"]:>8} '
+              f'{m["p99_ms"]:>8} {m["throughput"]:>8} {m["peak_rss_mb"]:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='1k', help=f'comma-separated, from {", ".join(SCALES)}')
+    parser.add_argument('--modes', default='inprocess,gunicorn')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scale and mode')
+    parser.add_argument('--reviews-per-book', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads against gunicorn')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'bookshelf-bench'))
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--save-baseline', help='write the results as the new baseline')
+    parser.add_argument('--baseline', help='fail if results regress against this baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {}
+    for scale in args.scales.split(','):
+        counts = scale_counts(SCALES[scale], args.reviews_per_book)
+        path = os.path.join(args.data_dir, f'{scale}-r{args.reviews_per_book}-s{args.seed}.db')
+        seed(path, counts)
+        calls = plan(counts, args.requests, args.seed)
+        results[scale] = {}
+        for mode in args.modes.split(','):
+            if mode == 'inprocess':
+                # A fresh interpreter per run keeps RSS and caches comparable
+                output = subprocess.run([sys.executable, __file__, '--child', path], input=json.dumps(calls),
+                                        check=True, capture_output=True, text=True).stdout
+                results[scale][mode] = json.loads(output.strip().splitlines()[-1])
+            else:
+                results[scale][mode] = run_gunicorn(path, calls, args.workers, args.concurrency)
+            print_table(scale, mode, results[scale][mode])
+
+    for target in (args.output, args.save_baseline):
+        if target:
+            with open(target, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.threshold)
+        if failures:
+            print(f'\nRegressions beyond {args.threshold:.0%}:')
+            for failure in failures:
+                print('  ' + failure)
+            sys.exit(1)
+        print(f'\nNo regressions beyond {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        print(json.dumps(run_in_process(sys.argv[2], [tuple(call) for call in json.load(sys.stdin)])))
+    else:
+        main()
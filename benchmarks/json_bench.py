@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# JSON encoding and compression on full /books and /reviews pages: encode time and body
+# size for the old stdlib output and the stdlib/orjson providers, bytes on the wire per
+# Content-Encoding, and end-to-end latency with and without compression.
+#
+#   python benchmarks/json_bench.py [--rows 1000] [--runs 50]
+
+# Standard library imports
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.compression import brotli  # noqa: E402
+from server.config import db  # noqa: E402
+from server.json_provider import JSONProvider, OrjsonProvider, orjson  # noqa: E402
+from server.models import Author, Book, Category, Review, User  # noqa: E402
+from server.serializers import serializer_for  # noqa: E402
+
+
+def seed(rows):
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [{'username': 'u', 'email': 'u@x', 'password': 'p', 'role': 'reader', 'created_at': now}])
+    db.session.execute(Category.__table__.insert(), [{'name': 'Fiction'}])
+    db.session.execute(Author.__table__.insert(), [{'name': 'Ursula K. Le Guin'}])
+    db.session.execute(Book.__table__.insert(), [
+        {'title': f'Book {i}', 'description': f'A novel about the number {i} and what follows from it. ' * 2,
+         'isbn': f'{9780000000000 + i}', 'publication_year': 1950 + i % 70, 'author_id': 1, 'category_id': 1,
+         'created_by': 1}
+        for i in range(rows)
+    ])
+    db.session.execute(Review.__table__.insert(), [
+        {'rating': i % 5 + 1, 'content': f'Review {i}: slow start, but the ending made up for it.',
+         'created_at': now, 'user_id': 1, 'book_id': i % rows + 1}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def best(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000, help='rows per page')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+        stdlib, fast = JSONProvider(app), OrjsonProvider(app) if orjson is not None else None
+        for provider in (stdlib, fast):
+            if provider is not None:
+                provider.compact = True
+        encoders = {
+            'stdlib json.dumps (before)': lambda data: json.dumps(data).encode(),
+            'stdlib, indented': lambda data: json.dumps(data, indent=2).encode(),
+            'stdlib provider, compact': stdlib.dumpb,
+        }
+        if fast is not None:
+            encoders['orjson provider, compact'] = fast.dumpb
+        for model in (Book, Review):
+            data = serializer_for(model).from_rows(db.session.execute(serializer_for(model).select()))
+            print(f'{model.__tablename__} ({len(data):,} rows)')
+            for label, encode in encoders.items():
+                seconds = best(lambda: encode(data), args.runs)
+                print(f'  {label:<28} {seconds * 1000:8.2f}ms  {len(encode(data)):>10,} bytes')
+            body = app.json.dumpb(data)
+            wire = {'identity': len(body),
+                    'gzip': len(gzip.compress(body, app.config['GZIP_LEVEL']))}
+            if brotli is not None:
+                wire['br'] = len(brotli.compress(body, quality=app.config['BROTLI_QUALITY']))
+            print('  on the wire: ' + ', '.join(f'{coding} {size:,} bytes' for coding, size in wire.items()))
+
+    client = app.test_client()
+    codings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+    print(f'GET latency, {args.rows:,}-row page ({type(app.json).__name__})')
+    for url in (f'/books?limit={args.rows}', f'/reviews?limit={args.rows}'):
+        for coding in codings:
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                response = client.get(url, headers={'Accept-Encoding': coding})
+                samples.append(time.perf_counter() - start)
+            print(f'  {url:<24} {coding:<9} median {statistics.median(samples) * 1000:7.2f}ms  '
+                  f'{len(response.data):>10,} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Cost of request instrumentation: the same requests with metrics off, on, and on with
+# the Server-Timing header. Each mode runs in its own interpreter, rounds interleaved.
+#
+#   python benchmarks/metrics_bench.py [--books 2000] [--requests 2000] [--rounds 3]
+
+# Standard library imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'metrics off': {'METRICS_ENABLED': '0'},
+    'metrics on': {'METRICS_ENABLED': '1', 'SERVER_TIMING': '0'},
+    'metrics + Server-Timing': {'METRICS_ENABLED': '1', 'SERVER_TIMING': '1'},
+}
+URLS = ('/books?limit=50', '/books?limit=20&include=author,category', '/reviews/{id}', '/users/{id}')
+
+
+def seed(path, books):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    from server.app import create_app
+    from server.config import db
+    from server.models import Author, Book, Category, Review, User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'u{i}', 'email': f'u{i}@x', 'password': 'p', 'role': 'reader'} for i in range(100)])
+        db.session.execute(Category.__table__.insert(), [{'name': 'c'}])
+        db.session.execute(Author.__table__.insert(), [{'name': 'a'}])
+        db.session.execute(Book.__table__.insert(), [
+            {'title': f'Book {i}', 'description': 'x' * 200, 'author_id': 1, 'category_id': 1, 'created_by': 1}
+            for i in range(books)])
+        db.session.execute(Review.__table__.insert(), [
+            {'rating': i % 5 + 1, 'content': 'y' * 100, 'user_id': i % 100 + 1, 'book_id': i % books + 1}
+            for i in range(books)])
+        db.session.commit()
+
+
+def child(path, requests, books):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    from server.app import create_app
+
+    client = create_app().test_client()
+    urls = [URLS[i % len(URLS)].format(id=i % books + 1) for i in range(requests)]
+    for url in urls[:100]:
+        client.get(url)
+    latencies = []
+    for url in urls:
+        start = time.perf_counter()
+        client.get(url)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.books)
+    samples = {mode: [] for mode in MODES}
+    for _ in range(args.rounds):
+        for mode, env in MODES.items():
+            output = subprocess.run([sys.executable, __file__, '--child', path, str(args.requests), str(args.books)],
+                                    env=dict(os.environ, **env), check=True, capture_output=True, text=True).stdout
+            samples[mode].extend(json.loads(output))
+
+    print(f'{args.requests} GETs x {args.rounds} rounds over {args.books} books')
+    base = statistics.mean(samples['metrics off'])
+    for mode, latencies in samples.items():
+        latencies.sort()
+        mean = statistics.mean(latencies)
+        print(f'  {mode:<24} mean {mean * 1000:7.3f}ms  p50 {latencies[len(latencies) // 2] * 1000:7.3f}ms  '
+              f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.3f}ms  overhead {(mean - base) / base:+6.1%}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        print(json.dumps(child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))))
+    else:
+        main()
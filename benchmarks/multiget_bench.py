@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# A page that references --page books: one GET /books/<id> per book (how the frontend
+# renders shelves and review lists), vs one GET /books?ids=..., each with its cache cold
+# (response cache off / row cache emptied before every page) and warm. Reports the queries
+# per page and the page latency, then the warm multi-get while reviews keep landing on
+# books of the page.
+#
+#   python benchmarks/multiget_bench.py [--books 50000] [--page 50] [--pages 200]
+
+# Standard library imports
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+# Remote library imports
+from sqlalchemy import event  # noqa: E402
+
+# Local imports
+from server import multiget  # noqa: E402
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.synthetic import generate  # noqa: E402
+
+
+def report(label, queries, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f'  {label:<34} {queries:5.1f} queries/page  mean {statistics.mean(samples) * 1000:8.2f}ms  '
+          f'p95 {p95 * 1000:8.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--page', type=int, default=50, help='books referenced by one page')
+    parser.add_argument('--pages', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            generate(connection, users=1000, categories=20, authors=max(50, args.books // 20), books=args.books,
+                     reviews=args.books * 2, collections=args.books, report=lambda line: None)
+    print(f'{args.books:,} books, pages of {args.page} ids drawn from the first {args.page * 20:,}')
+
+    client = app.test_client()
+    rng = random.Random(3)
+    pages = [rng.sample(range(1, args.page * 20 + 1), args.page) for _ in range(args.pages)]
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    def run(label, fetch_page, before_page=None):
+        statements[0] = 0
+        samples = []
+        for ids in pages:
+            if before_page:
+                before_page(ids)
+            start = time.perf_counter()
+            fetch_page(ids)
+            samples.append(time.perf_counter() - start)
+        report(label, statements[0] / len(pages), samples)
+
+    def one_by_one(ids):
+        for id in ids:
+            client.get(f'/books/{id}')
+
+    def multi(ids):
+        client.get('/books?ids=' + ','.join(map(str, ids)))
+
+    def empty_row_cache(ids):
+        app.extensions['row_cache'] = multiget.RowCache(app.config['ROW_CACHE_MAX_ENTRIES'],
+                                                        app.config['RESPONSE_CACHE_TTL'])
+
+    def review(ids):
+        # Only the page's own queries are counted
+        counted = statements[0]
+        client.post('/reviews', json={'rating': rng.randint(1, 5), 'content': 'Bench review',
+                                      'user_id': rng.randint(1, 1000), 'book_id': rng.choice(ids)})
+        statements[0] = counted
+
+    response_cache = app.extensions.pop('response_cache')
+    run('GET /books/<id> each, uncached', one_by_one)
+    app.extensions['response_cache'] = response_cache
+    one_by_one(sorted({id for ids in pages for id in ids}))
+    run('GET /books/<id> each, cached', one_by_one)
+    run('GET /books?ids=, row cache cold', multi, empty_row_cache)
+    multi(sorted({id for ids in pages for id in ids}))
+    run('GET /books?ids=, row cache warm', multi)
+    run('  after a review on the page', multi, review)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# "Readers also shelved" model: full rebuild time and peak memory over a synthetic
+# collections table, with the scipy.sparse product (when SciPy is installed) and the
+# standard-library Counter rows, each in a forked child. Then shelf-write latency with
+# the incremental update and read latency of /books/<id>/similar and
+# /users/<id>/recommendations.
+#
+#   python benchmarks/recommendations_bench.py [--collections 1000000] [--users 100000] [--books 50000]
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server import recommendations  # noqa: E402
+from server.config import db  # noqa: E402
+from server.synthetic import generate  # noqa: E402
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f'  {label:<34} mean {statistics.mean(samples) * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms')
+
+
+def rebuilt(app, path, queue):
+    # Runs in the child, so its peak RSS is this rebuild's alone
+    with app.app_context():
+        db.engine.dispose(close=False)
+        if path != 'scipy.sparse':
+            recommendations.sparse = None
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            rows = recommendations.rebuild_recommendations(connection)
+        queue.put((time.perf_counter() - start, rows, peak_rss_mb() - before))
+
+
+def rebuild(app, path):
+    context = multiprocessing.get_context('fork')
+    queue = context.SimpleQueue()
+    child = context.Process(target=rebuilt, args=(app, path, queue))
+    child.start()
+    child.join()
+    if child.exitcode:
+        raise SystemExit(f'{path} rebuild failed')
+    seconds, rows, growth = queue.get()
+    print(f'  full rebuild, {path:<17} {seconds:6.2f}s, {rows:,} rows, peak RSS +{growth:.0f}MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--collections', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--skew', choices=['zipf', 'uniform'], default='zipf')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            generate(connection, users=args.users, categories=20, authors=max(50, args.books // 20),
+                     books=args.books, reviews=0, collections=args.collections, skew=args.skew,
+                     report=lambda line: None)
+        print(f'{args.collections:,} shelf entries, {args.users:,} users, {args.books:,} books ({args.skew})')
+
+        paths = (['scipy.sparse'] if recommendations.sparse is not None else []) + ['standard library']
+        for path in paths:
+            rebuild(app, path)
+
+    client = app.test_client()
+    rng = random.Random(7)
+    writes = []
+    for _ in range(args.requests):
+        user, book = rng.randint(1, args.users), rng.randint(1, args.books)
+        start = time.perf_counter()
+        response = client.post('/collections', json={'user_id': user, 'book_id': book, 'status': 'read'})
+        writes.append(time.perf_counter() - start)
+        if response.status_code == 201:
+            client.delete(f'/collections/{response.json["id"]}')
+    report('POST /collections (incremental)', writes)
+    for label, url in (('GET /books/<id>/similar', '/books/{}/similar'),
+                       ('GET /users/<id>/recommendations', '/users/{}/recommendations')):
+        samples = []
+        upper = args.books if 'books' in url else args.users
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            client.get(url.format(rng.randint(1, upper)))
+            samples.append(time.perf_counter() - start)
+        report(label, samples)
+
+
+if __name__ == '__main__':
+    main()
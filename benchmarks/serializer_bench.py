@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Compare SerializerMixin.to_dict with the compiled serializers on N rows.
+#
+#   python benchmarks/serializer_bench.py [--rows 100000]
+
+# Standard library imports
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.models import User, Author, Book, Review, Category  # noqa: E402
+from server.serializers import serializer_for  # noqa: E402
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [{'username': 'u', 'email': 'u@x', 'password': 'p', 'role': 'reader', 'created_at': now}])
+    db.session.execute(Category.__table__.insert(), [{'name': 'c'}])
+    db.session.execute(Author.__table__.insert(), [{'name': 'a'}])
+    db.session.execute(Book.__table__.insert(), [
+        {'title': f'Book {i}', 'description': 'x' * 80, 'author_id': 1, 'category_id': 1, 'created_by': 1}
+        for i in range(rows)
+    ])
+    db.session.execute(Review.__table__.insert(), [
+        {'rating': i % 5 + 1, 'content': 'y' * 120, 'created_at': now, 'user_id': 1, 'book_id': i % rows + 1}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def timed(label, fn, rows):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    assert len(result) == rows
+    print(f'  {label:<28} {elapsed:8.3f}s  {rows / elapsed:>10,.0f} rows/s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        seed(args.rows)
+        for model in (Book, Review):
+            serializer = serializer_for(model)
+            print(f'{model.__name__} ({args.rows:,} rows)')
+            baseline = timed('query.all() + to_dict()', lambda: [o.to_dict() for o in model.query.all()], args.rows)
+            orm = timed('query.all() + dump()', lambda: [serializer.dump(o) for o in model.query.all()], args.rows)
+            core = timed('Core select + from_rows()', lambda: serializer.from_rows(db.session.execute(serializer.select())), args.rows)
+            print(f'  speedup: dump {baseline / orm:.1f}x, Core {baseline / core:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Profile page for a heavy reader: what the client used to do (fetch every /collections
+# and /reviews row, then filter by user) vs one GET /users/<id>/shelf. Reports the
+# queries issued and the latency of each.
+#
+#   python benchmarks/shelf_bench.py [--shelved 10000] [--reviews 2000] [--others 20000]
+
+# Standard library imports
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+# Remote library imports
+from sqlalchemy import event  # noqa: E402
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.models import Author, Book, Category, Review, User, UserBookCollection  # noqa: E402
+
+STATUSES = ('want_to_read', 'reading', 'read')
+
+
+def seed(shelved, reviews, others):
+    # User 1 is the heavy reader; the other users' rows are what the old page filtered out
+    books = max(shelved, reviews)
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'u{i}', 'email': f'u{i}@x', 'password': 'p', 'role': 'reader'} for i in range(1, 101)])
+    db.session.execute(Category.__table__.insert(), [{'name': 'c'}])
+    db.session.execute(Author.__table__.insert(), [{'name': 'a'}])
+    db.session.execute(Book.__table__.insert(), [
+        {'title': f'Book {i}', 'author_id': 1, 'category_id': 1, 'created_by': 1} for i in range(books)])
+    db.session.execute(UserBookCollection.__table__.insert(), [
+        {'user_id': 1, 'book_id': i + 1, 'status': STATUSES[i % 3]} for i in range(shelved)])
+    db.session.execute(UserBookCollection.__table__.insert(), [
+        {'user_id': i % 99 + 2, 'book_id': i // 99 + 1, 'status': STATUSES[i % 3]} for i in range(others)])
+    db.session.execute(Review.__table__.insert(), [
+        {'rating': i % 5 + 1, 'content': 'x' * 200, 'user_id': 1, 'book_id': i + 1} for i in range(reviews)])
+    db.session.execute(Review.__table__.insert(), [
+        {'rating': i % 5 + 1, 'content': 'x' * 200, 'user_id': i % 99 + 2, 'book_id': i // 99 + 1}
+        for i in range(others)])
+    db.session.commit()
+
+
+def measure(client, urls, runs):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    for url in urls:
+        client.get(url)
+    event.remove(db.engine, 'before_cursor_execute', count)
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for url in urls:
+            client.get(url)
+        latencies.append(time.perf_counter() - start)
+    return len(statements), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shelved', type=int, default=10000, help="books on the heavy reader's shelf")
+    parser.add_argument('--reviews', type=int, default=2000, help="the heavy reader's reviews")
+    parser.add_argument('--others', type=int, default=20000, help='shelf entries and reviews by other users')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.shelved, args.reviews, args.others)
+        client = app.test_client()
+        print(f'user 1: {args.shelved:,} shelved books, {args.reviews:,} reviews; '
+              f'{args.others:,} rows of each by other users')
+        pages = {
+            'all /collections + /reviews': ['/collections', '/reviews'],
+            '/users/1/shelf': ['/users/1/shelf'],
+            '/users/1/shelf?section=read': ['/users/1/shelf?section=read&after=5000'],
+        }
+        for label, urls in pages.items():
+            queries, latencies = measure(client, urls, args.runs)
+            print(f'  {label:<30} {queries:>3} queries  mean {statistics.mean(latencies) * 1000:9.2f}ms  '
+                  f'max {max(latencies) * 1000:9.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
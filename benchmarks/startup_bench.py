@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Cold start: time from `import app` to the first response, each run in a fresh
+# interpreter against a database created beforehand. Point --repo at another
+# checkout (e.g. a `git worktree` of an older commit) to compare.
+#
+#   python benchmarks/startup_bench.py [--runs 10] [--repo .]
+
+# Standard library imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get(sys.argv[2])
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - start, 'first_response': time.perf_counter() - start}))
+'''
+
+
+def run(repo, url, env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, repo, url], env=env, cwd=repo,
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def report(label, samples):
+    print(f'  {label:<16} mean {statistics.mean(samples) * 1000:7.0f}ms  '
+          f'min {min(samples) * 1000:7.0f}ms  max {max(samples) * 1000:7.0f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--repo', default=ROOT)
+    parser.add_argument('--url', default='/books?limit=1')
+    args = parser.parse_args()
+    repo = os.path.abspath(args.repo)
+
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    # Create the schema up front (older checkouts do it on import)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], env=env, cwd=repo,
+                   capture_output=True)
+
+    results = [run(repo, args.url, env) for _ in range(args.runs + 1)][1:]
+    print(f'{repo}: GET {args.url}, {args.runs} runs')
+    report('import', [r['import'] for r in results])
+    report('first response', [r['first_response'] for r in results])
+    report('whole process', [r['process'] for r in results])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Whole-catalog export and import over a synthetic dataset: time, rows/s and how much
+# the process grows while doing it. Each phase runs in a forked child, sampling its
+# anonymous RSS (heap, not SQLite's mmap of the file); the peak growth should stay flat
+# as --reviews and --collections go up.
+#
+#   python benchmarks/transfer_bench.py [--reviews 3500000] [--collections 1400000] [--format ndjson] [--gzip]
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKDIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'source.db')
+
+# Remote library imports
+from sqlalchemy import create_engine  # noqa: E402
+
+# Local imports
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.synthetic import generate  # noqa: E402
+from server.transfer import export_catalog, import_catalog  # noqa: E402
+
+
+def anon_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) / 1024
+    return 0
+
+
+def measured(label, work, queue):
+    # Runs in the child: report rows, seconds and peak heap growth over its starting size
+    before = peak = anon_rss_mb()
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(0.05):
+            peak = max(peak, anon_rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    rows = work()
+    seconds = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    queue.put((label, rows, seconds, max(peak, anon_rss_mb()) - before))
+
+
+def run(label, work):
+    queue = multiprocessing.get_context('fork').SimpleQueue()
+    child = multiprocessing.get_context('fork').Process(target=measured, args=(label, work, queue))
+    child.start()
+    child.join()
+    label, rows, seconds, growth = queue.get()
+    print(f'  {label:<8} {rows:>11,} rows  {seconds:8.2f}s  {rows / seconds:>10,.0f} rows/s  '
+          f'peak heap +{growth:.0f}MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--reviews', type=int, default=3500000)
+    parser.add_argument('--collections', type=int, default=1400000)
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            stats = generate(connection, users=args.users, categories=20, authors=max(50, args.books // 10),
+                             books=args.books, reviews=args.reviews, collections=args.collections,
+                             report=lambda line: None)
+        source = db.engine
+    print(f'{sum(written for written, _ in stats.values()):,} rows '
+          f'({args.reviews:,} reviews, {args.collections:,} shelf entries), {args.format}'
+          + (' + gzip' if args.gzip else ''))
+
+    directory = os.path.join(WORKDIR, 'export')
+    target = create_engine('sqlite:///' + os.path.join(WORKDIR, 'target.db'))
+    db.metadata.create_all(target)
+
+    def export():
+        source.dispose(close=False)  # don't share the parent's pooled connections
+        with source.connect() as connection, connection.begin():
+            manifest = export_catalog(connection, directory, args.format, args.gzip, report=lambda line: None)
+        return sum(entry['rows'] for entry in manifest['tables'])
+
+    def load():
+        return sum(import_catalog(target, directory, report=lambda line: None).values())
+
+    try:
+        run('export', export)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f'  {"files":<8} {size / 2 ** 20:>11,.0f} MB')
+        run('import', load)
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
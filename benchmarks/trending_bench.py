@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Trending books: the top 20 of the last 7 days by a GROUP BY over the reviews and
+# collections tables (what a request would cost without the stored scores) vs the
+# indexed top-k read of /books/trending, plus review-write latency with and without
+# the score upkeep and the time of a full rebuild.
+#
+#   python benchmarks/trending_bench.py [--reviews 1000000] [--collections 500000] [--books 50000]
+
+# Standard library imports
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+# Remote library imports
+from flask_sqlalchemy.session import Session  # noqa: E402
+from sqlalchemy import event, func, literal, select, union_all  # noqa: E402
+
+# Local imports
+from server import trending  # noqa: E402
+from server.app import create_app  # noqa: E402
+from server.config import db  # noqa: E402
+from server.models import Review, UserBookCollection  # noqa: E402
+from server.synthetic import generate  # noqa: E402
+
+# Activity is spread over this many days back from now
+SPREAD_DAYS = 90
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f'  {label:<38} mean {statistics.mean(samples) * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms')
+
+
+def group_by_top(since, limit=20):
+    # Weighted activity counts in the window, no decay: already a full pass per request
+    activity = union_all(
+        select(Review.book_id, literal(trending.WEIGHTS[Review]).label('weight')).where(Review.created_at >= since),
+        select(UserBookCollection.book_id, literal(trending.WEIGHTS[UserBookCollection]).label('weight'))
+        .where(UserBookCollection.date_added >= since),
+    ).subquery()
+    score = func.sum(activity.c.weight)
+    return db.session.execute(select(activity.c.book_id, score).group_by(activity.c.book_id)
+                              .order_by(score.desc()).limit(limit)).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reviews', type=int, default=1000000)
+    parser.add_argument('--collections', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            generate(connection, users=args.users, categories=20, authors=max(50, args.books // 20),
+                     books=args.books, reviews=args.reviews, collections=args.collections,
+                     report=lambda line: None)
+        # Synthetic dates are years old; move them into the last SPREAD_DAYS
+        seconds = f"abs(random()) % {SPREAD_DAYS * 86400}"
+        db.session.execute(db.text(f"UPDATE reviews SET created_at = datetime('now', '-' || ({seconds}) || ' seconds')"))
+        db.session.execute(db.text(f"UPDATE user_book_collections SET date_added = datetime('now', '-' || ({seconds}) || ' seconds')"))
+        db.session.commit()
+        print(f'{args.reviews:,} reviews and {args.collections:,} shelf entries over {SPREAD_DAYS} days, '
+              f'{args.books:,} books')
+
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            rows = trending.rebuild_trending(connection)
+        print(f'  full rebuild: {time.perf_counter() - start:.2f}s, {rows:,} scores')
+
+        since = datetime.utcnow() - timedelta(days=7)
+        samples = []
+        for _ in range(max(5, args.requests // 20)):
+            start = time.perf_counter()
+            group_by_top(since)
+            samples.append(time.perf_counter() - start)
+        report('GROUP BY top 20, 7 days', samples)
+
+    client = app.test_client()
+    samples = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        client.get('/books/trending?window=7d&limit=20')
+        samples.append(time.perf_counter() - start)
+    report('GET /books/trending?window=7d', samples)
+
+    rng = random.Random(7)
+
+    def post_reviews(label):
+        samples = []
+        for _ in range(args.requests):
+            review = {'rating': rng.randint(1, 5), 'content': 'Bench review', 'user_id': rng.randint(1, args.users),
+                      'book_id': rng.randint(1, args.books)}
+            start = time.perf_counter()
+            client.post('/reviews', json=review)
+            samples.append(time.perf_counter() - start)
+        report(label, samples)
+
+    post_reviews('POST /reviews (with trending upkeep)')
+    event.remove(Session, 'after_flush', trending._record_activity)
+    post_reviews('POST /reviews (without)')
+
+
+if __name__ == '__main__':
+    main()
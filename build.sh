@@ -4,13 +4,7 @@ set -o errexit
 
 pip install -r requirements.txt
 
-# Run database migrations and seed data
-python -c "
-from server.config import app, db
-from server.models import *
-from server.seed import *
-
-with app.app_context():
-    db.create_all()
-    seed_data()
-"
\ No newline at end of file
+# Create any missing tables, then add sample data to an empty database
+export FLASK_APP=app
+flask init-db
+flask seed
@@ -0,0 +1,23 @@
+# Gunicorn settings, read automatically when gunicorn starts from this directory:
+#   gunicorn app:app
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Threaded workers, so a slow request (a login's password hash) doesn't hold the whole
+# worker; server/passwords.py admits one fewer hash at a time than there are threads
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import the app once in the master and fork workers from it, so workers boot
+# without re-importing Flask, SQLAlchemy and the models (GUNICORN_PRELOAD=0 to turn off)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes', 'on')
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the forked workers
+    from server.config import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
 import os
-from server.config import app, db
+from server.app import create_app
+from server.config import db
 from server.models import User, Author, Book, Category
 
 def seed_database():
-    with app.app_context():
+    with create_app().app_context():
         # Create tables
         db.create_all()
         
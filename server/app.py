@@ -1,18 +1,21 @@
 #!/usr/bin/env python3
 
 # Standard library imports
+import os
 
 # Remote library imports
-from flask import request
+from flask import Flask, Response, current_app, jsonify, request, stream_with_context
 from flask_restful import Resource
 
 # Local imports
-from .config import app, db, api
-from .models import User, Author, Book, Review, UserBookCollection, Category
-from flask import jsonify
+from .config import db, api, init_extensions, load_config
+from .models import User, Author, Book, Review, UserBookCollection, Category, TrendingPeriod
+from .pagination import list_response, next_link, offset_args, page_args, wants_stream
+from .serializers import serializer_for, serializer_from_request
+from . import auth, bulk, cache, categories, commands, compression, metrics, multiget, purge, recommendations, search, shelf, transfer, trending
+from .passwords import KDFBusy, verify_password
 
 # Root route
-@app.route('/')
 def home():
     return jsonify({
         'message': 'Bookshelf Backend API',
@@ -24,20 +27,46 @@ def home():
             'categories': '/categories',
             'reviews': '/reviews',
             'collections': '/collections',
-            'login': '/login'
+            'search': '/search?q=',
+            'login': '/login',
+            'me': '/me',
+            'metrics': '/metrics',
+            'export': '/export',
+            'trending': '/books/trending?window=7d'
         }
     })
 
 # Views go here!
 
-def create_resource(model, name, required_fields, optional_fields=None):
+def bulk_call(operation, *args):
+    try:
+        return operation(*args)
+    except bulk.BulkError as e:
+        return {'error': str(e)}, e.status
+
+def create_resource(model, name, required_fields, optional_fields=None, cached_reads=False):
     optional_fields = optional_fields or []
+    serializer = serializer_for(model)
+    
+    def build(data):
+        kwargs = {field: data[field] for field in required_fields}
+        kwargs.update({field: data.get(field) for field in optional_fields})
+        return model(**kwargs)
     
     class ResourceList(Resource):
+        # Listing, or ?ids=1,2,3 for those rows in that order
         def get(self):
-            return [item.to_dict() for item in model.query.all()], 200
+            try:
+                view = serializer_from_request(model)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            if 'ids' in request.args:
+                return multiget.multiget_response(view)
+            return list_response(view)
         
         def post(self):
+            if bulk.is_bulk_request():
+                return bulk_call(bulk.bulk_create, build, serializer)
             data = request.get_json()
             try:
                 # Special handling for User model
@@ -49,24 +78,37 @@ def create_resource(model, name, required_fields, optional_fields=None):
                     if User.query.filter_by(email=data['email']).first():
                         return {'error': 'Email already exists'}, 400
                 
-                kwargs = {field: data[field] for field in required_fields}
-                kwargs.update({field: data.get(field) for field in optional_fields})
-                item = model(**kwargs)
+                item = build(data)
                 db.session.add(item)
                 db.session.commit()
-                return item.to_dict(), 201
+                return serializer.dump(item), 201
+            except KDFBusy as e:
+                return {'error': e.description}, 503, {'Retry-After': '1'}
             except Exception as e:
                 if 'UNIQUE constraint failed' in str(e):
                     if 'username' in str(e):
                         return {'error': 'Username already exists'}, 400
                     elif 'email' in str(e):
                         return {'error': 'Email already exists'}, 400
+                if 'user_book_collections' in str(e):
+                    return {'error': 'Book is already in this collection'}, 400
                 return {'error': str(e)}, 400
+        
+        # Bulk update: [{"id": 1, ...}, ...]; bulk delete: ?ids=1,2,3
+        def patch(self):
+            return bulk_call(bulk.bulk_update, model, serializer)
+        
+        def delete(self):
+            return bulk_call(bulk.bulk_delete, model)
     
     class ResourceByID(Resource):
         def get(self, id):
-            item = model.query.filter_by(id=id).first()
-            return item.to_dict() if item else ({'error': f'{name} not found'}, 404)
+            try:
+                view = serializer_from_request(model)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            row = db.session.execute(view.select().where(model.id == id)).first()
+            return view.from_row(row) if row else ({'error': f'{name} not found'}, 404)
         
         def patch(self, id):
             item = model.query.filter_by(id=id).first()
@@ -77,7 +119,9 @@ def create_resource(model, name, required_fields, optional_fields=None):
                     setattr(item, attr, value)
                 db.session.add(item)
                 db.session.commit()
-                return item.to_dict(), 200
+                return serializer.dump(item), 200
+            except KDFBusy as e:
+                return {'error': e.description}, 503, {'Retry-After': '1'}
             except Exception as e:
                 return {'error': str(e)}, 400
         
@@ -85,10 +129,21 @@ def create_resource(model, name, required_fields, optional_fields=None):
             item = model.query.filter_by(id=id).first()
             if not item:
                 return {'error': f'{name} not found'}, 404
+            # Very large owners are emptied in the background rather than in one DELETE
+            if purge.dependents(model, id) > current_app.config['PURGE_THRESHOLD']:
+                app = current_app._get_current_object()
+                if not purge.submit(app, model, id):
+                    return {'message': f'{name} {id} is already being deleted'}, 202
+                return {'message': f'{name} {id} is being deleted in the background'}, 202
             db.session.delete(item)
             db.session.commit()
             return {}, 204
     
+    # Read-mostly catalog data is served from the response cache
+    if cached_reads:
+        ResourceList.method_decorators = {'get': [cache.cached(model.__tablename__, model=model)]}
+        ResourceByID.method_decorators = {'get': [cache.cached(model.__tablename__ + ':{id}', model=model)]}
+    
     # Make class names unique
     ResourceList.__name__ = f'{name}List'
     ResourceByID.__name__ = f'{name}ByID'
@@ -96,42 +151,70 @@ def create_resource(model, name, required_fields, optional_fields=None):
     return ResourceList, ResourceByID
 
 Users, UserByID = create_resource(User, 'User', ['username', 'email', 'password'], ['role'])
-Authors, AuthorByID = create_resource(Author, 'Author', ['name'], ['bio', 'birth_year', 'user_id'])
-Categories, CategoryByID = create_resource(Category, 'Category', ['name'], ['description', 'background_image'])
+Authors, AuthorByID = create_resource(Author, 'Author', ['name'], ['bio', 'birth_year', 'user_id'], cached_reads=True)
+CategoryList, CategoryByID = create_resource(Category, 'Category', ['name'], ['description', 'background_image'], cached_reads=True)
 Reviews, ReviewByID = create_resource(Review, 'Review', ['rating', 'content', 'user_id', 'book_id'])
 Collections, CollectionByID = create_resource(UserBookCollection, 'Collection', ['user_id', 'book_id', 'status'], ['date_added'])
 
+book_serializer = serializer_for(Book)
+
 class Books(Resource):
     def get(self):
+        try:
+            view = serializer_from_request(Book)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if 'ids' in request.args:
+            return multiget.multiget_response(view)
         admin_id = request.args.get('admin_id')
-        if admin_id:
-            books = Book.query.filter_by(created_by=admin_id).all()
-        else:
-            books = Book.query.all()
-        return [book.to_dict() for book in books], 200
+        criteria = [Book.created_by == admin_id] if admin_id else []
+        sort = request.args.get('sort')
+        if sort == 'rating':
+            return list_response(view, *criteria, sort_column=Book.average_rating, descending=True)
+        if sort not in (None, '', 'id'):
+            return {'error': 'sort must be one of: id, rating'}, 400
+        return list_response(view, *criteria)
+    
+    @staticmethod
+    def build(data):
+        return Book(
+            title=data['title'],
+            author_id=data['author_id'],
+            category_id=data['category_id'],
+            created_by=data['created_by'],
+            description=data.get('description'),
+            isbn=data.get('isbn'),
+            publication_year=data.get('publication_year')
+        )
     
     def post(self):
+        if bulk.is_bulk_request():
+            return bulk_call(bulk.bulk_create, self.build, book_serializer)
         data = request.get_json()
         try:
-            book = Book(
-                title=data['title'],
-                author_id=data['author_id'],
-                category_id=data['category_id'],
-                created_by=data['created_by'],
-                description=data.get('description'),
-                isbn=data.get('isbn'),
-                publication_year=data.get('publication_year')
-            )
+            book = self.build(data)
             db.session.add(book)
             db.session.commit()
-            return book.to_dict(), 201
+            return book_serializer.dump(book), 201
         except Exception as e:
             return {'error': str(e)}, 400
+    
+    def patch(self):
+        return bulk_call(bulk.bulk_update, Book, book_serializer)
+    
+    def delete(self):
+        return bulk_call(bulk.bulk_delete, Book)
 
 class BookByID(Resource):
+    method_decorators = {'get': [cache.cached('books:{id}', model=Book)]}
+    
     def get(self, id):
-        book = Book.query.filter_by(id=id).first()
-        return book.to_dict() if book else ({'error': 'Book not found'}, 404)
+        try:
+            view = serializer_from_request(Book)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        row = db.session.execute(view.select().where(Book.id == id)).first()
+        return view.from_row(row) if row else ({'error': 'Book not found'}, 404)
     
     def patch(self, id):
         book = Book.query.filter_by(id=id).first()
@@ -142,7 +225,7 @@ class BookByID(Resource):
                 setattr(book, attr, value)
             db.session.add(book)
             db.session.commit()
-            return book.to_dict(), 200
+            return book_serializer.dump(book), 200
         except Exception as e:
             return {'error': str(e)}, 400
     
@@ -154,6 +237,38 @@ class BookByID(Resource):
         db.session.commit()
         return {}, 204
 
+# ?counts=1 adds each category's book count and average rating
+class Categories(CategoryList):
+    method_decorators = {'get': [cache.cached('categories', model=Category, arg_tags={'counts': 'books'})]}
+    
+    def get(self):
+        if 'counts' not in request.args:
+            return super().get()
+        if wants_stream():
+            return {'error': 'counts cannot be combined with stream'}, 400
+        result = super().get()
+        if not isinstance(result, tuple) or result[1] != 200:
+            return result
+        items, code, *headers = result
+        if 'ids' in request.args:
+            categories.add_stats(items['items'])
+            return (items, code, *headers)
+        return (categories.add_stats(items), code, *headers)
+
+# One category's books, paged by id, title or year
+class CategoryBooks(Resource):
+    method_decorators = {'get': [cache.cached('books', 'categories:{id}', model=Book)]}
+    
+    def get(self, id):
+        try:
+            view = serializer_from_request(Book)
+            sort_column, descending = categories.sort_arg(request.args.get('sort'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if db.session.get(Category, id) is None:
+            return {'error': 'Category not found'}, 404
+        return list_response(view, Book.category_id == id, sort_column=sort_column, descending=descending)
+
 class Login(Resource):
     def post(self):
         data = request.get_json()
@@ -164,29 +279,180 @@ class Login(Resource):
             return {'error': 'Username and password required'}, 400
         
         user = User.query.filter_by(username=username).first()
-        if user and str(user.password).strip() == str(password).strip():
-            return user.to_dict(), 200
+        try:
+            matches, needs_rehash = verify_password(user.password, password) if user else (False, False)
+            if matches and needs_rehash:
+                # Legacy plaintext or outdated hash: store a fresh hash now that we have the password
+                user.password = password
+                db.session.commit()
+        except KDFBusy as e:
+            return {'error': e.description}, 503, {'Retry-After': '1'}
+        if matches:
+            return {**serializer_for(User).dump(user), 'token': auth.issue_token(user)}, 200
         else:
             return {'error': 'Invalid username or password'}, 401
 
+class Me(Resource):
+    method_decorators = [auth.login_required]
+    
+    def get(self):
+        return auth.current_identity(), 200
+
+class Search(Resource):
+    def get(self):
+        q = request.args.get('q', '').strip()
+        if not q:
+            return {'error': 'q is required'}, 400
+        try:
+            limit, offset = offset_args(default_limit=20)
+            view = serializer_from_request(Book)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        # One extra id tells whether there is a next page
+        ids = search.search_book_ids(q, limit + 1, offset)
+        headers = {}
+        if len(ids) > limit:
+            ids = ids[:limit]
+            headers['Link'] = next_link(offset=offset + limit)
+        rows = db.session.execute(view.select().where(Book.id.in_(ids))).all()
+        by_id = {view.row_id(row): item for row, item in zip(rows, view.from_rows(rows))}
+        return [by_id[id] for id in ids if id in by_id], 200, headers
+
+def ranked_books(query, owner, id):
+    # One query for the ranked page; the owner is looked up only to tell "none" from "not found"
+    try:
+        limit, offset = offset_args(default_limit=10)
+        view = serializer_from_request(Book)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    rows = db.session.execute(query(view, id).limit(limit).offset(offset)).all()
+    if not rows and db.session.get(owner, id) is None:
+        return {'error': f'{owner.__name__} not found'}, 404
+    return view.from_rows(rows), 200
+
+# "Readers also shelved" neighbours of a book, and picks for a user from their shelf
+class SimilarBooks(Resource):
+    def get(self, id):
+        return ranked_books(recommendations.similar_books_query, Book, id)
+
+class UserRecommendations(Resource):
+    def get(self, id):
+        return ranked_books(recommendations.recommended_books_query, User, id)
+
+# Books with the most recent reviews and shelf adds, per ?window=24h|7d|30d
+class TrendingBooks(Resource):
+    def get(self):
+        window = request.args.get('window', trending.DEFAULT_WINDOW)
+        if window not in trending.WINDOWS:
+            return {'error': f'window must be one of: {", ".join(trending.WINDOWS)}'}, 400
+        try:
+            limit, offset = offset_args(default_limit=10)
+            view = serializer_from_request(Book)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        period = db.session.get(TrendingPeriod, window)
+        if period is None:
+            return [], 200
+        rows = db.session.execute(trending.trending_books_query(view, window, period.epoch).limit(limit).offset(offset)).all()
+        return view.from_rows(rows), 200
+
+# Profile page: shelf entries grouped by status with counts, plus reviews, in four queries
+class UserShelf(Resource):
+    def get(self, id):
+        try:
+            limit, after = page_args()
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        user = db.session.get(User, id)
+        if not user:
+            return {'error': 'User not found'}, 404
+        section = request.args.get('section')
+        if section:
+            return shelf.shelf_section(user, section, after, limit or 20), 200
+        return shelf.shelf_summary(user, limit or 20), 200
+
+# Whole-catalog export, one table per request, streamed from a server-side cursor
+def export_stream(table, fmt):
+    # Its own connection: the request's session is closed before the body is sent
+    with db.engine.connect() as connection:
+        yield from transfer.export_chunks(connection, table, fmt)
+
+class Export(Resource):
+    method_decorators = [auth.admin_required]
+
+    def get(self):
+        return [{'table': name, 'url': f'{request.url_root}export/{name}'} for name in transfer.TABLES], 200
+
+class ExportTable(Resource):
+    method_decorators = [auth.admin_required]
+
+    def get(self, table):
+        if table not in transfer.TABLES:
+            return {'error': f'Unknown table: {table}'}, 404
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in transfer.FORMATS:
+            return {'error': f"format must be one of: {', '.join(transfer.FORMATS)}"}, 400
+        compress = request.args.get('gzip', '').lower() in ('1', 'true')
+        chunks = export_stream(transfer.TABLES[table], fmt)
+        mimetype = transfer.FORMATS[fmt]
+        if compress:
+            # A .gz file to save as is, not a Content-Encoding the client would undo
+            chunks, mimetype = transfer.gzip_chunks(chunks), 'application/gzip'
+        headers = {'Content-Disposition': f'attachment; filename="{transfer.filename(table, fmt, compress)}"'}
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+class CacheStats(Resource):
+    def get(self):
+        stats = cache.get_cache().stats()
+        rows = multiget.get_row_cache()
+        stats['rows'] = rows.stats() if rows else None
+        return stats, 200
+
 # Add resources to API
 api.add_resource(Users, '/users')
 api.add_resource(UserByID, '/users/<int:id>')
+api.add_resource(UserRecommendations, '/users/<int:id>/recommendations')
+api.add_resource(UserShelf, '/users/<int:id>/shelf')
 api.add_resource(Login, '/login')
+api.add_resource(Me, '/me')
 api.add_resource(Authors, '/authors')
 api.add_resource(AuthorByID, '/authors/<int:id>')
 api.add_resource(Categories, '/categories')
 api.add_resource(CategoryByID, '/categories/<int:id>')
+api.add_resource(CategoryBooks, '/categories/<int:id>/books')
 api.add_resource(Books, '/books')
 api.add_resource(BookByID, '/books/<int:id>')
+api.add_resource(SimilarBooks, '/books/<int:id>/similar')
+api.add_resource(TrendingBooks, '/books/trending')
 api.add_resource(Reviews, '/reviews')
 api.add_resource(ReviewByID, '/reviews/<int:id>')
 api.add_resource(Collections, '/collections')
 api.add_resource(CollectionByID, '/collections/<int:id>')
+api.add_resource(Search, '/search')
+api.add_resource(Export, '/export')
+api.add_resource(ExportTable, '/export/<string:table>')
+api.add_resource(CacheStats, '/cache/stats')
 
-# Ensure database tables are created
-with app.app_context():
-    db.create_all()
+def create_app(config=None):
+    """Build a configured app. Importing and calling this touches no database:
+    create the schema with ``flask init-db`` (or ``flask db upgrade``) and load
+    sample data with ``flask seed``."""
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+    init_extensions(app)
+    app.add_url_rule('/', 'home', home)
+    
+    # Request metrics (first, so every other hook is timed), response compression,
+    # response and row caches, session tokens and CLI commands
+    metrics.init_app(app, db)
+    compression.init_app(app)
+    cache.init_app(app)
+    multiget.init_app(app)
+    auth.init_app(app)
+    commands.init_app(app)
+    return app
 
 if __name__ == '__main__':
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    create_app().run(port=int(os.environ.get('PORT', 5000)), debug=True)
\ No newline at end of file
@@ -0,0 +1,293 @@
+# Standard library imports
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Remote library imports
+from flask import request
+
+# Local imports
+from . import cache, metrics, multiget, passwords
+from .app import (Authors, AuthorByID, BookByID, Books, Categories, CategoryByID, CollectionByID, Collections,
+                  ReviewByID, Reviews, UserByID, Users, create_app)
+from .config import api, db
+from .engine import create_read_engine
+from .models import Author, Book, Category, Review, User, UserBookCollection
+from .pagination import page_args, page_response, page_statement
+from .serializers import serializer_from_request
+
+# ASGI entry point (`uvicorn asgi:app`) for read-heavy traffic: an idle keep-alive
+# connection or a slow client costs a coroutine rather than a worker thread. The hot
+# reads, GET of one row, a keyset page and ?ids= multi-gets of the CRUD resources, run
+# here on an async engine. Everything else (writes, the other routes, streams, sorts,
+# included collections, and every error response) is handed to the unchanged Flask app
+# on a thread pool, so both entry points serve the same routes with the same bodies.
+# The async reads run inside a Flask request context built from the same environ: the
+# argument parsing, serializers, row cache, response cache (ETags, 304s) and
+# before/after-request hooks (metrics, CORS, compression) are the Flask app's own.
+
+# (list resource, one-row resource, model, name in 404s)
+RESOURCES = (
+    (Users, UserByID, User, 'User'),
+    (Authors, AuthorByID, Author, 'Author'),
+    (Categories, CategoryByID, Category, 'Category'),
+    (Books, BookByID, Book, 'Book'),
+    (Reviews, ReviewByID, Review, 'Review'),
+    (Collections, CollectionByID, UserBookCollection, 'Collection'),
+)
+LIST_ARGS = {'limit', 'after', 'include', 'fields'}
+MULTIGET_ARGS = {'ids', 'include', 'fields'}
+DETAIL_ARGS = {'include', 'fields'}
+# Chunks of a streamed Flask response buffered ahead of a slow client
+STREAM_QUEUE_SIZE = 8
+
+
+def _cache_spec(resource):
+    # The GET's cache.cached() spec (None when uncached), or False when it has another
+    # decorator (e.g. an auth check) that only the Flask app applies
+    decorators = resource.method_decorators
+    if isinstance(decorators, dict):
+        decorators = decorators.get('get', [])
+    specs = [getattr(decorator, 'cache_spec', None) for decorator in decorators]
+    if None in specs:
+        return False
+    return specs[0] if specs else None
+
+
+def _endpoints():
+    # Flask-RESTful names each endpoint after its resource class
+    routes = {}
+    for listing, detail, model, name in RESOURCES:
+        for kind, resource in (('list', listing), ('detail', detail)):
+            spec = _cache_spec(resource)
+            if spec is not False:
+                routes[resource.__name__.lower()] = (kind, model, name, spec)
+    return routes
+
+
+NATIVE = _endpoints()
+
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    # The whole body is read up front, chunked or not
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def _headers(pairs):
+    # The server sends its own Date; werkzeug adds one to 304s, which would repeat it
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in pairs
+            if name.lower() != 'date']
+
+
+class AsgiApp:
+    def __init__(self, app):
+        self.app = app
+        self.engine = create_read_engine(app, db)
+        metrics.instrument(app, self.engine.sync_engine)
+        self.executor = ThreadPoolExecutor(app.config['ASGI_THREADS'], thread_name_prefix='flask')
+        passwords.set_request_threads(app.config['ASGI_THREADS'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        body = await _read_body(receive)
+        if body is None:
+            return
+        environ = wsgi_environ(scope, body)
+        response = await self._native(environ)
+        if response is None:
+            await self._wsgi(environ, send)
+            return
+        # As a WSGI server would send it: no body or entity headers on a 304
+        body, status, headers = response.get_wsgi_response(environ)
+        await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                    'headers': _headers(headers)})
+        await send({'type': 'http.response.body', 'body': b''.join(body)})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # Async reads
+
+    def _plan(self):
+        # (handler, args, cache spec) when this request is one of the reads answered here,
+        # else None. Anything that doesn't parse goes to the Flask app, which words the 400.
+        route = NATIVE.get(request.url_rule.endpoint) if request.url_rule is not None else None
+        if route is None:
+            return None
+        kind, model, name, spec = route
+        args = set(request.args)
+        try:
+            view = serializer_from_request(model)
+            if view.collections:
+                return None
+            if kind == 'detail' and args <= DETAIL_ARGS:
+                return self._detail, (view, name, request.view_args['id']), spec
+            if kind == 'list' and 'ids' in args and args <= MULTIGET_ARGS:
+                return self._multiget, (view, multiget.parse_ids(request.args['ids'])), spec
+            if kind == 'list' and args <= LIST_ARGS:
+                return self._list, (view, *page_args()), spec
+        except ValueError:
+            return None
+        return None
+
+    async def _native(self, environ):
+        if environ['REQUEST_METHOD'] != 'GET':
+            return None
+        context = self.app.request_context(environ)
+        context.push()
+        error = None
+        try:
+            plan = self._plan()
+            if plan is None:
+                return None
+            try:
+                result = self.app.preprocess_request()
+                if result is None:
+                    result = await self._respond(*plan)
+                response = self.app.process_response(self.app.make_response(result))
+            except Exception as e:
+                error = e
+                response = self.app.make_response(self.app.handle_exception(e))
+            return response
+        finally:
+            context.pop(error)
+
+    async def _respond(self, handler, args, spec):
+        # The resource's cache.cached() around the async handler, as its decorator would be
+        lookup = cache.response_lookup(spec, request.view_args) if spec is not None else None
+        if lookup is None:
+            data, code, headers = await handler(*args)
+            return api.make_response(data, code, headers=headers)
+        responses, key, entry = lookup
+        if entry is None:
+            data, code, headers = await handler(*args)
+            entry = cache.store_response(responses, key, (data, code, headers))
+            if entry is None:
+                return api.make_response(data, code, headers=headers)
+        return cache.cached_response(entry)
+
+    async def _fetch(self, view, ids):
+        found, stamps = multiget.cached_rows(view, ids)
+        if stamps:
+            async with self.engine.connect() as connection:
+                rows = (await connection.execute(multiget.select_ids(view, list(stamps)))).all()
+            loaded = multiget.by_id(view, rows)
+            multiget.remember(view, stamps, loaded)
+            found.update(loaded)
+        return found
+
+    async def _detail(self, view, name, id):
+        found = await self._fetch(view, [id])
+        if id not in found:
+            return {'error': f'{name} not found'}, 404, {}
+        return found[id], 200, {}
+
+    async def _multiget(self, view, ids):
+        return multiget.ordered(ids, await self._fetch(view, ids)), 200, {}
+
+    async def _list(self, view, limit, after):
+        stmt = page_statement(view, anchor=None if after is None else [after], limit=limit)
+        async with self.engine.connect() as connection:
+            rows = (await connection.execute(stmt)).all()
+        return page_response(view, rows, limit)
+
+    # Everything else: the Flask app on the thread pool
+
+    async def _wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        # Bounded, so a slow client holds back a streamed body rather than buffering it all
+        queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        started = {}
+        gone = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        def run():
+            # Called and iterated in one thread: streamed bodies keep the request context they push
+            result = self.app(environ, start_response)
+            try:
+                for chunk in result:
+                    if gone.is_set():
+                        break
+                    if chunk:
+                        put(chunk)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+                put(None)
+
+        future = loop.run_in_executor(self.executor, run)
+        try:
+            chunk = await queue.get()
+            if chunk is None:
+                await future
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': _headers(started['headers'])})
+            while chunk is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await queue.get()
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # A disconnected client: let the thread finish instead of waiting on a full queue
+            gone.set()
+            while not queue.empty():
+                queue.get_nowait()
+        await future
+
+
+def create_asgi_app(config=None):
+    """The Flask app behind an ASGI interface; requires aiosqlite (or asyncpg for PostgreSQL)."""
+    return AsgiApp(create_app(config))
@@ -0,0 +1,175 @@
+# Standard library imports
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+# Remote library imports
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy import event, select
+
+# Local imports
+from .config import db
+from .models import User
+
+# Signed session tokens: "Authorization: Bearer <token>". A token carries the user id
+# and a keyed fingerprint of the password hash (so changing the password revokes it,
+# and the readable payload gives nothing of the hash away), and
+# is checked against the users table once, then served from a per-worker LRU of
+# verified tokens until it expires or the user is changed in this worker. Entries
+# also age out after TOKEN_CACHE_TTL so role changes made by other workers apply.
+
+TOKEN_SALT = 'bookshelf-session'
+DEV_SECRET_KEY = 'dev-insecure-secret'
+# Writes allowed without a token when AUTH_REQUIRED is on: logging in and signing up
+PUBLIC_WRITES = {('POST', '/login'), ('POST', '/users')}
+
+
+class TokenCache:
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return item[1]
+
+    def set(self, token, identity, expires_in):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + min(self.ttl, expires_in), identity)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard_users(self, user_ids):
+        with self._lock:
+            for token in [t for t, (_, identity) in self._entries.items() if identity['id'] in user_ids]:
+                del self._entries[token]
+
+
+def init_app(app):
+    if not app.config.get('SECRET_KEY'):
+        if app.debug or app.testing:
+            app.config['SECRET_KEY'] = DEV_SECRET_KEY
+        else:
+            # A known key would let anyone sign tokens; a random one only ends sessions on restart
+            app.config['SECRET_KEY'] = os.urandom(32).hex()
+            app.logger.warning('SECRET_KEY is not set: signing tokens with a random key, so a restart '
+                               'invalidates them and workers without a preloading master reject each other\'s')
+    app.extensions['token_cache'] = TokenCache(app.config['TOKEN_CACHE_MAX_ENTRIES'], app.config['TOKEN_CACHE_TTL'])
+    app.before_request(_require_token)
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+
+def _fingerprint(password_hash):
+    key = hashlib.sha256(current_app.config['SECRET_KEY'].encode() + b'password-fingerprint').digest()
+    return hmac.new(key, password_hash.encode(), 'sha256').hexdigest()[:16]
+
+
+def issue_token(user):
+    return _serializer().dumps({'id': user.id, 'pw': _fingerprint(user.password)})
+
+
+def verify_token(token):
+    """Return the identity behind a token, or None if it is invalid, expired or revoked."""
+    cache = current_app.extensions['token_cache']
+    identity = cache.get(token)
+    if identity is not None:
+        return identity
+    max_age = current_app.config['TOKEN_MAX_AGE']
+    try:
+        payload, issued = _serializer().loads(token, max_age=max_age, return_timestamp=True)
+    except (BadSignature, SignatureExpired):
+        return None
+    row = db.session.execute(
+        select(User.id, User.username, User.role, User.password).where(User.id == payload.get('id'))
+    ).first()
+    if row is None or _fingerprint(row.password) != payload.get('pw'):
+        return None
+    identity = {'id': row.id, 'username': row.username, 'role': row.role}
+    cache.set(token, identity, max_age - (time.time() - issued.timestamp()))
+    return identity
+
+
+def current_identity():
+    if 'identity' not in g:
+        header = request.headers.get('Authorization', '')
+        scheme, _, token = header.partition(' ')
+        g.identity = verify_token(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+    return g.identity
+
+
+def login_required(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if current_identity() is None:
+            return {'error': 'Authentication required'}, 401
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def admin_required(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        identity = current_identity()
+        if identity is None:
+            return {'error': 'Authentication required'}, 401
+        if identity['role'] != 'admin':
+            return {'error': 'Admin role required'}, 403
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def _require_token():
+    # With AUTH_REQUIRED on, every write needs a valid token
+    if not current_app.config['AUTH_REQUIRED'] or request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    if (request.method, request.path.rstrip('/')) in PUBLIC_WRITES or current_identity() is not None:
+        return None
+    return {'error': 'Authentication required'}, 401
+
+
+# Drop cached identities of users changed or deleted in this worker
+
+@event.listens_for(Session, 'after_flush')
+def _collect_users(session, flush_context):
+    changed = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('token_users', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _discard_committed(session):
+    users = session.info.pop('token_users', None)
+    if users and has_app_context():
+        cache = current_app.extensions.get('token_cache')
+        if cache is not None:
+            cache.discard_users(users)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_rolled_back(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('token_users', None)
@@ -0,0 +1,173 @@
+# Standard library imports
+import json
+
+# Remote library imports
+from flask import request
+from sqlalchemy.exc import SQLAlchemyError
+
+# Local imports
+from .config import db
+
+# Bulk writes: a JSON array or NDJSON body on the list endpoints. Each call is one
+# transaction; the whole batch goes through a single flush (executemany), and only
+# if that fails are items retried one savepoint at a time to report per-item errors.
+
+MAX_BULK_ITEMS = 10000
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson')
+ITEM_ERRORS = (SQLAlchemyError, KeyError, ValueError, TypeError)
+
+
+class BulkError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_bulk_request():
+    return request.mimetype in NDJSON_TYPES or isinstance(request.get_json(silent=True), list)
+
+
+def read_items():
+    if request.mimetype in NDJSON_TYPES:
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    raise BulkError(f'line {number} is not valid JSON')
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise BulkError('expected a JSON array or NDJSON body')
+    if len(items) > MAX_BULK_ITEMS:
+        raise BulkError(f'at most {MAX_BULK_ITEMS} items per request', 413)
+    return items
+
+
+def read_ids():
+    # ?ids=1,2,3 or a body of {"ids": [...]} / [...]
+    if request.args.get('ids'):
+        try:
+            ids = [int(id) for id in request.args['ids'].split(',') if id.strip()]
+        except ValueError:
+            raise BulkError('ids must be a comma-separated list of integers')
+    else:
+        body = request.get_json(silent=True)
+        ids = body.get('ids') if isinstance(body, dict) else body
+        if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+            raise BulkError('expected ?ids= or a JSON body of ids')
+    if len(ids) > MAX_BULK_ITEMS:
+        raise BulkError(f'at most {MAX_BULK_ITEMS} ids per request', 413)
+    return ids
+
+
+def describe(error):
+    if isinstance(error, KeyError):
+        return f'missing field {error}'
+    if isinstance(error, SQLAlchemyError) and getattr(error, 'orig', None) is not None:
+        return str(error.orig)
+    return str(error)
+
+
+def _apply(operations, errors):
+    # operations: (index, fn) where fn stages one item in the session and returns it
+    try:
+        with db.session.begin_nested():
+            return [(index, fn()) for index, fn in operations]
+    except ITEM_ERRORS:
+        pass
+    done = []
+    for index, fn in operations:
+        try:
+            with db.session.begin_nested():
+                obj = fn()
+            done.append((index, obj))
+        except ITEM_ERRORS as e:
+            errors.append({'index': index, 'error': describe(e)})
+    return done
+
+
+def _respond(key, results, errors, success_status):
+    errors.sort(key=lambda error: error['index'])
+    body = {key: results, 'errors': errors}
+    if not errors:
+        return body, success_status
+    return body, (207 if results else 400)
+
+
+def _load(model, ids):
+    found = {}
+    for start in range(0, len(ids), 500):
+        for obj in model.query.filter(model.id.in_(ids[start:start + 500])):
+            found[obj.id] = obj
+    return found
+
+
+def bulk_create(build, serializer):
+    items = read_items()
+    errors = []
+
+    def stage(item):
+        def fn():
+            if not isinstance(item, dict):
+                raise ValueError('item must be a JSON object')
+            obj = build(item)
+            db.session.add(obj)
+            return obj
+        return fn
+
+    done = _apply([(index, stage(item)) for index, item in enumerate(items)], errors)
+    # Serialize before commit so the rows aren't expired and reloaded one by one
+    created = [serializer.dump(obj) for _, obj in done]
+    db.session.commit()
+    return _respond('created', created, errors, 201)
+
+
+def bulk_update(model, serializer):
+    items = read_items()
+    errors, operations = [], []
+    found = _load(model, [item['id'] for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)])
+
+    def stage(obj, changes):
+        def fn():
+            for attr, value in changes.items():
+                setattr(obj, attr, value)
+            return obj
+        return fn
+
+    for index, item in enumerate(items):
+        obj = found.get(item.get('id')) if isinstance(item, dict) else None
+        if obj is None:
+            errors.append({'index': index, 'error': 'not found' if isinstance(item, dict) else 'item must be a JSON object'})
+            continue
+        operations.append((index, stage(obj, {attr: value for attr, value in item.items() if attr != 'id'})))
+
+    done = _apply(operations, errors)
+    updated = [serializer.dump(obj) for _, obj in done]
+    db.session.commit()
+    return _respond('updated', updated, errors, 200)
+
+
+def bulk_delete(model):
+    ids = read_ids()
+    errors, operations = [], []
+    # Children are deleted by the database (ON DELETE CASCADE), so none are loaded
+    found = _load(model, ids)
+
+    def stage(obj):
+        def fn():
+            db.session.delete(obj)
+            return obj
+        return fn
+
+    for index, id in enumerate(ids):
+        if id in found:
+            operations.append((index, stage(found[id])))
+        else:
+            errors.append({'index': index, 'error': 'not found'})
+
+    done = _apply(operations, errors)
+    deleted = [ids[index] for index, _ in done]
+    db.session.commit()
+    return _respond('deleted', deleted, errors, 200)
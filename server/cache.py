@@ -0,0 +1,334 @@
+# Standard library imports
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+# Remote library imports
+from flask import Response, current_app, has_app_context, request
+from flask_restful import unpack
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+
+# Local imports
+from .cascades import cascaded
+from .config import api
+
+# Cached GET responses are keyed by URL plus the current version of each tag they
+# depend on ('books' for listings, 'books:5' for one row). A committed write bumps
+# the versions of the tags it touches, so stale entries are never read again and
+# age out through LRU/TTL eviction. Writes that change rows without naming them one by
+# one (database cascades, purges, rebuilds) also bump '<table>:*' for the tables whose
+# rows they changed, so caches of individual rows (multiget) can tell.
+
+# A write to these tables also changes another resource's representation
+RELATED_TAGS = {
+    # Reviews feed the book's rating aggregates
+    'reviews': ('book_id', 'books'),
+}
+
+
+def _row_tag(tag):
+    # 'books:5' names one row; 'books' and 'books:*' a whole table
+    table, _, row = tag.partition(':')
+    return table if row and row != '*' else None
+
+
+class MemoryBackend:
+    # Per-process LRU with TTL; coherent only within one worker. Table tags keep their
+    # versions for good (there are a few dozen); row tags are themselves an LRU of
+    # max_versions. An evicted row tag reads as the highest version evicted from its table,
+    # which is at least its own, so a tag's version never goes back to one an entry was
+    # stored under and the next bump still makes that entry unreachable.
+
+    def __init__(self, max_entries=1024, ttl=300, max_versions=10000):
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._row_versions = OrderedDict()
+        self._floors = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _version(self, tag):
+        table = _row_tag(tag)
+        if table is None:
+            return self._versions.get(tag, 0)
+        version = self._row_versions.get(tag)
+        if version is None:
+            return self._floors.get(table, 0)
+        self._row_versions.move_to_end(tag)
+        return version
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._version(tag) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                version = self._version(tag) + 1
+                if _row_tag(tag) is None:
+                    self._versions[tag] = version
+                else:
+                    self._row_versions[tag] = version
+            while len(self._row_versions) > self.max_versions:
+                tag, version = self._row_versions.popitem(last=False)
+                table = _row_tag(tag)
+                self._floors[table] = max(self._floors.get(table, 0), version)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    # Shared by every gunicorn worker; size is bounded by TTL and Redis' maxmemory policy.
+    # A version key expires VERSION_TTL_FACTOR entry TTLs after its last bump: by then every
+    # entry stored under any of its versions has expired, so restarting it from 0 is safe.
+
+    VERSION_TTL_FACTOR = 2
+
+    def __init__(self, url, ttl=300, prefix='bookshelf:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def versions(self, tags):
+        return [int(v) if v is not None else 0 for v in self.client.mget([self.prefix + 'v:' + t for t in tags])]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(self.prefix + 'v:' + tag)
+            pipe.expire(self.prefix + 'v:' + tag, self.ttl * self.VERSION_TTL_FACTOR)
+        pipe.execute()
+
+    def size(self):
+        return None
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'evictions': self.backend.evictions,
+            'entries': self.backend.size(),
+        }
+
+
+def init_app(app):
+    url = app.config.get('RESPONSE_CACHE_URL')
+    ttl = app.config.get('RESPONSE_CACHE_TTL', 300)
+    if url:
+        backend = RedisBackend(url, ttl=ttl)
+    else:
+        backend = MemoryBackend(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024), ttl=ttl,
+                                max_versions=app.config.get('RESPONSE_CACHE_MAX_VERSIONS', 10000))
+    app.extensions['response_cache'] = ResponseCache(backend)
+
+
+def get_cache():
+    return current_app.extensions.get('response_cache')
+
+
+def invalidate(*tags):
+    cache = get_cache() if has_app_context() else None
+    if cache and tags:
+        cache.backend.bump(tags)
+        cache.invalidations += len(tags)
+
+
+def all_rows(*tables):
+    # The tag for "some rows of these tables changed, which ones wasn't tracked"
+    return [f'{table}:*' for table in tables]
+
+
+def _include_tags(model):
+    # ?include=author also depends on every write to the authors table
+    relationships = inspect(model).relationships
+    names = request.args.get('include', '').split(',')
+    return [relationships[name.strip()].mapper.class_.__tablename__
+            for name in names if name.strip() in relationships]
+
+
+def response_lookup(spec, view_args):
+    """(cache, key, entry or None) for this GET under a cached() spec, or None when the
+    response cache is off or the response is streamed."""
+    tag_templates, model, arg_tags = spec
+    cache = get_cache()
+    if cache is None or 'stream' in request.args:
+        return None
+    tags = [template.format(**view_args) for template in tag_templates]
+    if model is not None:
+        tags.extend(_include_tags(model))
+    tags.extend(tag for arg, tag in (arg_tags or {}).items() if arg in request.args)
+    versions = cache.backend.versions(tags)
+    key = 'r:' + request.full_path + '|' + ','.join(map(str, versions))
+    entry = cache.backend.get(key)
+    if entry is None:
+        cache.misses += 1
+    else:
+        cache.hits += 1
+    return cache, key, entry
+
+
+def store_response(cache, key, result):
+    """Cache a resource's return value under key; None (nothing stored) unless it is a 200."""
+    if isinstance(result, Response):
+        return None
+    data, code, headers = unpack(result)
+    if code != 200:
+        return None
+    response = api.make_response(data, code, headers=headers)
+    body = response.get_data()
+    entry = {
+        'body': body,
+        'mimetype': response.mimetype,
+        'headers': [(name, value) for name, value in response.headers if name == 'Link'],
+        'etag': hashlib.blake2b(body, digest_size=16).hexdigest(),
+        'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+    }
+    cache.backend.set(key, entry)
+    return entry
+
+
+def cached_response(entry):
+    response = Response(entry['body'], status=200, mimetype=entry['mimetype'], headers=entry['headers'])
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    # Answers If-None-Match / If-Modified-Since with 304
+    return response.make_conditional(request)
+
+
+def cached(*tag_templates, model=None, arg_tags=None):
+    """Cache a Resource GET; tags may use the view arguments, e.g. 'books:{id}'.
+
+    arg_tags maps a query argument to the tag it adds when present, for options that pull
+    in another table (e.g. {'counts': 'books'}).
+    """
+    spec = (tag_templates, model, arg_tags)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            lookup = response_lookup(spec, kwargs)
+            if lookup is None:
+                return f(*args, **kwargs)
+            cache, key, entry = lookup
+            if entry is None:
+                result = f(*args, **kwargs)
+                entry = store_response(cache, key, result)
+                if entry is None:
+                    return result
+            return cached_response(entry)
+
+        return wrapper
+
+    # Read by the ASGI entry point, which answers some cached GETs itself
+    decorator.cache_spec = spec
+    return decorator
+
+
+def cached_value(name, tags, compute):
+    """compute(), kept in the cache backend until a write bumps one of tags."""
+    cache = get_cache()
+    if cache is None:
+        return compute()
+    key = 'a:' + name + '|' + ','.join(map(str, cache.backend.versions(tags)))
+    value = cache.backend.get(key)
+    if value is None:
+        value = compute()
+        cache.backend.set(key, value)
+    return value
+
+
+# Write-driven invalidation: collect tags during flush, bump them once the commit lands
+
+def _tags_for(obj):
+    table = obj.__tablename__
+    tags = {table, f'{table}:{obj.id}'}
+    if table in RELATED_TAGS:
+        column, related = RELATED_TAGS[table]
+        # Include the parent the row moved away from, if it changed
+        parents = {getattr(obj, column), *inspect(obj).attrs[column].history.deleted}
+        tags.add(related)
+        tags.update(f'{related}:{parent}' for parent in parents)
+    return tags
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in session.new | session.deleted:
+        tags.update(_tags_for(obj))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            tags.update(_tags_for(obj))
+    plan = cascaded(session)
+    if plan:
+        # Rows the database deleted or changed by cascade
+        tags.update(('books', 'reviews', 'user_book_collections'))
+        tags.update(all_rows('reviews', 'user_book_collections'))
+        if plan['authors']:
+            tags.add('authors')
+            tags.update(f'authors:{id}' for id in plan['authors'])
+        tags.update(f'books:{id}' for id in plan['books'] | plan['rated'] | plan['unowned'])
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_tags(session, transaction):
+    # A rolled-back outer transaction changed nothing; savepoint rollbacks keep their tags
+    if transaction.parent is None:
+        session.info.pop('cache_tags', None)
@@ -0,0 +1,73 @@
+# Standard library imports
+from collections import defaultdict
+
+# Remote library imports
+from flask_sqlalchemy.session import Session
+from sqlalchemy import case, event, func, or_, select
+
+# Local imports
+from .models import Author, Book, Category, Review, User, UserBookCollection, subtract_ratings
+
+# Deleting a user, author or category removes everything under it in the database: the
+# foreign keys are ON DELETE CASCADE (SET NULL for books.created_by) and the relationships
+# passive_deletes, so the ORM no longer loads each child to delete it row by row. Those
+# rows never reach the session, so before the flush this works out, in one indexed query
+# per table, what the database is about to remove, for the listeners that keep derived
+# data in step: the rating aggregates (taken straight off here), the search index,
+# recommendations and the response cache (which read cascaded()).
+
+_books, _reviews, _collections, _authors = (
+    model.__table__ for model in (Book, Review, UserBookCollection, Author))
+
+
+def _deleted(session, model):
+    return {obj.id for obj in session.deleted if isinstance(obj, model)}
+
+
+def cascaded(session):
+    """What the current flush deletes by cascade, or None.
+
+    A dict of id sets: 'users', 'authors' and 'books' deleted, 'rated' books that lose
+    reviews, 'unowned' books whose creator is deleted, and 'shelves', each deleted user's
+    shelved book ids.
+    """
+    return session.info.get('cascade')
+
+
+# Registered after models' before_flush (this module imports models), so the review
+# deltas added here survive its reset
+@event.listens_for(Session, 'before_flush')
+def _plan_cascades(session, flush_context, instances):
+    session.info.pop('cascade', None)
+    users, authors, categories = (_deleted(session, model) for model in (User, Author, Category))
+    if not (users or authors or categories):
+        return
+
+    connection = session.connection()
+    if users:
+        authors |= set(connection.execute(select(_authors.c.id).where(_authors.c.user_id.in_(users))).scalars())
+    books = set()
+    if authors or categories:
+        books = set(connection.execute(select(_books.c.id).where(
+            or_(_books.c.author_id.in_(authors), _books.c.category_id.in_(categories)))).scalars())
+    plan = {'users': users, 'authors': authors, 'books': books, 'rated': set(), 'unowned': set(),
+            'shelves': defaultdict(set)}
+
+    if users:
+        plan['unowned'] = set(connection.execute(
+            select(_books.c.id).where(_books.c.created_by.in_(users))).scalars()) - books
+        stats = select(
+            _reviews.c.book_id, func.count(), func.sum(_reviews.c.rating),
+            *[func.sum(case((_reviews.c.rating == stars, 1), else_=0)) for stars in range(1, 6)],
+        ).where(_reviews.c.user_id.in_(users)).group_by(_reviews.c.book_id)
+        # Reviews loaded before the delete are deleted by the ORM, which already counted them
+        loaded = _deleted(session, Review)
+        if loaded:
+            stats = stats.where(_reviews.c.id.not_in(loaded))
+        rows = connection.execute(stats).all()
+        subtract_ratings(session, rows)
+        plan['rated'] = {row[0] for row in rows} - books
+        for user_id, book_id in connection.execute(
+                select(_collections.c.user_id, _collections.c.book_id).where(_collections.c.user_id.in_(users))):
+            plan['shelves'][user_id].add(book_id)
+    session.info['cascade'] = plan
@@ -0,0 +1,55 @@
+# Remote library imports
+from sqlalchemy import Float, case, cast, func, select
+
+# Local imports
+from . import cache
+from .config import db
+from .models import Book
+
+# Category browsing. ?counts=1 on /categories adds each category's book count and average
+# rating, from one GROUP BY over books kept in the cache backend until a book or review
+# write bumps the 'books' tag. /categories/<id>/books pages one category's books by id,
+# title or year through the (category_id, <sort key>, id) indexes on books.
+
+# ?sort= for /categories/<id>/books; a leading '-' sorts descending
+SORTS = {
+    'title': Book.title,
+    # Books without a year sort as the oldest; the index is on the same expression
+    'year': func.coalesce(Book.publication_year, 0),
+}
+
+EMPTY = {'book_count': 0, 'average_rating': 0.0}
+
+
+def _compute_stats():
+    books = Book.__table__
+    reviews = func.sum(books.c.review_count)
+    stmt = select(
+        books.c.category_id, func.count(),
+        case((reviews > 0, cast(func.sum(books.c.rating_sum), Float) / reviews), else_=0.0),
+    ).group_by(books.c.category_id)
+    return {category_id: {'book_count': count, 'average_rating': average}
+            for category_id, count, average in db.session.execute(stmt)}
+
+
+def category_stats():
+    """{category_id: {'book_count', 'average_rating'}}; the average is over every review."""
+    return cache.cached_value('category_stats', ['books'], _compute_stats)
+
+
+def add_stats(items):
+    stats = category_stats()
+    for item in items:
+        item.update(stats.get(item['id'], EMPTY))
+    return items
+
+
+def sort_arg(value):
+    """(column, descending) for ?sort=; (None, False) pages by id."""
+    if value in (None, '', 'id'):
+        return None, False
+    descending = value.startswith('-')
+    column = SORTS.get(value.lstrip('-'))
+    if column is None:
+        raise ValueError('sort must be one of: id, title, -title, year, -year')
+    return column, descending
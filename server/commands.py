@@ -0,0 +1,370 @@
+# Standard library imports
+import sys
+import time
+from itertools import combinations
+
+# Remote library imports
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, inspect, select, text, tuple_
+
+# Local imports
+from . import cache, purge
+from .config import db, init_migrate
+from .models import (Author, Book, BookSimilarity, BookTrending, Category, Review, User, UserBookCollection,
+                     recompute_rating_aggregates)
+from .recommendations import rebuild_recommendations
+from .search import rebuild_index
+from .transfer import FORMATS, IMPORT_BATCH_SIZE, TransferError, export_catalog, import_catalog
+from .trending import rebuild_trending
+
+# Lookups that back relationship loads and filters; each must be served by an index
+HOT_QUERIES = {
+    'reviews by book': select(Review.id).where(Review.book_id == 1),
+    'reviews by user': select(Review.id).where(Review.user_id == 1),
+    'collections by user': select(UserBookCollection.id).where(UserBookCollection.user_id == 1),
+    'collections by book': select(UserBookCollection.id).where(UserBookCollection.book_id == 1),
+    'collection by user and book': select(UserBookCollection.id).where(
+        UserBookCollection.user_id == 1, UserBookCollection.book_id == 1),
+    'books by author': select(Book.id).where(Book.author_id == 1),
+    'books by category': select(Book.id).where(Book.category_id == 1),
+    'books by category, paged': select(Book.id).where(Book.category_id == 1, Book.id > 0).order_by(Book.id).limit(20),
+    'books by category and title, paged': select(Book.id).where(
+        Book.category_id == 1, tuple_(Book.title, Book.id) > ('M', 0)).order_by(Book.title, Book.id).limit(20),
+    'books by category and year, newest first': select(Book.id).where(Book.category_id == 1).order_by(
+        func.coalesce(Book.publication_year, 0).desc(), Book.id.desc()).limit(20),
+    'shelf by user and status, paged': select(UserBookCollection.id).where(
+        UserBookCollection.user_id == 1, UserBookCollection.status == 'read', UserBookCollection.id > 0
+    ).order_by(UserBookCollection.id).limit(20),
+    'books by admin, paged': select(Book.id).where(Book.created_by == 1, Book.id > 0).order_by(Book.id).limit(20),
+    'authors by user': select(Author.id).where(Author.user_id == 1),
+    'books by rating, paged': select(Book.id).order_by(Book.average_rating.desc(), Book.id.desc()).limit(20),
+    'similar books by book': select(BookSimilarity.score).where(BookSimilarity.book_id == 1),
+    'similar-book entries naming a book': select(BookSimilarity.book_id).where(BookSimilarity.similar_book_id == 1),
+    'trending books, top k': select(BookTrending.book_id).where(
+        BookTrending.period == '7d', BookTrending.score >= 0.5).order_by(
+        BookTrending.score.desc(), BookTrending.book_id.desc()).limit(20),
+}
+
+
+def _explain(connection, stmt):
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    if connection.dialect.name == 'sqlite':
+        rows = connection.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+        plan = [row[-1] for row in rows]
+        # "SCAN books" is a full scan; "SCAN ... USING (COVERING) INDEX" is not
+        scans = [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+    else:
+        plan = [row[0] for row in connection.execute(text(f'EXPLAIN {compiled}'))]
+        scans = [line for line in plan if 'Seq Scan' in line]
+    return plan, scans
+
+
+def check_query_plans():
+    failures = {}
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Small tables would otherwise always be seq-scanned
+            connection.execute(text('SET enable_seqscan = off'))
+        for name, stmt in HOT_QUERIES.items():
+            plan, scans = _explain(connection, stmt)
+            click.echo(f'{"FAIL" if scans else "ok":<4}  {name}: {"; ".join(plan)}')
+            if scans:
+                failures[name] = scans
+    return failures
+
+
+# Listings whose ?include= combinations must cost a fixed number of queries
+LISTINGS = {
+    '/books': Book,
+    '/reviews': Review,
+    '/collections': UserBookCollection,
+    '/authors': Author,
+    '/categories': Category,
+    '/users': User,
+}
+
+# Per-user, per-book and per-category pages with a fixed budget however many rows sit
+# behind them; filled in with the user who shelved the most books, the most-shelved book
+# and the largest category
+PAGES = {
+    '/users/{user}/shelf?limit={limit}': 4,
+    '/users/{user}/shelf?section=read&limit={limit}': 2,
+    '/users/{user}/recommendations?limit={limit}': 2,
+    '/books/{book}/similar': 2,
+    '/categories?counts=1&limit={limit}': 2,
+    '/categories/{category}/books?sort=title&limit={limit}': 2,
+    '/books/trending?window=7d&limit={limit}': 2,
+    '/books?ids={book},10,20,30': 1,
+    '/books?ids={book},10,20,30&include=reviews': 2,
+}
+
+
+def _count_queries(client, url):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return response.status_code, len(statements)
+
+
+def include_budgets(limit=100):
+    """(url, queries) for every ?include= combination of every listing: one SELECT for the
+    page (to-one includes are joined in) plus one per included collection."""
+    for path, model in LISTINGS.items():
+        relationships = list(inspect(model).relationships)
+        for size in range(len(relationships) + 1):
+            for include in combinations(relationships, size):
+                budget = 1 + sum(1 for rel in include if rel.uselist)
+                yield f'{path}?limit={limit}&include=' + ','.join(rel.key for rel in include), budget
+
+
+def check_query_counts(limit=100):
+    app = current_app._get_current_object()
+    client = app.test_client()
+    # Measure the queries themselves, not cache hits
+    response_cache = app.extensions.pop('response_cache', None)
+    failures = {}
+    try:
+        for url, budget in include_budgets(limit):
+            status, queries = _count_queries(client, url)
+            ok = status == 200 and queries <= budget
+            click.echo(f'{"ok" if ok else "FAIL":<4}  {url}: {queries} queries (budget {budget}, status {status})')
+            if not ok:
+                failures[url] = queries
+        busiest = {
+            column: db.session.execute(
+                select(getattr(UserBookCollection, f'{column}_id')).group_by(getattr(UserBookCollection, f'{column}_id'))
+                .order_by(func.count().desc()).limit(1)).scalar() or 1
+            for column in ('user', 'book')
+        }
+        busiest['category'] = db.session.execute(
+            select(Book.category_id).group_by(Book.category_id).order_by(func.count().desc()).limit(1)).scalar() or 1
+        for template, budget in PAGES.items():
+            url = template.format(limit=limit, **busiest)
+            status, queries = _count_queries(client, url)
+            ok = status == 200 and queries <= budget
+            click.echo(f'{"ok" if ok else "FAIL":<4}  {url}: {queries} queries (budget {budget}, status {status})')
+            if not ok:
+                failures[url] = queries
+    finally:
+        if response_cache is not None:
+            app.extensions['response_cache'] = response_cache
+    return failures
+
+
+class MigrateGroup(click.Group):
+    # Stands in for Flask-Migrate's `flask db` group, importing it (and alembic) only when used
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate.cli import db as group
+
+        init_migrate(current_app)
+        return group.make_context(info_name, args, parent=parent, **extra)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables; a new database is stamped with the latest migration."""
+    fresh = not inspect(db.engine).get_table_names()
+    db.create_all()
+    if fresh:
+        from flask_migrate import stamp
+
+        init_migrate(current_app)
+        stamp()
+        click.echo('Created the schema and stamped it with the latest migration')
+    else:
+        click.echo('Created missing tables; run `flask db upgrade` to apply pending migrations')
+
+
+@click.command('seed')
+@click.option('--reset', is_flag=True, help='Delete every row first and load the larger demo data set.')
+@with_appcontext
+def seed_command(reset):
+    """Load sample data into an empty database."""
+    from . import seed
+
+    if reset:
+        seed.seed_data()
+        # Bulk deletes bypass the ORM hooks that keep the search index in step
+        with db.engine.begin() as connection:
+            rebuild_index(connection)
+            rebuild_recommendations(connection)
+    elif seed.seed_if_empty():
+        click.echo('Sample data loaded')
+    else:
+        click.echo('Database already has users; nothing seeded')
+
+
+@click.command('seed-synthetic')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--categories', default=20, show_default=True)
+@click.option('--authors', default=500, show_default=True)
+@click.option('--books', default=10000, show_default=True)
+@click.option('--reviews', default=100000, show_default=True)
+@click.option('--collections', default=50000, show_default=True)
+@click.option('--skew', type=click.Choice(['zipf', 'uniform']), default='zipf', show_default=True,
+              help='How reviews and shelf entries spread over books (and reviews over users).')
+@click.option('--zipf-exponent', default=1.1, show_default=True)
+@click.option('--seed', 'random_seed', default=42, show_default=True, help='Same seed, same rows.')
+@click.option('--batch-size', default=5000, show_default=True)
+@with_appcontext
+def seed_synthetic_command(users, categories, authors, books, reviews, collections, skew, zipf_exponent,
+                           random_seed, batch_size):
+    """Append synthetic load-test data in bulk, then rebuild ratings, search, recommendations and trending."""
+    from .synthetic import SYNTHETIC_PASSWORD, generate
+
+    with db.engine.connect() as connection:
+        stats = generate(connection, users=users, categories=categories, authors=authors, books=books,
+                         reviews=reviews, collections=collections, skew=skew, exponent=zipf_exponent,
+                         seed=random_seed, batch_size=batch_size, report=click.echo)
+    rows = sum(written for written, _ in stats.values())
+    elapsed = sum(seconds for _, seconds in stats.values())
+    if elapsed:
+        click.echo(f'  {"total":<22} {rows:>11,} rows  {elapsed:8.2f}s  {rows / elapsed:>10,.0f} rows/s')
+
+    # Core inserts skip the ORM hooks that maintain these
+    start = time.perf_counter()
+    with db.engine.begin() as connection:
+        recompute_rating_aggregates(connection)
+        rebuild_index(connection)
+        rebuild_recommendations(connection)
+        rebuild_trending(connection)
+    cache.invalidate(*stats, *cache.all_rows('books'))
+    click.echo(f'Rebuilt rating aggregates, the search index, recommendations and trending in '
+               f'{time.perf_counter() - start:.2f}s; '
+               f'synthetic users log in with password {SYNTHETIC_PASSWORD!r}')
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """Fail if any hot lookup query plans a full table scan."""
+    if check_query_plans():
+        sys.exit(1)
+
+
+@click.command('check-query-counts')
+@click.option('--limit', default=100, show_default=True, help='Page size to request.')
+@with_appcontext
+def check_query_counts_command(limit):
+    """Fail if any ?include= combination or per-user page issues more queries than its fixed budget."""
+    if check_query_counts(limit):
+        sys.exit(1)
+
+
+@click.command('repair-ratings')
+@with_appcontext
+def repair_ratings_command():
+    """Recompute every book's rating aggregates from the reviews table."""
+    with db.engine.begin() as connection:
+        updated = recompute_rating_aggregates(connection)
+    click.echo(f'Recomputed rating aggregates for {updated} reviewed books')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from books, authors and categories."""
+    with db.engine.begin() as connection:
+        rebuild_index(connection)
+    click.echo('Search index rebuilt')
+
+
+@click.command('rebuild-recommendations')
+@with_appcontext
+def rebuild_recommendations_command():
+    """Recompute every book's "readers also shelved" neighbours from the collections table."""
+    start = time.perf_counter()
+    with db.engine.begin() as connection:
+        rows = rebuild_recommendations(connection)
+    click.echo(f'Stored {rows} similar-book pairs in {time.perf_counter() - start:.2f}s')
+
+
+@click.command('rebuild-trending')
+@with_appcontext
+def rebuild_trending_command():
+    """Recompute the trending scores of every window from reviews and shelf entries."""
+    start = time.perf_counter()
+    with db.engine.begin() as connection:
+        rows = rebuild_trending(connection)
+    click.echo(f'Stored {rows} trending scores in {time.perf_counter() - start:.2f}s')
+
+
+@click.command('export-data')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='ndjson', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Write .gz files.')
+@with_appcontext
+def export_data_command(directory, fmt, compress):
+    """Stream every table into DIRECTORY, one file per table plus manifest.json."""
+    start = time.perf_counter()
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Every table from the same snapshot
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+        with connection.begin():
+            manifest = export_catalog(connection, directory, fmt, compress, report=click.echo)
+    rows = sum(entry['rows'] for entry in manifest['tables'])
+    click.echo(f'Exported {rows:,} rows in {time.perf_counter() - start:.2f}s')
+
+
+@click.command('import-data')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@with_appcontext
+def import_data_command(directory, batch_size):
+    """Load an export-data directory, shifting ids past existing rows; rerun to resume after a failure."""
+    start = time.perf_counter()
+    try:
+        inserted = import_catalog(db.engine, directory, batch_size, report=click.echo)
+    except TransferError as e:
+        raise click.ClickException(str(e))
+    # Core inserts skip the ORM hooks that maintain these
+    with db.engine.begin() as connection:
+        rebuild_index(connection)
+        rebuild_recommendations(connection)
+        rebuild_trending(connection)
+    cache.invalidate(*inserted)
+    click.echo(f'Imported {sum(inserted.values()):,} rows in {time.perf_counter() - start:.2f}s; '
+               f'rebuilt the search index, recommendations and trending')
+
+
+@click.command('purge')
+@click.argument('table', type=click.Choice(['users', 'authors', 'categories']))
+@click.argument('id', type=int)
+@click.option('--batch-size', default=purge.PURGE_BATCH_SIZE, show_default=True)
+@with_appcontext
+def purge_command(table, id, batch_size):
+    """Delete a user, author or category and everything under it in short batches."""
+    model = {'users': User, 'authors': Author, 'categories': Category}[table]
+    if db.session.get(model, id) is None:
+        raise click.ClickException(f'No {table} row with id {id}')
+    start = time.perf_counter()
+    rows = purge.purge(model, id, batch_size)
+    click.echo(f'Deleted {rows:,} rows in {time.perf_counter() - start:.2f}s')
+
+
+def init_app(app):
+    app.cli.add_command(MigrateGroup('db', help='Perform database migrations.'))
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(seed_synthetic_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(check_query_counts_command)
+    app.cli.add_command(repair_ratings_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_recommendations_command)
+    app.cli.add_command(rebuild_trending_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(purge_command)
@@ -0,0 +1,82 @@
+# Standard library imports
+import zlib
+
+# Remote library imports
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Negotiated response compression. Text bodies of at least COMPRESSION_MIN_SIZE bytes are
+# sent as brotli (when the package is installed) or gzip, whichever the client's
+# Accept-Encoding ranks higher; streamed bodies (?stream=1 lists) are compressed chunk by
+# chunk as they are written. Compressible responses always carry Vary: Accept-Encoding so
+# shared caches keep the variants apart, and a compressed body's ETag is made weak, which
+# keeps If-None-Match revalidation (304) working for both variants.
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+# gzip container around deflate
+GZIP_WBITS = 31
+
+
+def _compressible(response):
+    return response.mimetype.startswith(COMPRESSIBLE)
+
+
+def _compressor(coding, app):
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=app.config['BROTLI_QUALITY'])
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(app.config['GZIP_LEVEL'], zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def _compress_stream(chunks, coding, app):
+    compress, finish = _compressor(coding, app)
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(app, response):
+    if 'Content-Encoding' in response.headers or not _compressible(response):
+        return response
+    # On 304s too: they stand for the variant the client holds
+    response.vary.add('Accept-Encoding')
+    if response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    codings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    coding = request.accept_encodings.best_match(codings)
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, coding, app)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < app.config['COMPRESSION_MIN_SIZE']:
+            return response
+        compress, finish = _compressor(coding, app)
+        data = compress(body) + finish()
+        if len(data) >= len(body):
+            return response
+        response.set_data(data)
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    if app.config['COMPRESSION_ENABLED']:
+        app.after_request(lambda response: compress_response(app, response))
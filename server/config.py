@@ -2,35 +2,108 @@
 import os
 
 # Remote library imports
-from flask import Flask
 from flask_cors import CORS
-from flask_migrate import Migrate
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 
 # Local imports
+from .engine import READ_BIND, RoutingSession, engine_options, init_engines, sqlite_pragmas
+from .json_provider import init_json, output_json
 
-# Instantiate app, set attributes
-app = Flask(__name__)
-# Use PostgreSQL for persistent storage
-database_url = os.environ.get('DATABASE_URL')
-if database_url and database_url.startswith('postgres://'):
-    database_url = database_url.replace('postgres://', 'postgresql://', 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def _flag(name, default=''):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+def load_config(app):
+    # Use PostgreSQL for persistent storage
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url and database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///app.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Per-dialect pool settings and SQLite pragmas (DATABASE_TUNING=0 for driver defaults)
+    tuned = _flag('DATABASE_TUNING', '1')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI']) if tuned else {}
+    app.config['SQLITE_PRAGMAS'] = sqlite_pragmas() if tuned else {}
+    # Optional read replica for GET requests
+    read_url = os.environ.get('DATABASE_READ_URL')
+    if read_url:
+        read_url = read_url.replace('postgres://', 'postgresql://', 1)
+        app.config['SQLALCHEMY_BINDS'] = {READ_BIND: {'url': read_url, **(engine_options(read_url) if tuned else {})}}
+    # orjson when installed; JSON_COMPACT=0 indents responses for reading by eye
+    init_json(app, compact=_flag('JSON_COMPACT', '1'))
+    # Compress text responses of at least COMPRESSION_MIN_SIZE bytes (brotli if installed, else gzip)
+    app.config['COMPRESSION_ENABLED'] = _flag('COMPRESSION_ENABLED', '1')
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    app.config['GZIP_LEVEL'] = int(os.environ.get('GZIP_LEVEL', 6))
+    app.config['BROTLI_QUALITY'] = int(os.environ.get('BROTLI_QUALITY', 4))
+    # Deleting a user, author or category with more dependent rows than this answers 202
+    # and empties it in background batches of PURGE_BATCH_SIZE rows
+    app.config['PURGE_THRESHOLD'] = int(os.environ.get('PURGE_THRESHOLD', 10000))
+    app.config['PURGE_BATCH_SIZE'] = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+
+    # Response cache: in-process LRU by default, Redis when RESPONSE_CACHE_URL is set
+    app.config['RESPONSE_CACHE_URL'] = os.environ.get('RESPONSE_CACHE_URL')
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    # Row tags ('books:5') whose versions the in-process backend remembers
+    app.config['RESPONSE_CACHE_MAX_VERSIONS'] = int(os.environ.get('RESPONSE_CACHE_MAX_VERSIONS', 10000))
+    # Serialized rows for ?ids= multi-gets, per worker (0 disables)
+    app.config['ROW_CACHE_MAX_ENTRIES'] = int(os.environ.get('ROW_CACHE_MAX_ENTRIES', 10000))
+
+    # Session tokens; set SECRET_KEY in production, every worker must share it (unset, debug
+    # and testing use a fixed development key and anything else a random one, see auth.init_app)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config['TOKEN_MAX_AGE'] = int(os.environ.get('TOKEN_MAX_AGE', 7 * 24 * 3600))
+    app.config['TOKEN_CACHE_MAX_ENTRIES'] = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000))
+    app.config['TOKEN_CACHE_TTL'] = int(os.environ.get('TOKEN_CACHE_TTL', 60))
+    # Require a token for every write except login and sign-up
+    app.config['AUTH_REQUIRED'] = _flag('AUTH_REQUIRED')
+
+    # ASGI entry point (asgi.py): threads running the routes it hands to the Flask app
+    app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 8))
+    # and connections of the async engine it reads through
+    app.config['ASYNC_POOL_SIZE'] = int(os.environ.get('ASYNC_POOL_SIZE', 10))
+
+    # Request metrics at /metrics; statements slower than SLOW_QUERY_MS are logged (0 disables)
+    app.config['METRICS_ENABLED'] = _flag('METRICS_ENABLED', '1')
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+    # Per-request db/serialize/encode timings in a Server-Timing header
+    app.config['SERVER_TIMING'] = _flag('SERVER_TIMING')
+
+# Tables kept outside the ORM metadata (e.g. the search index) are left alone by autogenerate
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == 'table' and reflected and compare_to is None)
 
 # Define metadata, instantiate db
 metadata = MetaData(naming_convention={
+    "ix": "ix_%(column_0_label)s",
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
-migrate = Migrate(app, db)
-db.init_app(app)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 
-# Instantiate REST API
-api = Api(app)
+# Instantiate REST API; resources are registered on each app by init_extensions
+api = Api()
 
 # Instantiate CORS
-CORS(app, resources={r"/*": {"origins": "*"}})
\ No newline at end of file
+cors = CORS()
+
+
+def init_extensions(app):
+    db.init_app(app)
+    init_engines(app, db)
+    api.init_app(app)
+    api.representations['application/json'] = output_json
+    cors.init_app(app, resources={r"/*": {"origins": "*"}}, expose_headers=['Link', 'ETag', 'Last-Modified', 'Server-Timing'])
+
+
+def init_migrate(app):
+    # Imported on demand: alembic is most of the app's import time and only `flask db` needs it
+    from flask_migrate import Migrate
+
+    if 'migrate' not in app.extensions:
+        Migrate(app, db, directory=MIGRATIONS_DIRECTORY, include_object=include_object)
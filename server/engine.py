@@ -0,0 +1,107 @@
+# Standard library imports
+import os
+
+# Remote library imports
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Engine profiles per dialect. SQLite gets WAL (readers no longer wait for the writer,
+# across every gunicorn worker) plus connection pragmas, and always enforces foreign
+# keys; Postgres gets a sized pool that pings and recycles connections. With
+# DATABASE_READ_URL set, GET requests read from that replica while every flush and
+# non-GET request uses the primary. The ASGI entry point reads through an async engine
+# on the same database (the replica, when there is one) with the same settings.
+
+READ_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+# Async driver per dialect, for the ASGI entry point; neither is a requirement of the WSGI app
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def sqlite_pragmas():
+    return {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': _int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        # Negative: KiB rather than pages
+        'cache_size': -_int('SQLITE_CACHE_SIZE_KB', 64 * 1024),
+        'busy_timeout': _int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'temp_store': 'MEMORY',
+    }
+
+
+def engine_options(url):
+    dialect = make_url(url).get_backend_name()
+    if dialect == 'postgresql':
+        return {
+            'pool_size': _int('DB_POOL_SIZE', 5),
+            'max_overflow': _int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _int('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': True,
+        }
+    return {}
+
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+def init_engines(app, db):
+    # Engines exist once db.init_app has run; pragmas apply to every new connection.
+    # Foreign keys are enforced on every SQLite database, tuned or not: deletes cascade
+    # through them.
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != 'sqlite':
+                continue
+            on_disk = engine.url.database not in (None, '', ':memory:')
+            event.listen(engine, 'connect', _set_pragmas({'foreign_keys': 'ON', **(pragmas if on_disk else {})}))
+
+
+def create_read_engine(app, db):
+    """An async engine on the database GET requests read from; needs the dialect's async driver."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    bind = (app.config.get('SQLALCHEMY_BINDS') or {}).get(READ_BIND)
+    with app.app_context():
+        url = (db.engines[READ_BIND] if bind else db.engine).url
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f'no async driver for {url.get_backend_name()}')
+    options = {key: value for key, value in bind.items() if key != 'url'} if bind \
+        else dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    # A fixed pool, for SQLite too (aiosqlite defaults to none): hundreds of requests share
+    # it, and waiting for a connection costs a coroutine, whereas overflow connections
+    # would be opened and closed per request
+    options.update(poolclass=AsyncAdaptedQueuePool, pool_size=app.config['ASYNC_POOL_SIZE'], max_overflow=0)
+    engine = create_async_engine(url.set(drivername=f'{url.get_backend_name()}+{driver}'), **options)
+    if url.get_backend_name() == 'sqlite':
+        pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+        on_disk = url.database not in (None, '', ':memory:')
+        event.listen(engine.sync_engine, 'connect', _set_pragmas({'foreign_keys': 'ON', **(pragmas if on_disk else {})}))
+    return engine
+
+
+class RoutingSession(Session):
+    """Sends reads made while handling a GET to the replica engine, when one is configured."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and request.method in READ_METHODS:
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
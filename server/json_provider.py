@@ -0,0 +1,76 @@
+# Remote library imports
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+# One JSON encoder for every response: jsonify, Flask-RESTful resources and streamed
+# lists all go through app.json. It is orjson when installed (several times faster than
+# the stdlib encoder, and it writes bytes straight into the body), else Flask's stdlib
+# provider. Output is compact unless JSON_COMPACT is off, keys keep their insertion order,
+# and non-ASCII text is sent as UTF-8 rather than \u escapes. Values orjson has no native
+# encoding for go through Flask's ``default`` (dates as HTTP dates, Decimal, UUID), and
+# integers past 64 bits fall back to the stdlib encoder, so both encoders agree on output.
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's stdlib provider with ``dumpb`` for response bodies."""
+
+    sort_keys = False
+    ensure_ascii = False
+
+    def _indent(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumpb(self, obj):
+        if self._indent():
+            return self.dumps(obj, indent=2).encode()
+        return self.dumps(obj, separators=(',', ':')).encode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj) + b'\n', mimetype=self.mimetype)
+
+
+class OrjsonProvider(JSONProvider):
+    def _options(self):
+        # Dates go to ``default`` like the stdlib provider; str() for int keys like json.dumps
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self._indent():
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumpb(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options())
+        except orjson.JSONEncodeError:
+            return super().dumpb(obj)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumpb(obj).decode()
+
+    def loads(self, s, **kwargs):
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so bad bodies still get a 400
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def init_json(app, compact=True):
+    app.json = (OrjsonProvider if orjson is not None else JSONProvider)(app)
+    app.json.compact = compact
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation for application/json, encoded by app.json."""
+    response = current_app.response_class(current_app.json.dumpb(data) + b'\n', status=code,
+                                          mimetype='application/json')
+    response.headers.extend(headers or {})
+    return response
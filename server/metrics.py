@@ -0,0 +1,227 @@
+# Standard library imports
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+# Remote library imports
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# Local imports
+from .config import api
+from .json_provider import output_json
+
+# Per-request instrumentation: latency, SQL statement count and time (engine events),
+# serializer and JSON encoding time. Exposed in Prometheus text format at /metrics and,
+# optionally, as a Server-Timing header. Metrics are kept per process; with several
+# gunicorn workers each scrape reports the worker that answered it.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_log = logging.getLogger('bookshelf.sql.slow')
+
+# The current request's RequestStats; a ContextVar because the serializer hooks run per
+# row and flask.g costs microseconds per lookup
+_request_stats = ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, (list(b), n, s)) for labels, (b, n, s) in self._series.items())
+        for label_values, (counts, count, total) in items:
+            labels = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}' if labels else f'{self.name} {value}')
+        return lines
+
+
+REQUESTS = Counter('bookshelf_requests_total', 'Requests handled.', ('endpoint', 'method', 'status'))
+LATENCY = Histogram('bookshelf_request_duration_seconds', 'Request latency.', LATENCY_BUCKETS, ('endpoint', 'method'))
+STATEMENTS = Histogram('bookshelf_db_statements', 'SQL statements per request.', STATEMENT_BUCKETS, ('endpoint', 'method'))
+DB_TIME = Histogram('bookshelf_db_duration_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS, ('endpoint', 'method'))
+SERIALIZE_TIME = Histogram('bookshelf_serialize_duration_seconds', 'Time turning rows into dicts per request.',
+                           LATENCY_BUCKETS, ('endpoint', 'method'))
+ENCODE_TIME = Histogram('bookshelf_encode_duration_seconds', 'Time encoding JSON per request.',
+                        LATENCY_BUCKETS, ('endpoint', 'method'))
+SLOW_QUERIES = Counter('bookshelf_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.')
+METRICS = (REQUESTS, LATENCY, STATEMENTS, DB_TIME, SERIALIZE_TIME, ENCODE_TIME, SLOW_QUERIES)
+
+
+class RequestStats:
+    __slots__ = ('start', 'statements', 'db', 'serialize', 'encode', 'depth')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.encode = 0.0
+        self.depth = 0
+
+
+def current_stats():
+    return _request_stats.get()
+
+
+def serialization(f):
+    """Time a serializer entry point; nested calls and SQL run inside it are not counted twice."""
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        stats = current_stats()
+        if stats is None or stats.depth:
+            return f(*args, **kwargs)
+        stats.depth += 1
+        start, db = time.perf_counter(), stats.db
+        try:
+            return f(*args, **kwargs)
+        finally:
+            stats.depth -= 1
+            stats.serialize += time.perf_counter() - start - (stats.db - db)
+
+    return wrapper
+
+
+def encoding(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        stats = current_stats()
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            if stats is not None:
+                stats.encode += time.perf_counter() - start
+
+    return wrapper
+
+
+def _endpoint():
+    rule = request.url_rule
+    return rule.rule if rule is not None else '<unmatched>'
+
+
+def _start_request():
+    _request_stats.set(RequestStats())
+
+
+def _finish_request(response):
+    stats = _request_stats.get()
+    if stats is None:
+        return response
+    _request_stats.set(None)
+    total = time.perf_counter() - stats.start
+    endpoint, method = _endpoint(), request.method
+    REQUESTS.inc(endpoint, method, str(response.status_code))
+    LATENCY.observe(total, endpoint, method)
+    STATEMENTS.observe(stats.statements, endpoint, method)
+    DB_TIME.observe(stats.db, endpoint, method)
+    SERIALIZE_TIME.observe(stats.serialize, endpoint, method)
+    ENCODE_TIME.observe(stats.encode, endpoint, method)
+    if g.get('server_timing'):
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.db * 1000:.2f};desc="{stats.statements} queries", '
+            f'serialize;dur={stats.serialize * 1000:.2f}, encode;dur={stats.encode * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+
+def _listen(engine, slow_seconds):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        stats = current_stats()
+        if stats is not None:
+            stats.statements += 1
+            stats.db += elapsed
+        if slow_seconds and elapsed >= slow_seconds:
+            SLOW_QUERIES.inc()
+            slow_query_log.warning('%.1fms %s%s', elapsed * 1000, ' '.join(statement.split()),
+                                   f' [{request.method} {request.path}]' if has_request_context() else '')
+
+
+def instrument(app, engine):
+    """Count and time an engine's statements in the request metrics (engines outside db)."""
+    if app.config['METRICS_ENABLED']:
+        _listen(engine, app.config['SLOW_QUERY_MS'] / 1000)
+
+
+def metrics_view():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app, db):
+    if not app.config['METRICS_ENABLED']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument(app, engine)
+    # Resources' JSON encoding is timed on its own; the cache stores encoded bodies
+    api.representations['application/json'] = encoding(output_json)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(lambda exc: _request_stats.set(None))
+    if app.config['SERVER_TIMING']:
+        app.before_request(lambda: setattr(g, 'server_timing', True))
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
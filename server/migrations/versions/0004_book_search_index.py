@@ -0,0 +1,52 @@
+"""book search index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:02:41.118904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+SOURCE = (
+    "FROM books LEFT JOIN authors ON authors.id = books.author_id "
+    "LEFT JOIN categories ON categories.id = books.category_id"
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE TABLE book_search ("
+            "book_id INTEGER PRIMARY KEY REFERENCES books (id) ON DELETE CASCADE, "
+            "document TSVECTOR NOT NULL)"
+        )
+        op.execute("CREATE INDEX ix_book_search_document ON book_search USING GIN (document)")
+        op.execute(
+            "INSERT INTO book_search (book_id, document) SELECT books.id, "
+            "setweight(to_tsvector('english', COALESCE(books.title, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(authors.name, '')), 'B') || "
+            "setweight(to_tsvector('english', COALESCE(categories.name, '')), 'C') || "
+            "setweight(to_tsvector('english', COALESCE(books.description, '')), 'D') " + SOURCE
+        )
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE book_search USING fts5("
+            "title, description, author_name, category_name, tokenize='porter unicode61')"
+        )
+        op.execute(
+            "INSERT INTO book_search (rowid, title, description, author_name, category_name) "
+            "SELECT books.id, books.title, COALESCE(books.description, ''), "
+            "COALESCE(authors.name, ''), COALESCE(categories.name, '') " + SOURCE
+        )
+
+
+def downgrade():
+    op.execute("DROP TABLE book_search")
@@ -1,8 +1,11 @@
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy.orm import validates
+from sqlalchemy import Float, bindparam, case, cast, event, func, inspect, select
+from sqlalchemy.orm import object_session, validates
+from flask_sqlalchemy.session import Session
 from datetime import datetime
 
 from .config import db
+from .passwords import StoredHash, hash_password
 
 class Category(db.Model, SerializerMixin):
     __tablename__ = 'categories'
@@ -13,7 +16,7 @@ class Category(db.Model, SerializerMixin):
     background_image = db.Column(db.String(255))
     
     # One-to-many relationship
-    books = db.relationship('Book', back_populates='category', cascade='all, delete-orphan')
+    books = db.relationship('Book', back_populates='category', cascade='all, delete-orphan', passive_deletes=True)
     
     # Serialization rules
     serialize_rules = ('-books',)
@@ -21,10 +24,20 @@ class Category(db.Model, SerializerMixin):
 # Many-to-many association table with user submittable attribute
 class UserBookCollection(db.Model, SerializerMixin):
     __tablename__ = 'user_book_collections'
+    # One shelf entry per (user, book); also serves lookups by user_id
+    __table_args__ = (
+        db.Index('uq_user_book_collections_user_id_book_id', 'user_id', 'book_id', unique=True),
+        # Backs /users/<id>/shelf: a user's entries per status, paged by id
+        db.Index('ix_user_book_collections_user_id_status_id', 'user_id', 'status', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    # active_history: a moved shelf entry updates the co-shelving counts of both books
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+                                 active_history=True)
+    book_id = db.column_property(db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False,
+                                           index=True),
+                                 active_history=True)
     status = db.Column(db.String(20), nullable=False)
     date_added = db.Column(db.DateTime, default=datetime.utcnow)  # User submittable attribute
     
@@ -46,11 +59,20 @@ class User(db.Model, SerializerMixin):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # One-to-many relationships
-    reviews = db.relationship('Review', back_populates='user', cascade='all, delete-orphan')
-    authors = db.relationship('Author', back_populates='user', cascade='all, delete-orphan')
+    reviews = db.relationship('Review', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
+    authors = db.relationship('Author', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
     
     # Many-to-many relationship
-    book_collections = db.relationship('UserBookCollection', back_populates='user', cascade='all, delete-orphan')
+    book_collections = db.relationship('UserBookCollection', back_populates='user', cascade='all, delete-orphan',
+                                       passive_deletes=True)
+    
+    # Stored as a salted hash. Anything a client sends is hashed, even if it looks like one;
+    # only a StoredHash from hash_password (internal code) is stored as given
+    @validates('password')
+    def validate_password(self, key, password):
+        if not password:
+            raise ValueError("Password is required")
+        return password if isinstance(password, StoredHash) else hash_password(password)
     
     # Serialization rules
     serialize_rules = ('-reviews', '-authors', '-book_collections', '-password')
@@ -62,48 +84,87 @@ class Author(db.Model, SerializerMixin):
     name = db.Column(db.String(100), nullable=False)
     bio = db.Column(db.Text)
     birth_year = db.Column(db.Integer)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
     
     # One-to-many relationships
     user = db.relationship('User', back_populates='authors')
-    books = db.relationship('Book', back_populates='author', cascade='all, delete-orphan')
+    books = db.relationship('Book', back_populates='author', cascade='all, delete-orphan', passive_deletes=True)
     
     # Serialization rules
     serialize_rules = ('-user', '-books')
 
+RATING_COLUMNS = ('rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+def _rating_histogram(*counts):
+    return {str(stars): count or 0 for stars, count in enumerate(counts, 1)}
+
 class Book(db.Model, SerializerMixin):
     __tablename__ = 'books'
+    __table_args__ = (
+        # Backs /books?admin_id=<id> paged by id
+        db.Index('ix_books_created_by_id', 'created_by', 'id'),
+        # Backs /books?sort=rating
+        db.Index('ix_books_average_rating_id', 'average_rating', 'id'),
+        # Back /categories/<id>/books paged by id or title (and books by category)
+        db.Index('ix_books_category_id_id', 'category_id', 'id'),
+        db.Index('ix_books_category_id_title_id', 'category_id', 'title', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     isbn = db.Column(db.String(13), unique=True)
     publication_year = db.Column(db.Integer)
-    author_id = db.Column(db.Integer, db.ForeignKey('authors.id'), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('authors.id', ondelete='CASCADE'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), nullable=False)
+    # The catalog outlives the admin who entered it
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    
+    # Rating aggregates, kept up to date on every Review write (see below)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    average_rating = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # One-to-many relationships
     author = db.relationship('Author', back_populates='books')
     category = db.relationship('Category', back_populates='books')
     creator = db.relationship('User', foreign_keys=[created_by])
-    reviews = db.relationship('Review', back_populates='book', cascade='all, delete-orphan')
+    reviews = db.relationship('Review', back_populates='book', cascade='all, delete-orphan', passive_deletes=True)
     
     # Many-to-many relationship
-    user_collections = db.relationship('UserBookCollection', back_populates='book', cascade='all, delete-orphan')
+    user_collections = db.relationship('UserBookCollection', back_populates='book', cascade='all, delete-orphan',
+                                       passive_deletes=True)
     
     # Serialization rules
-    serialize_rules = ('-author', '-category', '-creator', '-reviews', '-user_collections')
+    serialize_rules = ('-author', '-category', '-creator', '-reviews', '-user_collections',
+                       '-rating_sum', '-rating_1', '-rating_2', '-rating_3', '-rating_4', '-rating_5',
+                       'rating_histogram')
+    serialize_computed = {'rating_histogram': (RATING_COLUMNS, _rating_histogram)}
+    
+    @property
+    def rating_histogram(self):
+        return _rating_histogram(*(getattr(self, column) for column in RATING_COLUMNS))
+
+# Backs /categories/<id>/books?sort=year, which sorts books without a year as year 0
+db.Index('ix_books_category_id_year_id', Book.category_id, func.coalesce(Book.publication_year, 0), Book.id)
 
 class Review(db.Model, SerializerMixin):
     __tablename__ = 'reviews'
     
     id = db.Column(db.Integer, primary_key=True)
-    rating = db.Column(db.Integer, nullable=False)
+    # active_history: keep the old value on change so the book aggregates can move it
+    rating = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    book_id = db.column_property(db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False,
+                                           index=True),
+                                 active_history=True)
     
     # Relationships
     user = db.relationship('User', back_populates='reviews')
@@ -119,4 +180,147 @@ class Review(db.Model, SerializerMixin):
         return rating
     
     # Serialization rules
-    serialize_rules = ('-user', '-book')
\ No newline at end of file
+    serialize_rules = ('-user', '-book')
+
+# Precomputed "readers also shelved" neighbours: the top books per book by cosine
+# similarity of their reader sets (see recommendations.py)
+class BookSimilarity(db.Model):
+    __tablename__ = 'book_similar'
+    
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    similar_book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True,
+                                index=True)
+    # Readers who shelved both books
+    shared = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+# "Trending": each book's activity per window (24h, 7d, 30d) with exponential decay, stored
+# as forward-decayed scores relative to the window's epoch (see trending.py)
+class BookTrending(db.Model):
+    __tablename__ = 'book_trending'
+    __table_args__ = (
+        # Top-k per window, read from the top of the index
+        db.Index('ix_book_trending_period_score_book_id', 'period', 'score', 'book_id'),
+    )
+    
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    period = db.Column(db.String(8), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+class TrendingPeriod(db.Model):
+    __tablename__ = 'trending_periods'
+    
+    period = db.Column(db.String(8), primary_key=True)
+    # Unix time the period's scores are relative to; moved forward now and then
+    epoch = db.Column(db.Float, nullable=False)
+
+
+# Rating aggregates: Review writes collect per-book deltas during the flush, which are
+# applied in one executemany UPDATE once the flush has written the reviews
+
+def _book_delta(session, book_id):
+    return session.info.setdefault('rating_deltas', {}).setdefault(book_id, [0, 0, 0, 0, 0, 0, 0])
+
+def _rating_delta(target, book_id, rating, sign):
+    delta = _book_delta(object_session(target), book_id)
+    delta[0] += sign
+    delta[1] += sign * rating
+    delta[1 + rating] += sign
+
+def subtract_ratings(session, rows):
+    # Reviews the database deletes by cascade, grouped: (book_id, count, sum, count_1 .. count_5)
+    for book_id, *totals in rows:
+        delta = _book_delta(session, book_id)
+        for index, value in enumerate(totals):
+            delta[index] -= value or 0
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, target):
+    _rating_delta(target, target.book_id, target.rating, 1)
+
+@event.listens_for(Review, 'before_update')
+def _review_updated(mapper, connection, target):
+    state = inspect(target)
+    rating, book_id = state.attrs.rating.history, state.attrs.book_id.history
+    if not (rating.has_changes() or book_id.has_changes()):
+        return
+    old_rating = rating.deleted[0] if rating.deleted else (None if rating.has_changes() else target.rating)
+    old_book_id = book_id.deleted[0] if book_id.deleted else (None if book_id.has_changes() else target.book_id)
+    if old_rating is None or old_book_id is None:
+        # The old value was never loaded; read it before the row is overwritten
+        reviews = Review.__table__
+        old_book_id, old_rating = connection.execute(
+            select(reviews.c.book_id, reviews.c.rating).where(reviews.c.id == target.id)
+        ).one()
+    _rating_delta(target, old_book_id, old_rating, -1)
+    _rating_delta(target, target.book_id, target.rating, 1)
+
+@event.listens_for(Review, 'before_delete')
+def _review_deleted(mapper, connection, target):
+    _rating_delta(target, target.book_id, target.rating, -1)
+
+@event.listens_for(Session, 'before_flush')
+def _reset_rating_deltas(session, flush_context, instances):
+    # Anything left over belongs to a flush that failed and was rolled back
+    session.info.pop('rating_deltas', None)
+
+def apply_rating_deltas(connection, deltas):
+    # deltas: {book_id: [count, sum, count_1 .. count_5]}, added to the stored aggregates
+    params = [
+        dict(b_id=book_id, d_count=delta[0], d_sum=delta[1],
+             **{f'd_{column}': value for column, value in zip(RATING_COLUMNS, delta[2:])})
+        for book_id, delta in deltas.items() if any(delta)
+    ]
+    if not params:
+        return
+    books = Book.__table__
+    count = books.c.review_count + bindparam('d_count')
+    total = books.c.rating_sum + bindparam('d_sum')
+    connection.execute(
+        books.update().where(books.c.id == bindparam('b_id')).values({
+            books.c.review_count: count,
+            books.c.rating_sum: total,
+            books.c.average_rating: case((count > 0, cast(total, Float) / count), else_=0.0),
+            **{books.c[column]: books.c[column] + bindparam(f'd_{column}') for column in RATING_COLUMNS},
+        }),
+        params,
+    )
+
+@event.listens_for(Session, 'after_flush')
+def _apply_rating_deltas(session, flush_context):
+    deltas = session.info.pop('rating_deltas', None)
+    if deltas:
+        apply_rating_deltas(session.connection(), deltas)
+
+def recompute_rating_aggregates(connection, book_ids=None, batch_size=5000):
+    # Rebuild the aggregates from the reviews table in one grouped pass
+    books, reviews = Book.__table__, Review.__table__
+    reset = books.update().values(review_count=0, rating_sum=0, average_rating=0,
+                                  **{column: 0 for column in RATING_COLUMNS})
+    stats = select(
+        reviews.c.book_id, func.count(), func.sum(reviews.c.rating),
+        *[func.sum(case((reviews.c.rating == stars, 1), else_=0)) for stars in range(1, 6)],
+    ).group_by(reviews.c.book_id)
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        reset = reset.where(books.c.id.in_(book_ids))
+        stats = stats.where(reviews.c.book_id.in_(book_ids))
+    connection.execute(reset)
+
+    apply = books.update().where(books.c.id == bindparam('b_id')).values(
+        review_count=bindparam('b_count'),
+        rating_sum=bindparam('b_sum'),
+        average_rating=bindparam('b_average'),
+        **{column: bindparam(f'b_{column}') for column in RATING_COLUMNS},
+    )
+    updated = 0
+    for batch in connection.execute(stats.execution_options(yield_per=batch_size)).partitions():
+        params = [
+            dict(b_id=book_id, b_count=count, b_sum=total, b_average=total / count,
+                 **{f'b_{column}': value for column, value in zip(RATING_COLUMNS, histogram)})
+            for book_id, count, total, *histogram in batch
+        ]
+        connection.execute(apply, params)
+        updated += len(params)
+    return updated
@@ -0,0 +1,128 @@
+# Standard library imports
+from functools import lru_cache
+
+# Remote library imports
+from flask import current_app, request
+
+# Local imports
+from . import cache
+from .config import db
+
+# Multi-get: ?ids=3,1,2 on a list endpoint returns those rows in the order asked, from one
+# IN query, plus the ids that don't exist. Serialized rows are kept in a per-worker LRU
+# keyed by (view, id). An entry records the response-cache versions of its row tag
+# ('books:3'), its table's '*' tag and the tables the view nests, and is served only while
+# those are unchanged, so the writes that invalidate cached responses (PATCH, DELETE, a
+# review moving a book's rating, a cascade) invalidate cached rows too, in one version
+# lookup per request.
+
+MAX_IDS = 1000
+
+
+class RowCache:
+    def __init__(self, max_entries, ttl):
+        self.rows = cache.MemoryBackend(max_entries, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.rows.evictions,
+                'entries': self.rows.size()}
+
+
+def init_app(app):
+    size = app.config.get('ROW_CACHE_MAX_ENTRIES', 10000)
+    app.extensions['row_cache'] = RowCache(size, app.config.get('RESPONSE_CACHE_TTL', 300)) if size else None
+
+
+def get_row_cache():
+    return current_app.extensions.get('row_cache')
+
+
+def parse_ids(value):
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of integers')
+    if not ids:
+        raise ValueError('ids must name at least one id')
+    if len(ids) > MAX_IDS:
+        raise ValueError(f'at most {MAX_IDS} ids per request')
+    # A repeated id is returned once, at its first position
+    return list(dict.fromkeys(ids))
+
+
+@lru_cache(maxsize=512)
+def _view_tags(view):
+    # Tags whose writes can change a row of this view other than through its own tag
+    tags = set(cache.all_rows(view.model.__tablename__))
+    for child in [child for _, child in view.nested] + [child for _, child, _ in view.collections]:
+        tags.add(child.model.__tablename__)
+        tags.update(_view_tags(child))
+    return tuple(sorted(tags))
+
+
+def select_ids(view, ids):
+    return view.select().where(view.model.id.in_(ids))
+
+
+def by_id(view, rows):
+    return dict(zip(map(view.row_id, rows), view.from_rows(rows)))
+
+
+def cached_rows(view, ids):
+    """({id: row} the row cache can answer, {id: stamp} for the rest, to pass to remember())."""
+    rows, responses = get_row_cache(), cache.get_cache()
+    if rows is None or responses is None:
+        return {}, dict.fromkeys(ids)
+
+    table = view.model.__tablename__
+    shared = _view_tags(view)
+    versions = responses.backend.versions([*shared, *(f'{table}:{id}' for id in ids)])
+    shared_versions = tuple(versions[:len(shared)])
+    found, wanted = {}, {}
+    for id, version in zip(ids, versions[len(shared):]):
+        stamp = (shared_versions, version)
+        entry = rows.rows.get((view, id))
+        if entry is not None and entry[0] == stamp:
+            found[id] = entry[1]
+        else:
+            wanted[id] = stamp
+    rows.hits += len(found)
+    rows.misses += len(wanted)
+    return found, wanted
+
+
+def remember(view, stamps, loaded):
+    # Stamped with the versions read before the query, so a write landing in between
+    # leaves the entry already out of date rather than stale
+    rows = get_row_cache()
+    if rows is None:
+        return
+    for id, data in loaded.items():
+        if stamps[id] is not None:
+            rows.rows.set((view, id), (stamps[id], data))
+
+
+def fetch(view, ids):
+    """{id: serialized row} for the ids that exist, from the row cache where it can."""
+    found, stamps = cached_rows(view, ids)
+    if stamps:
+        loaded = by_id(view, db.session.execute(select_ids(view, list(stamps))).all())
+        remember(view, stamps, loaded)
+        found.update(loaded)
+    return found
+
+
+def ordered(ids, found):
+    # Copies: callers may add to the items (?counts=1) and the cached dicts are shared
+    return {'items': [dict(found[id]) for id in ids if id in found],
+            'missing': [id for id in ids if id not in found]}
+
+
+def multiget_response(view):
+    try:
+        ids = parse_ids(request.args['ids'])
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return ordered(ids, fetch(view, ids)), 200
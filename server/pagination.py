@@ -0,0 +1,114 @@
+# Standard library imports
+from urllib.parse import urlencode
+
+# Remote library imports
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import select, tuple_
+
+# Local imports
+from .config import db
+
+# Keyset pagination on the primary key: ?limit=<n>&after=<id>
+MAX_PAGE_SIZE = 1000
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = 500
+
+TRUTHY = ('1', 'true', 'yes', 'on')
+
+
+def _int_arg(name, minimum, maximum=None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if value < minimum or (maximum is not None and value > maximum):
+        bounds = f'between {minimum} and {maximum}' if maximum is not None else f'at least {minimum}'
+        raise ValueError(f'{name} must be {bounds}')
+    return value
+
+
+def page_args():
+    return _int_arg('limit', 1, MAX_PAGE_SIZE), _int_arg('after', 0)
+
+
+def offset_args(default_limit):
+    limit = _int_arg('limit', 1, MAX_PAGE_SIZE)
+    return default_limit if limit is None else limit, _int_arg('offset', 0) or 0
+
+
+def wants_stream():
+    return request.args.get('stream', '').lower() in TRUTHY
+
+
+def next_link(**params):
+    args = request.args.to_dict(flat=False)
+    args.update({name: [str(value)] for name, value in params.items()})
+    return f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"'
+
+
+def stream_response(stmt, serializer):
+    # Written out row by row so memory stays flat however large the table is
+    def generate():
+        encode = current_app.json.dumpb
+        yield b'['
+        separator = b''
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        # Serialized (and written) a batch at a time so included collections cost one query per batch
+        for rows in result.partitions():
+            items = serializer.from_rows(rows)
+            if items:
+                yield separator + b','.join(map(encode, items))
+                separator = b','
+        yield b']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def page_statement(serializer, *criteria, sort_column=None, descending=False, anchor=None, limit=None):
+    # Keyset on (sort_column, id), or on id alone; the cursor is always the last row's id.
+    # anchor is the after row's key: [id], or [sort value, id]
+    id_column = serializer.model.id
+    key = [id_column] if sort_column is None else [sort_column, id_column]
+    stmt = serializer.select().where(*criteria).order_by(*[c.desc() if descending else c for c in key])
+    if anchor is not None:
+        position = tuple_(*key) if len(key) > 1 else key[0]
+        boundary = tuple_(*anchor) if len(anchor) > 1 else anchor[0]
+        stmt = stmt.where(position < boundary if descending else position > boundary)
+    # One extra row tells whether there is a next page
+    return stmt if limit is None else stmt.limit(limit + 1)
+
+
+def page_response(serializer, rows, limit):
+    headers = {}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers['Link'] = next_link(after=serializer.row_id(rows[-1]))
+    return serializer.from_rows(rows), 200, headers
+
+
+def list_response(serializer, *criteria, sort_column=None, descending=False):
+    try:
+        limit, after = page_args()
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    anchor = None
+    if after is not None:
+        if sort_column is None:
+            anchor = [after]
+        else:
+            value = db.session.execute(select(sort_column).where(serializer.model.id == after)).scalar()
+            if value is None:
+                return {'error': 'after does not match an existing row'}, 400
+            anchor = [value, after]
+
+    if wants_stream():
+        stmt = page_statement(serializer, *criteria, sort_column=sort_column, descending=descending, anchor=anchor)
+        return stream_response(stmt if limit is None else stmt.limit(limit), serializer)
+
+    stmt = page_statement(serializer, *criteria, sort_column=sort_column, descending=descending, anchor=anchor,
+                          limit=limit)
+    return page_response(serializer, db.session.execute(stmt).all(), limit)
@@ -0,0 +1,71 @@
+# Standard library imports
+import hmac
+import os
+import threading
+
+# Remote library imports
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Salted password hashes (werkzeug's scrypt by default). The KDF is deliberately slow and
+# holds the request thread that runs it, so each worker admits fewer hashes at a time
+# than it has request threads: one more login than that gets 503 at once, and the
+# remaining threads stay free for every other request. With a single request thread
+# (gunicorn's sync workers) no thread can be kept free; run threaded workers.
+
+METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+
+class KDFBusy(ServiceUnavailable):
+    description = 'Too many logins in progress, try again shortly'
+
+
+def kdf_slots(request_threads):
+    """Hashes one worker computes at once: PASSWORD_KDF_SLOTS, else one fewer than its request threads."""
+    return int(os.environ.get('PASSWORD_KDF_SLOTS', 0)) or max(1, request_threads - 1)
+
+
+_slots = threading.BoundedSemaphore(kdf_slots(int(os.environ.get('GUNICORN_THREADS', 4))))
+
+
+def set_request_threads(count):
+    # For servers other than gunicorn (the ASGI entry point's thread pool)
+    global _slots
+    _slots = threading.BoundedSemaphore(kdf_slots(count))
+
+
+def _run(fn, *args):
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise KDFBusy()
+    try:
+        # hashlib releases the GIL while it works, so other request threads keep running
+        return fn(*args)
+    finally:
+        slots.release()
+
+
+class StoredHash(str):
+    """A hash made by hash_password; the only value User.password stores unchanged."""
+
+
+def is_hashed(value):
+    return isinstance(value, str) and value.startswith(HASH_PREFIXES)
+
+
+def hash_password(password):
+    return StoredHash(_run(generate_password_hash, password, METHOD))
+
+
+def verify_password(stored, password):
+    """Return (matches, needs_rehash) for a stored hash or a legacy plaintext value."""
+    if not stored:
+        return False, False
+    if not is_hashed(stored):
+        # Rows written before hashing: compare as the old login did, then upgrade
+        matches = hmac.compare_digest(str(stored).strip().encode(), str(password).strip().encode())
+        return matches, matches
+    matches = _run(check_password_hash, stored, password)
+    return matches, matches and not stored.startswith(METHOD + ':')
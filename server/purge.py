@@ -0,0 +1,166 @@
+# Standard library imports
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Remote library imports
+from sqlalchemy import delete, func, select
+
+# Local imports
+from . import cache
+from .config import db
+from .models import Author, Book, Category, Review, User, UserBookCollection, apply_rating_deltas
+from .recommendations import remove_readers
+from .search import remove_books as remove_from_index
+
+# Deleting an owner with a very large subtree (an author with 50k books, a user with years
+# of reviews) as one cascading DELETE holds the write lock for as long as it runs. Above
+# PURGE_THRESHOLD dependent rows the request answers 202 instead, and a background thread
+# (one per worker, so purges run one at a time) empties the owner in batches of
+# PURGE_BATCH_SIZE rows. Each batch is its own short transaction and keeps the search
+# index, rating aggregates, recommendations and response cache in step itself; the owner,
+# small by then, is finally deleted through the ORM as usual. Batches only ever delete
+# what is still there, so a purge cut short by a restart finishes when it is sent again.
+
+PURGE_BATCH_SIZE = 1000
+
+log = logging.getLogger('bookshelf.purge')
+
+_books, _reviews, _collections, _authors = (
+    model.__table__ for model in (Book, Review, UserBookCollection, Author))
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_running = set()
+
+
+def dependents(model, id):
+    """Rows directly under an owner: books of an author or category; a user's reviews,
+    shelf entries and the books of their authors."""
+    if model is Author:
+        stmt = select(func.count()).where(_books.c.author_id == id)
+    elif model is Category:
+        stmt = select(func.count()).where(_books.c.category_id == id)
+    elif model is User:
+        authors = select(_authors.c.id).where(_authors.c.user_id == id)
+        stmt = select(
+            select(func.count()).where(_reviews.c.user_id == id).scalar_subquery()
+            + select(func.count()).where(_collections.c.user_id == id).scalar_subquery()
+            + select(func.count()).where(_books.c.author_id.in_(authors)).scalar_subquery())
+    else:
+        return 0
+    return db.session.execute(stmt).scalar()
+
+
+def _each_batch(engine, ids_query, work, batch_size):
+    # ids_query: the first batch_size ids still to go; work(connection, ids) removes them and
+    # returns the cache tags to bump, which happens only once the batch has committed (as
+    # the session does on after_commit) so no reader caches the old rows under new versions
+    total = 0
+    while True:
+        with engine.begin() as connection:
+            ids = connection.execute(ids_query.limit(batch_size)).scalars().all()
+            tags = work(connection, ids) if ids else ()
+        if not ids:
+            return total
+        cache.invalidate(*tags)
+        total += len(ids)
+
+
+def _delete_books(connection, ids):
+    # Their reviews, shelf entries and similar-book rows go by cascade
+    remove_from_index(connection, ids)
+    connection.execute(delete(_books).where(_books.c.id.in_(ids)))
+    return ('books', 'reviews', 'user_book_collections', *cache.all_rows('reviews', 'user_book_collections'),
+            *(f'books:{id}' for id in ids))
+
+
+def _delete_reviews(connection, ids):
+    deltas = {}
+    for book_id, rating in connection.execute(
+            select(_reviews.c.book_id, _reviews.c.rating).where(_reviews.c.id.in_(ids))):
+        delta = deltas.setdefault(book_id, [0, 0, 0, 0, 0, 0, 0])
+        delta[0] -= 1
+        delta[1] -= rating
+        delta[1 + rating] -= 1
+    connection.execute(delete(_reviews).where(_reviews.c.id.in_(ids)))
+    apply_rating_deltas(connection, deltas)
+    return ('reviews', 'books', *cache.all_rows('reviews'), *(f'books:{id}' for id in deltas))
+
+
+def _delete_entries(connection, ids):
+    connection.execute(delete(_collections).where(_collections.c.id.in_(ids)))
+    return ('user_book_collections', *cache.all_rows('user_book_collections'))
+
+
+def _unlink_books(connection, ids):
+    connection.execute(_books.update().where(_books.c.id.in_(ids)).values(created_by=None))
+    return ('books', *(f'books:{id}' for id in ids))
+
+
+def purge(model, id, batch_size=PURGE_BATCH_SIZE):
+    """Delete an owner and everything under it in batches; returns the rows removed."""
+    engine = db.engine
+    removed = 0
+    books = select(_books.c.id).order_by(_books.c.id)
+    if model is User:
+        removed += _each_batch(engine, select(_reviews.c.id).where(_reviews.c.user_id == id).order_by(_reviews.c.id),
+                               _delete_reviews, batch_size)
+        with engine.connect() as connection:
+            shelf = connection.execute(select(_collections.c.book_id).where(_collections.c.user_id == id)).scalars().all()
+        entries = select(_collections.c.id).where(_collections.c.user_id == id).order_by(_collections.c.id)
+        removed += _each_batch(engine, entries, _delete_entries, batch_size)
+        if shelf:
+            with engine.begin() as connection:
+                remove_readers(connection, {id: shelf})
+        _each_batch(engine, books.where(_books.c.created_by == id), _unlink_books, batch_size)
+        authors = select(_authors.c.id).where(_authors.c.user_id == id)
+        removed += _each_batch(engine, books.where(_books.c.author_id.in_(authors)), _delete_books, batch_size)
+    elif model is Author:
+        removed += _each_batch(engine, books.where(_books.c.author_id == id), _delete_books, batch_size)
+    elif model is Category:
+        removed += _each_batch(engine, books.where(_books.c.category_id == id), _delete_books, batch_size)
+
+    # What is left cascades in one small flush
+    item = db.session.get(model, id)
+    if item is not None:
+        db.session.delete(item)
+        db.session.commit()
+        removed += 1
+    return removed
+
+
+def _get_executor():
+    # Created on first use in each process; threads don't survive gunicorn's fork
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def submit(app, model, id):
+    """Queue a background purge; False if this owner is already being purged here."""
+    key = (model.__tablename__, id)
+    with _lock:
+        if key in _running:
+            return False
+        _running.add(key)
+
+    def run():
+        try:
+            with app.app_context():
+                rows = purge(model, id, app.config['PURGE_BATCH_SIZE'])
+            log.info('purged %s %s: %d rows', model.__tablename__, id, rows)
+        except Exception:
+            log.exception('purge of %s %s failed; send the DELETE again to finish it', model.__tablename__, id)
+        finally:
+            with _lock:
+                _running.discard(key)
+
+    _get_executor().submit(run)
+    return True
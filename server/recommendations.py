@@ -0,0 +1,336 @@
+# Standard library imports
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+# Remote library imports
+from flask_sqlalchemy.session import Session
+from sqlalchemy import and_, bindparam, case, delete, event, exists, func, inspect, or_, select
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # in requirements.txt; without them the rebuild counts with the standard library
+    np = sparse = None
+
+# Local imports
+from .cascades import cascaded
+from .models import Book, BookSimilarity, UserBookCollection
+
+# "Readers also shelved": an item-item model over the shelves. With X the users x books
+# shelf matrix, C = XᵀX counts the readers two books share. C is sparse and is built a
+# block of book rows at a time: a scipy.sparse product when SciPy is installed, else a
+# Counter over each book's readers' shelves (the same rows, about 1.5x slower). Only each
+# row's TOP_K entries by cosine, C[a, b] / sqrt(n_a * n_b), are kept in book_similar, so a
+# request is one indexed lookup. A shelf write recounts, in the same transaction, the
+# book's pairs with the user's MAX_SHELF_PAIRS most recent other entries and every stored
+# pair of that book still on the shelf, then rescales every other stored score of the books
+# whose reader counts moved: its cost does not grow with the shelf. New pairs with older
+# entries, and entries that drop out (not backfilled from below the cut), wait for the
+# next rebuild; a deleted user's shelf is taken out of the stored pairs without a recount.
+# Rows of deleted books go with them (ON DELETE CASCADE).
+
+TOP_K = 20
+# Pairs shared by fewer readers are noise, however high their cosine
+MIN_SHARED = 2
+WRITE_BATCH_SIZE = 5000
+# Book rows of C computed per sparse product
+SPARSE_BLOCK_SIZE = 256
+LOOKUP_BATCH_SIZE = 500
+PROBE_BATCH_SIZE = 50
+# Newest other shelf entries a shelf write pairs with the changed book
+MAX_SHELF_PAIRS = 200
+
+_collections = UserBookCollection.__table__
+_similar = BookSimilarity.__table__
+
+
+def _score(shared, n_a, n_b):
+    return shared / math.sqrt(n_a * n_b)
+
+
+def _top(entries):
+    # entries: {other: (shared, score)} -> the TOP_K best, ties broken by more shared readers
+    best = heapq.nlargest(TOP_K, entries.items(), key=lambda item: (item[1][1], item[1][0], -item[0]))
+    return dict(best)
+
+
+def _rows(book_id, entries):
+    return [{'book_id': book_id, 'similar_book_id': other, 'shared': shared, 'score': score}
+            for other, (shared, score) in entries.items()]
+
+
+def _neighbours(users, books):
+    # (book, top entries) per book: each row of C as a Counter over its readers' shelves
+    shelves = defaultdict(lambda: array('l'))  # user -> books
+    readers = defaultdict(lambda: array('l'))  # book -> users
+    for user_id, book_id in zip(users, books):
+        shelves[user_id].append(book_id)
+        readers[book_id].append(user_id)
+    counts = {book_id: len(book_readers) for book_id, book_readers in readers.items()}
+    for book_id, book_readers in readers.items():
+        shared = Counter()
+        for user_id in book_readers:
+            shared.update(shelves[user_id])
+        del shared[book_id]
+        n = counts[book_id]
+        yield book_id, _top({other: (count, _score(count, n, counts[other]))
+                             for other, count in shared.items() if count >= MIN_SHARED})
+
+
+def _sparse_neighbours(users, books, block_size=SPARSE_BLOCK_SIZE):
+    # The same rows from a sparse product per block of books; scores match _score exactly
+    book_ids, columns = np.unique(np.frombuffer(books, dtype=np.int64), return_inverse=True)
+    _, rows = np.unique(np.frombuffer(users, dtype=np.int64), return_inverse=True)
+    x = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, columns)),
+                          shape=(rows.max() + 1, len(book_ids)))
+    xt = x.T.tocsr()
+    # int64: the products of two popular books' reader counts overflow scipy's int32 indices
+    counts = np.diff(xt.indptr).astype(np.int64)
+    for start in range(0, len(book_ids), block_size):
+        block = (xt[start:start + block_size] @ x).tocsr()
+        for row in range(block.shape[0]):
+            a = start + row
+            others = block.indices[block.indptr[row]:block.indptr[row + 1]]
+            shared = block.data[block.indptr[row]:block.indptr[row + 1]]
+            keep = (shared >= MIN_SHARED) & (others != a)
+            others, shared = others[keep], shared[keep]
+            scores = shared / np.sqrt(counts[a] * counts[others])
+            ids = book_ids[others]
+            # Best first: score, then more shared readers, then the lower id (as _top)
+            best = np.lexsort((-ids, shared, scores))[::-1][:TOP_K]
+            yield int(book_ids[a]), dict(zip(ids[best].tolist(), zip(shared[best].tolist(), scores[best].tolist())))
+
+
+def rebuild_recommendations(connection, batch_size=WRITE_BATCH_SIZE):
+    """Recompute book_similar from the whole collections table; returns the number of rows."""
+    users, books = array('q'), array('q')
+    result = connection.execute(
+        select(_collections.c.user_id, _collections.c.book_id).execution_options(yield_per=50000))
+    for rows in result.partitions():
+        for user_id, book_id in rows:
+            users.append(user_id)
+            books.append(book_id)
+
+    connection.execute(delete(_similar))
+    if not books:
+        return 0
+    neighbours = _sparse_neighbours(users, books) if sparse is not None else _neighbours(users, books)
+    written, batch = 0, []
+    for book_id, entries in neighbours:
+        batch.extend(_rows(book_id, entries))
+        if len(batch) >= batch_size:
+            connection.execute(_similar.insert(), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        connection.execute(_similar.insert(), batch)
+        written += len(batch)
+    return written
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        yield ids[start:start + LOOKUP_BATCH_SIZE]
+
+
+@lru_cache(maxsize=PROBE_BATCH_SIZE)
+def _probe(n):
+    # Readers of :driver who also shelved each :other_i. Correlated EXISTS probes keep the
+    # planner scanning the driver's (fewer) readers rather than the other book's.
+    mine, theirs = _collections.alias('mine'), _collections.alias('theirs')
+    probes = [
+        func.coalesce(func.sum(case((exists().where(
+            theirs.c.user_id == mine.c.user_id, theirs.c.book_id == bindparam(f'other_{i}')), 1), else_=0)), 0)
+        for i in range(n)
+    ]
+    return select(*probes).where(mine.c.book_id == bindparam('driver'))
+
+
+def update_pairs(connection, changed, removed=()):
+    """Recount the pairs touched by shelf writes; changed maps user id -> book ids added or removed.
+
+    Books in ``removed`` are being deleted, and their rows with them.
+    """
+    removed = set(removed)
+    # Every book added or removed changed its reader count, and so the cosine of each of its
+    # stored pairs, not only of the pairs recounted below
+    stored = _stored_pairs(connection, set().union(*changed.values()) - removed)
+    if stored:
+        _rewrite(connection, stored, _reader_counts(connection, {book_id for pair in stored for book_id in pair}))
+    partners = defaultdict(set)
+    for a, b in stored:
+        partners[a].add(b)
+        partners[b].add(a)
+
+    pairs = set()
+    for user_id, books in changed.items():
+        books = books - removed
+        mine = _collections.c.user_id == user_id
+        recent = connection.execute(select(_collections.c.book_id).where(mine).order_by(_collections.c.id.desc())
+                                    .limit(MAX_SHELF_PAIRS + len(books))).scalars().all()
+        shelf = set(recent) | books
+        # Stored partners on this shelf gained or lost this reader, however old the entry
+        for batch in _batches(set().union(*(partners[book_id] for book_id in books)) - shelf):
+            shelf.update(connection.execute(
+                select(_collections.c.book_id).where(mine, _collections.c.book_id.in_(batch))).scalars())
+        shelf.difference_update(removed)
+        for book_id in books:
+            pairs.update((min(book_id, other), max(book_id, other)) for other in shelf if other != book_id)
+    if not pairs:
+        return
+
+    counts = _reader_counts(connection, {book_id for pair in pairs for book_id in pair})
+
+    # Count shared readers from the less-shelved side of each pair
+    by_driver = defaultdict(set)
+    for a, b in pairs:
+        driver, other = (a, b) if counts[a] <= counts[b] else (b, a)
+        by_driver[driver].add(other)
+    candidates = defaultdict(dict)
+    for driver, others in by_driver.items():
+        others = sorted(others)
+        shared = []
+        for start in range(0, len(others), PROBE_BATCH_SIZE):
+            batch = others[start:start + PROBE_BATCH_SIZE]
+            params = {f'other_{i}': other for i, other in enumerate(batch)}
+            shared.extend(connection.execute(_probe(len(batch)), {'driver': driver, **params}).one())
+        for other, count in zip(others, shared):
+            entry = (count, _score(count, counts[driver], counts[other])) if count >= MIN_SHARED else None
+            candidates[driver][other] = entry
+            candidates[other][driver] = entry
+
+    # Merge into each affected book's stored list and rewrite it
+    current = defaultdict(dict)
+    for batch in _batches(candidates):
+        for book_id, other, shared, score in connection.execute(
+                select(_similar.c.book_id, _similar.c.similar_book_id, _similar.c.shared, _similar.c.score)
+                .where(_similar.c.book_id.in_(batch))):
+            current[book_id][other] = (shared, score)
+    rows = []
+    for book_id, updates in candidates.items():
+        entries = current[book_id]
+        for other, entry in updates.items():
+            if entry is None:
+                entries.pop(other, None)
+            else:
+                entries[other] = entry
+        rows.extend(_rows(book_id, _top(entries)))
+    for batch in _batches(candidates):
+        connection.execute(delete(_similar).where(_similar.c.book_id.in_(batch)))
+    if rows:
+        connection.execute(_similar.insert(), rows)
+
+
+def _reader_counts(connection, book_ids):
+    counts = defaultdict(int)
+    for batch in _batches(book_ids):
+        counts.update(connection.execute(
+            select(_collections.c.book_id, func.count())
+            .where(_collections.c.book_id.in_(batch)).group_by(_collections.c.book_id)).all())
+    return counts
+
+
+# One stored (book_id, similar_book_id) row, for executemany
+_PAIR = and_(_similar.c.book_id == bindparam('a'), _similar.c.similar_book_id == bindparam('b'))
+
+
+def _stored_pairs(connection, book_ids):
+    # {(book, other): shared} for the stored rows on either side of these books
+    stored = {}
+    for batch in _batches(book_ids):
+        for book_id, other, shared in connection.execute(
+                select(_similar.c.book_id, _similar.c.similar_book_id, _similar.c.shared)
+                .where(or_(_similar.c.book_id.in_(batch), _similar.c.similar_book_id.in_(batch)))):
+            stored[book_id, other] = shared
+    return stored
+
+
+def _rewrite(connection, stored, counts):
+    # Stored rows with their shared counts, rescored; pairs below MIN_SHARED are deleted
+    updates, dropped = [], []
+    for (a, b), shared in stored.items():
+        if shared >= MIN_SHARED and counts[a] and counts[b]:
+            updates.append({'a': a, 'b': b, 'shared': shared, 'score': _score(shared, counts[a], counts[b])})
+        else:
+            dropped.append({'a': a, 'b': b})
+    if updates:
+        connection.execute(_similar.update().where(_PAIR).values(shared=bindparam('shared'), score=bindparam('score')),
+                           updates)
+    if dropped:
+        connection.execute(_similar.delete().where(_PAIR), dropped)
+
+
+def remove_readers(connection, shelves, removed=()):
+    """Take deleted users' shelves (user id -> book ids) out of the stored pairs.
+
+    Call once their shelf entries are gone. A pair loses one shared reader for each of
+    them who shelved both books, and every stored score involving their books is rescaled
+    by the new reader counts; only the stored rows are read, not the pairs' readers.
+    """
+    readers = defaultdict(set)  # book -> deleted users who shelved it
+    for user_id, books in shelves.items():
+        for book_id in set(books).difference(removed):
+            readers[book_id].add(user_id)
+    if not readers:
+        return
+    stored = _stored_pairs(connection, readers)
+    nobody = set()
+    for (a, b), shared in stored.items():
+        stored[a, b] = shared - len(readers.get(a, nobody) & readers.get(b, nobody))
+    _rewrite(connection, stored, _reader_counts(connection, {book_id for pair in stored for book_id in pair}))
+
+
+def similar_books_query(view, book_id):
+    return (view.select()
+            .join(BookSimilarity, BookSimilarity.similar_book_id == Book.id)
+            .where(BookSimilarity.book_id == book_id)
+            .order_by(BookSimilarity.score.desc(), Book.id))
+
+
+def recommended_books_query(view, user_id):
+    # Sum the neighbour lists of everything on the user's shelf, minus what is already there
+    shelf = select(UserBookCollection.book_id).where(UserBookCollection.user_id == user_id)
+    scores = (select(BookSimilarity.similar_book_id.label('book_id'), func.sum(BookSimilarity.score).label('score'))
+              .where(BookSimilarity.book_id.in_(shelf), BookSimilarity.similar_book_id.not_in(shelf))
+              .group_by(BookSimilarity.similar_book_id)
+              .subquery())
+    return view.select().join(scores, scores.c.book_id == Book.id).order_by(scores.c.score.desc(), Book.id)
+
+
+# Keep book_similar in step with shelf writes
+
+@event.listens_for(Session, 'after_flush')
+def _sync_similar_books(session, flush_context):
+    plan = cascaded(session)
+    gone, shelves = (plan['users'], plan['shelves']) if plan else (set(), {})
+    removed = set(plan['books']) if plan else set()
+    changed = defaultdict(set)
+    for obj in session.new:
+        if isinstance(obj, UserBookCollection):
+            changed[obj.user_id].add(obj.book_id)
+    for obj in session.dirty:
+        if not isinstance(obj, UserBookCollection):
+            continue
+        state = inspect(obj)
+        user, book = state.attrs.user_id.history, state.attrs.book_id.history
+        if user.has_changes() or book.has_changes():
+            changed[(user.deleted or [obj.user_id])[0]].add((book.deleted or [obj.book_id])[0])
+            changed[obj.user_id].add(obj.book_id)
+    for obj in session.deleted:
+        # Deleted users' entries are covered by their whole shelf below
+        if isinstance(obj, UserBookCollection) and obj.user_id not in gone:
+            changed[obj.user_id].add(obj.book_id)
+        elif isinstance(obj, Book):
+            removed.add(obj.id)
+    if not (changed or shelves):
+        return
+
+    connection = session.connection()
+    if shelves:
+        remove_readers(connection, shelves, removed)
+    if changed:
+        update_pairs(connection, changed, removed)
@@ -0,0 +1,149 @@
+# Standard library imports
+import re
+
+# Remote library imports
+from flask_sqlalchemy.session import Session
+from sqlalchemy import DDL, bindparam, event, text
+
+# Local imports
+from .cascades import cascaded
+from .config import db
+from .models import Author, Book, Category
+
+# Inverted index over book title/description plus author and category names:
+# an FTS5 table on SQLite, a weighted tsvector with a GIN index on Postgres.
+# Rows are keyed by book id and rewritten in the same transaction as the write.
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS book_search USING fts5("
+    "title, description, author_name, category_name, tokenize='porter unicode61')"
+)
+POSTGRES_DDL = (
+    "CREATE TABLE IF NOT EXISTS book_search ("
+    "book_id INTEGER PRIMARY KEY REFERENCES books (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_book_search_document ON book_search USING GIN (document)",
+)
+
+event.listen(db.metadata, 'after_create', DDL(SQLITE_DDL).execute_if(dialect='sqlite'))
+for statement in POSTGRES_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+event.listen(db.metadata, 'before_drop', DDL('DROP TABLE IF EXISTS book_search'))
+
+_SOURCE = (
+    "FROM books LEFT JOIN authors ON authors.id = books.author_id "
+    "LEFT JOIN categories ON categories.id = books.category_id"
+)
+_INSERT = {
+    'sqlite': (
+        "INSERT INTO book_search (rowid, title, description, author_name, category_name) "
+        "SELECT books.id, books.title, COALESCE(books.description, ''), "
+        "COALESCE(authors.name, ''), COALESCE(categories.name, '') " + _SOURCE
+    ),
+    'postgresql': (
+        "INSERT INTO book_search (book_id, document) SELECT books.id, "
+        "setweight(to_tsvector('english', COALESCE(books.title, '')), 'A') || "
+        "setweight(to_tsvector('english', COALESCE(authors.name, '')), 'B') || "
+        "setweight(to_tsvector('english', COALESCE(categories.name, '')), 'C') || "
+        "setweight(to_tsvector('english', COALESCE(books.description, '')), 'D') " + _SOURCE
+    ),
+}
+_KEY = {'sqlite': 'rowid', 'postgresql': 'book_id'}
+_QUERY = {
+    # bm25 column weights: title, description, author, category
+    'sqlite': (
+        "SELECT rowid FROM book_search WHERE book_search MATCH :query "
+        "ORDER BY bm25(book_search, 10.0, 1.0, 5.0, 3.0), rowid LIMIT :limit OFFSET :offset"
+    ),
+    'postgresql': (
+        "SELECT book_id FROM book_search WHERE document @@ to_tsquery('english', :query) "
+        "ORDER BY ts_rank(document, to_tsquery('english', :query)) DESC, book_id "
+        "LIMIT :limit OFFSET :offset"
+    ),
+}
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+REINDEX_BATCH_SIZE = 500
+
+
+def match_expression(dialect, q):
+    # Every word must match, the last one as a prefix ("harry pot" finds "Harry Potter")
+    tokens = TOKEN.findall(q.lower())
+    if not tokens:
+        return None
+    if dialect == 'sqlite':
+        return ' '.join(f'"{token}"' for token in tokens[:-1]) + f' "{tokens[-1]}"*'
+    return ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+
+
+def search_book_ids(q, limit, offset=0):
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    query = match_expression(dialect, q)
+    if query is None:
+        return []
+    rows = connection.execute(text(_QUERY[dialect]), {'query': query, 'limit': limit, 'offset': offset})
+    return [row[0] for row in rows]
+
+
+def remove_books(connection, book_ids):
+    dialect = connection.dialect.name
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), REINDEX_BATCH_SIZE):
+        batch = book_ids[start:start + REINDEX_BATCH_SIZE]
+        connection.execute(
+            text(f'DELETE FROM book_search WHERE {_KEY[dialect]} IN :ids').bindparams(bindparam('ids', expanding=True)),
+            {'ids': batch},
+        )
+
+
+def reindex_books(connection, book_ids):
+    dialect = connection.dialect.name
+    book_ids = list(book_ids)
+    remove_books(connection, book_ids)
+    insert = text(_INSERT[dialect] + ' WHERE books.id IN :ids').bindparams(bindparam('ids', expanding=True))
+    for start in range(0, len(book_ids), REINDEX_BATCH_SIZE):
+        connection.execute(insert, {'ids': book_ids[start:start + REINDEX_BATCH_SIZE]})
+
+
+def rebuild_index(connection):
+    connection.execute(text('DELETE FROM book_search'))
+    connection.execute(text(_INSERT[connection.dialect.name]))
+
+
+# Keep the index in step with Book, Author and Category writes
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    changed, removed, authors, categories = set(), set(), set(), set()
+    for obj in session.new:
+        if isinstance(obj, Book):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Book):
+            changed.add(obj.id)
+        elif isinstance(obj, Author):
+            authors.add(obj.id)
+        elif isinstance(obj, Category):
+            categories.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Book):
+            removed.add(obj.id)
+    plan = cascaded(session)
+    if plan:
+        removed |= plan['books']
+    if not (changed or removed or authors or categories):
+        return
+
+    connection = session.connection()
+    if authors or categories:
+        related = text(
+            'SELECT id FROM books WHERE author_id IN :authors OR category_id IN :categories'
+        ).bindparams(bindparam('authors', expanding=True), bindparam('categories', expanding=True))
+        changed.update(connection.execute(related, {'authors': list(authors), 'categories': list(categories)}).scalars())
+    if removed:
+        remove_books(connection, removed)
+    if changed - removed:
+        reindex_books(connection, changed - removed)
@@ -4,7 +4,7 @@
 from random import randint, choice as rc
 
 # Local imports
-from .config import app, db
+from .config import db
 from .models import User, Author, Book, Review, UserBookCollection, Category
 
 def seed_data():
@@ -17,97 +17,97 @@ def seed_data():
     Author.query.delete()
     Category.query.delete()
     User.query.delete()
-        
-        # Create users (admins)
-        admin_data = [
-            ('admin1', 'admin1@email.com', 'password123', 'admin'),
-            ('admin2', 'admin2@email.com', 'password123', 'admin'),
-            ('reader1', 'reader1@email.com', 'password123', 'reader')
-        ]
-        
-        users = []
-        for username, email, password, role in admin_data:
-            user = User(username=username, email=email, password=password, role=role)
-            users.append(user)
-        
-        db.session.add_all(users)
-        db.session.commit()
-        
-        # Create categories
-        category_data = [
-            ('Philosophy', 'Books about philosophical thoughts and ideas', 'https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=800'),
-            ('Programming', 'Coding and software development books', 'https://images.unsplash.com/photo-1461749280684-dccba630e2f6?w=800'),
-            ('Science Fiction', 'Futuristic and imaginative stories', 'https://images.unsplash.com/photo-1446776877081-d282a0f896e2?w=800'),
-            ('History', 'Historical events and biographies', 'https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=800')
-        ]
-        
-        categories = []
-        for name, desc, bg_img in category_data:
-            category = Category(name=name, description=desc, background_image=bg_img)
-            categories.append(category)
-        
-        db.session.add_all(categories)
-        db.session.commit()
-        
-        # Create authors for each admin
-        admin_users = [u for u in users if u.role == 'admin']
-        authors = []
-        
-        for i, admin in enumerate(admin_users):
-            if admin.username == 'admin1':
-                author_names = ['Derrick', f'Author {i+1}B']
-            else:
-                author_names = [f'Author {i+1}A', f'Author {i+1}B']
-            for name in author_names:
-                author = Author(
-                    name=name,
-                    bio=f'Author managed by {admin.username}',
-                    birth_year=randint(1970, 2000),
-                    user_id=admin.id
-                )
-                authors.append(author)
-        
-        db.session.add_all(authors)
-        db.session.commit()
-        
-        # Create books for each admin
-        books = []
-        book_templates = [
-            ('Philosophy of Mind', 'Exploring consciousness and thought'),
-            ('Python Mastery', 'Advanced programming techniques'),
-            ('Space Odyssey', 'Journey through the cosmos'),
-            ('Ancient Civilizations', 'Lost worlds and forgotten empires')
-        ]
-        
-        for i, admin in enumerate(admin_users):
-            admin_authors = [a for a in authors if a.user_id == admin.id]
-            for j, (title, desc) in enumerate(book_templates):
-                book = Book(
-                    title=f"{title} - Admin {i+1}",
-                    description=desc,
-                    isbn=f"978-{randint(1000000000, 9999999999)}",
-                    publication_year=randint(2020, 2024),
-                    author_id=rc(admin_authors).id,
-                    category_id=categories[j % len(categories)].id,
-                    created_by=admin.id
-                )
-                books.append(book)
-        
-        db.session.add_all(books)
-        db.session.commit()
-        
-        # Create reviews
-        reviews = []
-        
-        db.session.add_all(reviews)
-        db.session.commit()
-        
-        # Create user book collections
-        collections = []
-        
-        db.session.add_all(collections)
-        db.session.commit()
-        
+    
+    # Create users (admins)
+    admin_data = [
+        ('admin1', 'admin1@email.com', 'password123', 'admin'),
+        ('admin2', 'admin2@email.com', 'password123', 'admin'),
+        ('reader1', 'reader1@email.com', 'password123', 'reader')
+    ]
+    
+    users = []
+    for username, email, password, role in admin_data:
+        user = User(username=username, email=email, password=password, role=role)
+        users.append(user)
+    
+    db.session.add_all(users)
+    db.session.commit()
+    
+    # Create categories
+    category_data = [
+        ('Philosophy', 'Books about philosophical thoughts and ideas', 'https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=800'),
+        ('Programming', 'Coding and software development books', 'https://images.unsplash.com/photo-1461749280684-dccba630e2f6?w=800'),
+        ('Science Fiction', 'Futuristic and imaginative stories', 'https://images.unsplash.com/photo-1446776877081-d282a0f896e2?w=800'),
+        ('History', 'Historical events and biographies', 'https://images.unsplash.com/photo-1481627834876-b7833e8f5570?w=800')
+    ]
+    
+    categories = []
+    for name, desc, bg_img in category_data:
+        category = Category(name=name, description=desc, background_image=bg_img)
+        categories.append(category)
+    
+    db.session.add_all(categories)
+    db.session.commit()
+    
+    # Create authors for each admin
+    admin_users = [u for u in users if u.role == 'admin']
+    authors = []
+    
+    for i, admin in enumerate(admin_users):
+        if admin.username == 'admin1':
+            author_names = ['Derrick', f'Author {i+1}B']
+        else:
+            author_names = [f'Author {i+1}A', f'Author {i+1}B']
+        for name in author_names:
+            author = Author(
+                name=name,
+                bio=f'Author managed by {admin.username}',
+                birth_year=randint(1970, 2000),
+                user_id=admin.id
+            )
+            authors.append(author)
+    
+    db.session.add_all(authors)
+    db.session.commit()
+    
+    # Create books for each admin
+    books = []
+    book_templates = [
+        ('Philosophy of Mind', 'Exploring consciousness and thought'),
+        ('Python Mastery', 'Advanced programming techniques'),
+        ('Space Odyssey', 'Journey through the cosmos'),
+        ('Ancient Civilizations', 'Lost worlds and forgotten empires')
+    ]
+    
+    for i, admin in enumerate(admin_users):
+        admin_authors = [a for a in authors if a.user_id == admin.id]
+        for j, (title, desc) in enumerate(book_templates):
+            book = Book(
+                title=f"{title} - Admin {i+1}",
+                description=desc,
+                isbn=f"978-{randint(1000000000, 9999999999)}",
+                publication_year=randint(2020, 2024),
+                author_id=rc(admin_authors).id,
+                category_id=categories[j % len(categories)].id,
+                created_by=admin.id
+            )
+            books.append(book)
+    
+    db.session.add_all(books)
+    db.session.commit()
+    
+    # Create reviews
+    reviews = []
+    
+    db.session.add_all(reviews)
+    db.session.commit()
+    
+    # Create user book collections
+    collections = []
+    
+    db.session.add_all(collections)
+    db.session.commit()
+    
     print("Seed completed!")
     print(f"Created {len(users)} users")
     print(f"Created {len(authors)} authors")
@@ -115,7 +115,41 @@ def seed_data():
     print(f"Created {len(reviews)} reviews")
     print(f"Created {len(collections)} collections")
 
+def seed_if_empty():
+    """Add the sample users, categories, authors and books unless there are users already."""
+    if User.query.first():
+        return False
+    
+    # Create sample users
+    admin = User(username="admin", email="admin@example.com", password="admin", role="admin")
+    reader = User(username="reader", email="reader@example.com", password="reader", role="reader")
+    derrick = User(username="derrick", email="derrickg844@gmail.com", password="password123", role="reader")
+    db.session.add_all([admin, reader, derrick])
+    db.session.commit()
+    
+    # Create categories
+    fiction = Category(name="Fiction", description="Fiction books")
+    science = Category(name="Science", description="Science books")
+    mystery = Category(name="Mystery", description="Mystery books")
+    db.session.add_all([fiction, science, mystery])
+    db.session.commit()
+    
+    # Create authors
+    author1 = Author(name="John Doe", bio="Sample author", user_id=admin.id)
+    author2 = Author(name="Jane Smith", bio="Another author", user_id=admin.id)
+    db.session.add_all([author1, author2])
+    db.session.commit()
+    
+    # Create sample books
+    book1 = Book(title="The Great Adventure", description="An amazing fictional story", author_id=author1.id, category_id=fiction.id, created_by=admin.id, isbn="1234567890", publication_year=2023)
+    book2 = Book(title="Science Explained", description="Understanding the world through science", author_id=author2.id, category_id=science.id, created_by=admin.id, isbn="0987654321", publication_year=2024)
+    db.session.add_all([book1, book2])
+    db.session.commit()
+    return True
+
 if __name__ == '__main__':
-    with app.app_context():
+    from .app import create_app
+    
+    with create_app().app_context():
         db.create_all()
         seed_data()
\ No newline at end of file
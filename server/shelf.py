@@ -0,0 +1,106 @@
+# Standard library imports
+from urllib.parse import urlencode
+
+# Remote library imports
+from flask import request
+from sqlalchemy import func, select, union_all
+
+# Local imports
+from .config import db
+from .models import Book, Review, User, UserBookCollection
+from .serializers import serializer_for
+
+# A user's profile page in four indexed queries, however many books they shelved: the
+# user, the entry count per status and every status group's first page (both served by
+# ix_user_book_collections_user_id_status_id), and their first page of reviews with the
+# total. Entries and reviews carry the book's id and title from the same query. Each
+# group pages on by id through its own ?section=<status>|reviews&after=<id> link.
+
+REVIEWS = 'reviews'
+
+entry_view = serializer_for(UserBookCollection, rules=('-user', '-book'))
+review_view = serializer_for(Review)
+book_view = serializer_for(Book, fields=('title',))
+user_view = serializer_for(User)
+
+
+def _items(view, rows):
+    book_offset = view.width
+    return [{**view.from_row(row), 'book': book_view.from_row(row, book_offset)} for row in rows]
+
+
+def _section(view, rows, limit, section):
+    # rows hold one extra row when there is a next page
+    more = len(rows) > limit
+    rows = rows[:limit]
+    link = None
+    if more:
+        link = f'{request.base_url}?{urlencode({"section": section, "after": view.row_id(rows[-1]), "limit": limit})}'
+    return {'items': _items(view, rows), 'next': link}
+
+
+def _select(view, model):
+    columns, _ = view.columns()
+    book_columns, _ = book_view.columns()
+    return select(*columns, *book_columns).join_from(model, Book, Book.id == model.book_id)
+
+
+def shelf_summary(user, limit):
+    # Counts per status, then one UNION ALL of per-status LIMIT branches: both are
+    # index-only range scans, so the cost follows the page size, not the shelf size
+    entries = UserBookCollection.__table__
+    counts = dict(db.session.execute(
+        select(entries.c.status, func.count()).where(entries.c.user_id == user.id).group_by(entries.c.status)
+    ).all())
+    groups = {}
+    if counts:
+        pages = union_all(*[
+            select(entries.c.id).where(entries.c.user_id == user.id, entries.c.status == status)
+            .order_by(entries.c.id).limit(limit + 1).subquery().select()
+            for status in counts
+        ])
+        rows = db.session.execute(
+            _select(entry_view, UserBookCollection)
+            .where(UserBookCollection.id.in_(pages))
+            .order_by(UserBookCollection.status, UserBookCollection.id)
+        ).all()
+        status_index = entry_view.keys.index('status')
+        for row in rows:
+            groups.setdefault(row[status_index], []).append(row)
+
+    reviews = Review.__table__
+    page = (
+        select(reviews.c.id, func.count().over().label('total'))
+        .where(reviews.c.user_id == user.id)
+        .order_by(reviews.c.id)
+        .limit(limit + 1)
+        .subquery()
+    )
+    review_rows = db.session.execute(
+        _select(review_view, Review).add_columns(page.c.total)
+        .join(page, page.c.id == Review.id)
+        .order_by(Review.id)
+    ).all()
+
+    return {
+        'user': user_view.dump(user),
+        'counts': counts,
+        'shelves': {status: _section(entry_view, groups.get(status, []), limit, status) for status in counts},
+        REVIEWS: {'count': review_rows[0][-1] if review_rows else 0,
+                  **_section(review_view, review_rows, limit, REVIEWS)},
+    }
+
+
+def shelf_section(user, section, after, limit):
+    # One more page of a single status group (or of the reviews)
+    if section == REVIEWS:
+        view, model, criteria = review_view, Review, [Review.user_id == user.id]
+    else:
+        view, model = entry_view, UserBookCollection
+        criteria = [UserBookCollection.user_id == user.id, UserBookCollection.status == section]
+    if after is not None:
+        criteria.append(model.id > after)
+    rows = db.session.execute(
+        _select(view, model).where(*criteria).order_by(model.id).limit(limit + 1)
+    ).all()
+    return _section(view, rows, limit, section)
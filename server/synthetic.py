@@ -0,0 +1,209 @@
+# Standard library imports
+import csv
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+# Remote library imports
+from sqlalchemy import func, select, text
+
+# Local imports
+from .models import Author, Book, Category, Review, User, UserBookCollection
+from .passwords import hash_password
+
+# Synthetic data at production scale for load tests. Rows are generated lazily and
+# written in fixed-size batches (executemany, or COPY on Postgres), so memory depends
+# on the batch size and the number of books, not on how many rows are written. Text
+# comes from small Faker-generated pools, and every random choice is drawn from one
+# seeded generator, so the same arguments always produce the same rows (the password
+# hash, shared by every synthetic user, has its own random salt).
+
+SYNTHETIC_PASSWORD = 'password'
+STATUSES = ('want_to_read', 'reading', 'read')
+STATUS_WEIGHTS = (3, 1, 4)
+POOL_SIZE = 1000
+EPOCH = datetime(2020, 1, 1)
+SPAN_SECONDS = 5 * 365 * 24 * 3600
+
+
+class Popularity:
+    """Draws ids from ``first``..``first + count - 1``, uniformly or Zipf-distributed.
+
+    Ranks are spread over the id range by a fixed permutation, so popular rows are not
+    simply the lowest ids.
+    """
+
+    def __init__(self, rng, first, count, skew='zipf', exponent=1.1):
+        self.rng = rng
+        self.first = first
+        self.count = count
+        self.cum_weights = None
+        if skew == 'zipf':
+            self.cum_weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+        # A multiplier coprime with count turns rank -> id into a permutation
+        self.step = next(step for step in range(count // 2 + 1, 2 * count + 2) if _gcd(step, count) == 1)
+
+    def draw(self, k):
+        if self.cum_weights is None:
+            ranks = [self.rng.randrange(self.count) for _ in range(k)]
+        else:
+            ranks = self.rng.choices(range(self.count), cum_weights=self.cum_weights, k=k)
+        return [self.first + rank * self.step % self.count for rank in ranks]
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def _isbn13(number):
+    digits = f'978{number % 10 ** 9:09d}'
+    check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def _pools(seed):
+    from faker import Faker
+
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        'names': [fake.name() for _ in range(POOL_SIZE)],
+        'words': [fake.word().capitalize() for _ in range(POOL_SIZE)],
+        'sentences': [fake.sentence(nb_words=12) for _ in range(POOL_SIZE)],
+        'paragraphs': [fake.paragraph(nb_sentences=4) for _ in range(POOL_SIZE)],
+    }
+
+
+def _timestamp(rng):
+    return EPOCH + timedelta(seconds=rng.randrange(SPAN_SECONDS))
+
+
+def _next_id(connection, table):
+    return (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _write(connection, table, rows, batch_size):
+    columns = None
+    written = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return written
+        if connection.dialect.name == 'postgresql':
+            columns = columns or list(batch[0])
+            _copy(connection, table, columns, batch)
+        else:
+            connection.execute(table.insert(), batch)
+        connection.commit()
+        written += len(batch)
+
+
+def _copy(connection, table, columns, batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([r'\N' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+
+
+def generate(connection, users=1000, categories=20, authors=500, books=10000, reviews=100000,
+             collections=50000, skew='zipf', exponent=1.1, seed=42, batch_size=5000, report=print):
+    """Append synthetic rows after the existing ones; returns {table: (rows, seconds)}."""
+    rng = random.Random(seed)
+    pools = _pools(seed)
+    password = hash_password(SYNTHETIC_PASSWORD)
+    first = {model: _next_id(connection, model.__table__)
+             for model in (User, Category, Author, Book, Review, UserBookCollection)}
+
+    def user_rows():
+        for i in range(first[User], first[User] + users):
+            yield {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': password,
+                   'role': 'admin' if i % 100 == 0 else 'reader', 'created_at': _timestamp(rng)}
+
+    def category_rows():
+        for i in range(first[Category], first[Category] + categories):
+            yield {'id': i, 'name': f"{pools['words'][i % POOL_SIZE]} {i}",
+                   'description': rng.choice(pools['sentences']), 'background_image': None}
+
+    def author_rows():
+        for i in range(first[Author], first[Author] + authors):
+            yield {'id': i, 'name': rng.choice(pools['names']), 'bio': rng.choice(pools['sentences']),
+                   'birth_year': rng.randint(1900, 2000), 'user_id': None}
+
+    def book_rows():
+        for i in range(first[Book], first[Book] + books):
+            yield {'id': i, 'title': ' '.join(rng.sample(pools['words'], rng.randint(1, 4))),
+                   'description': rng.choice(pools['paragraphs']), 'isbn': _isbn13(i),
+                   'publication_year': rng.randint(1950, 2024),
+                   'author_id': first[Author] + rng.randrange(authors),
+                   'category_id': first[Category] + rng.randrange(categories),
+                   'created_by': first[User] + rng.randrange(users)}
+
+    book_popularity = Popularity(rng, first[Book], books, skew, exponent) if books else None
+    user_activity = Popularity(rng, first[User], users, skew, exponent) if users else None
+
+    def review_rows():
+        remaining, i = reviews, first[Review]
+        while remaining:
+            k = min(batch_size, remaining)
+            for book_id, user_id in zip(book_popularity.draw(k), user_activity.draw(k)):
+                yield {'id': i, 'rating': rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 4, 3))[0],
+                       'content': rng.choice(pools['sentences']), 'created_at': _timestamp(rng),
+                       'user_id': user_id, 'book_id': book_id}
+                i += 1
+            remaining -= k
+
+    def collection_rows():
+        # Spread evenly over users; each user's books are distinct, drawn by popularity
+        i = first[UserBookCollection]
+        per_user, extra = divmod(collections, users) if users else (0, 0)
+        for n, user_id in enumerate(range(first[User], first[User] + users)):
+            wanted = min(per_user + (1 if n < extra else 0), books)
+            shelf = set()
+            for _ in range(3):
+                shelf.update(book_popularity.draw(wanted - len(shelf)))
+            # Rarely drawn books: top up in id order rather than sampling forever
+            filler = iter(range(first[Book], first[Book] + books))
+            while len(shelf) < wanted:
+                shelf.add(next(filler))
+            for book_id in sorted(shelf):
+                yield {'id': i, 'user_id': user_id, 'book_id': book_id,
+                       'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0], 'date_added': _timestamp(rng)}
+                i += 1
+
+    plan = [
+        (User, users, user_rows),
+        (Category, categories, category_rows),
+        (Author, authors, author_rows),
+        (Book, books if authors and categories and users else 0, book_rows),
+        (Review, reviews if books and users else 0, review_rows),
+        (UserBookCollection, collections if books and users else 0, collection_rows),
+    ]
+    stats = {}
+    for model, count, rows in plan:
+        if not count:
+            continue
+        start = time.perf_counter()
+        written = _write(connection, model.__table__, rows(), batch_size)
+        elapsed = time.perf_counter() - start
+        stats[model.__tablename__] = (written, elapsed)
+        report(f'  {model.__tablename__:<22} {written:>11,} rows  {elapsed:8.2f}s  {written / elapsed:>10,.0f} rows/s')
+
+    if connection.dialect.name == 'postgresql':
+        # Explicit ids don't advance the serial sequences
+        for model, _, _ in plan:
+            table = model.__tablename__
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"))
+        connection.commit()
+    return stats
@@ -0,0 +1,269 @@
+# Standard library imports
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import zlib
+
+# Remote library imports
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+
+# Local imports
+from .models import Author, Book, Category, Review, User, UserBookCollection
+
+# Whole-catalog export and import, one file per table (NDJSON or CSV, optionally gzip) in
+# foreign-key order. Export streams each table by id from a server-side cursor; import
+# reads the files line by line and inserts fixed-size batches, so memory does not grow
+# with the row count. Imported ids are shifted by a per-table offset (the target table's
+# max id when its import began, so zero for an empty database) and foreign keys by their
+# parent's offset, which needs no id map. Offsets and finished tables are kept in a small
+# SQLite state file beside the data, one per target database; rerunning an interrupted
+# import resumes each table after the highest id it already committed, so nothing else
+# should write to the target meanwhile. Rows must not clash with its unique columns
+# (usernames, emails, category names, ISBNs). Derived data (search index,
+# recommendations) is not exported; rebuild it after an import.
+
+MODELS = (User, Category, Author, Book, Review, UserBookCollection)
+TABLES = {model.__tablename__: model.__table__ for model in MODELS}
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# CSV has no NULL; use the same marker as COPY
+NULL = r'\N'
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 5000
+MANIFEST = 'manifest.json'
+# One state file per target database, so an export can be loaded into several
+STATE_FILE = '.import-{}.sqlite'
+
+
+class TransferError(Exception):
+    pass
+
+
+def filename(table, fmt, compress):
+    return f'{table}.{fmt}' + ('.gz' if compress else '')
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _decoder(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if issubclass(python_type, datetime.datetime):
+        return datetime.datetime.fromisoformat
+    if issubclass(python_type, datetime.date):
+        return datetime.date.fromisoformat
+    if python_type in (int, float):
+        return python_type
+    if python_type is bool:
+        return lambda value: value if isinstance(value, bool) else value.lower() in ('1', 'true', 't')
+    return None
+
+
+def _foreign_keys(table):
+    # column name -> referenced table name
+    return {fk.parent.name: fk.column.table.name for fk in table.foreign_keys}
+
+
+# Export
+
+def _export_batches(connection, table, fmt, batch_size):
+    # (text, rows) per batch of rows read from the cursor
+    columns = [column.name for column in table.columns]
+    result = connection.execute(select(table).order_by(table.c.id).execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+    for rows in result.partitions():
+        if writer:
+            writer.writerows([NULL if value is None else _encode(value) for value in row] for row in rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps({key: _encode(value) for key, value in zip(columns, row)}))
+                buffer.write('\n')
+        yield buffer.getvalue(), len(rows)
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue(), 0
+
+
+def export_chunks(connection, table, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield one table as text chunks, a batch of rows at a time."""
+    for chunk, _ in _export_batches(connection, table, fmt, batch_size):
+        yield chunk
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(connection, directory, fmt='ndjson', compress=False, report=print):
+    """Write every table and a manifest into directory; call inside one transaction for a snapshot."""
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'format': fmt, 'gzip': compress, 'tables': []}
+    for table in TABLES.values():
+        name = filename(table.name, fmt, compress)
+        path = os.path.join(directory, name)
+        count = 0
+        with (gzip.open(path, 'wt', newline='') if compress else open(path, 'w', newline='')) as f:
+            for chunk, rows in _export_batches(connection, table, fmt, EXPORT_BATCH_SIZE):
+                f.write(chunk)
+                count += rows
+        manifest['tables'].append({'table': table.name, 'file': name, 'rows': count})
+        report(f'  {table.name:<22} {count:>11,} rows')
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# Import
+
+def _read_rows(path, fmt, compress):
+    # Yields {column: raw value}; NDJSON values keep their JSON types, CSV values are strings
+    with (gzip.open(path, 'rt', newline='') if compress else open(path, newline='')) as f:
+        if fmt == 'csv':
+            reader = csv.reader(f)
+            header = next(reader, None)
+            for values in reader:
+                yield {key: None if value == NULL else value for key, value in zip(header, values)}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class ImportState:
+    """Per-table id offsets and completion flags for one export directory."""
+
+    def __init__(self, path, manifest):
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS tables ('
+                        'name TEXT PRIMARY KEY, id_offset INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0)')
+        fingerprint = json.dumps(manifest, sort_keys=True)
+        stored = self.db.execute("SELECT value FROM meta WHERE key = 'manifest'").fetchone()
+        if stored is None:
+            self.db.execute("INSERT INTO meta VALUES ('manifest', ?)", (fingerprint,))
+        elif stored[0] != fingerprint:
+            raise TransferError(f'{path} belongs to a different export; delete it to start over')
+        self.db.commit()
+
+    def table(self, name):
+        return self.db.execute('SELECT id_offset, done FROM tables WHERE name = ?', (name,)).fetchone()
+
+    def start(self, name, offset):
+        self.db.execute('INSERT INTO tables (name, id_offset) VALUES (?, ?)', (name, offset))
+        self.db.commit()
+
+    def finish(self, name):
+        self.db.execute('UPDATE tables SET done = 1 WHERE name = ?', (name,))
+        self.db.commit()
+
+    def offsets(self):
+        return dict(self.db.execute('SELECT name, id_offset FROM tables'))
+
+    def close(self):
+        self.db.close()
+
+
+def import_catalog(engine, directory, batch_size=IMPORT_BATCH_SIZE, report=print):
+    """Load an export_catalog directory; returns {table: rows inserted by this run}."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    unknown = [entry['table'] for entry in manifest['tables'] if entry['table'] not in TABLES]
+    if unknown:
+        raise TransferError(f"unknown tables in manifest: {', '.join(unknown)}")
+    target = hashlib.sha1(engine.url.render_as_string(hide_password=True).encode()).hexdigest()[:12]
+    state = ImportState(os.path.join(directory, STATE_FILE.format(target)), manifest)
+    entries = {entry['table']: entry for entry in manifest['tables']}
+    inserted = {}
+    try:
+        # FK order comes from the models, whatever order the manifest lists
+        for name, table in TABLES.items():
+            if name not in entries:
+                continue
+            with engine.connect() as connection:
+                highest = connection.execute(select(func.max(table.c.id))).scalar() or 0
+            progress = state.table(name)
+            if progress is None:
+                state.start(name, highest)
+                progress = (highest, 0)
+            offset, done = progress
+            if done:
+                report(f'  {name:<22} already imported')
+                continue
+            # Rows up to the highest id committed by an earlier run are skipped
+            resume_after = highest - offset
+            inserted[name] = _import_table(engine, table, directory, entries[name], manifest, offset,
+                                           state.offsets(), resume_after, batch_size)
+            state.finish(name)
+            report(f'  {name:<22} {inserted[name]:>11,} rows' +
+                   (f' (resumed after id {resume_after})' if resume_after > 0 else ''))
+        if engine.dialect.name == 'postgresql':
+            # Explicit ids don't advance the serial sequences
+            with engine.begin() as connection:
+                for name in inserted:
+                    connection.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), COALESCE(MAX(id), 1)) FROM {name}"))
+    finally:
+        state.close()
+    return inserted
+
+
+def _import_table(engine, table, directory, entry, manifest, offset, offsets, resume_after, batch_size):
+    decoders = {column.name: _decoder(column) for column in table.columns}
+    foreign_keys = _foreign_keys(table)
+    path = os.path.join(directory, entry['file'])
+    count, previous, batch = 0, None, []
+
+    def flush():
+        try:
+            with engine.begin() as connection:
+                connection.execute(table.insert(), batch)
+        except IntegrityError as e:
+            # e.g. a username or category name the target already has; nothing of this batch is kept
+            raise TransferError(f'{table.name}, ids {batch[0]["id"] - offset}-{batch[-1]["id"] - offset}: {e.orig}')
+
+    for raw in _read_rows(path, manifest['format'], manifest['gzip']):
+        row = {}
+        for key, value in raw.items():
+            if key not in decoders:
+                continue
+            decode = decoders[key]
+            row[key] = decode(value) if value is not None and decode is not None else value
+        old_id = row['id']
+        if previous is not None and old_id <= previous:
+            raise TransferError(f'{entry["file"]}: ids must be ascending (id {old_id} after {previous})')
+        previous = old_id
+        if old_id <= resume_after:
+            continue
+        row['id'] = old_id + offset
+        for column, parent in foreign_keys.items():
+            if row.get(column) is not None:
+                row[column] += offsets.get(parent, 0)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            count += len(batch)
+            batch = []
+    if batch:
+        flush()
+        count += len(batch)
+    return count
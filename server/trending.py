@@ -0,0 +1,179 @@
+# Standard library imports
+import time
+from collections import defaultdict
+from datetime import datetime
+
+# Remote library imports
+from flask_sqlalchemy.session import Session
+from sqlalchemy import bindparam, delete, event, false, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Local imports
+from .cascades import cascaded
+from .models import Book, BookTrending, Review, TrendingPeriod, UserBookCollection
+
+# "Trending": books ranked by recent activity, reviews and shelf adds, per window. Each
+# event's weight halves every quarter window, so last week's activity barely counts for
+# 24h. Scores use forward decay: an event at time t adds weight * 2^((t - epoch) / half
+# life) to the book's stored score, which only ever grows, while every book's decayed
+# score is its stored score times the same 2^(-(now - epoch) / half life). Ranking by
+# the stored score is ranking by the decayed one, so a write is one upsert per window and
+# a read is the top of the (period, score) index. Once the stored numbers have grown by
+# 2^REBASE_HALF_LIVES the period's epoch moves forward: its rows are rescaled and the
+# ones that have decayed to nothing deleted. Deleted reviews and shelf entries are taken
+# back out and moved ones take their weight to the new book; rows the database deletes
+# by cascade (with a deleted user) are not, until `flask rebuild-trending` recomputes
+# everything from the two tables.
+
+# Window name -> length in seconds
+WINDOWS = {'24h': 24 * 3600, '7d': 7 * 24 * 3600, '30d': 30 * 24 * 3600}
+DEFAULT_WINDOW = '7d'
+WEIGHTS = {Review: 2.0, UserBookCollection: 1.0}
+REBASE_HALF_LIVES = 32
+# Activity older than this many half-lives (weight under 1/4096) is dropped
+HORIZON_HALF_LIVES = 12
+# A book trends in a window only with at least one shelf add's worth of activity from
+# within it
+MIN_SCORE = WEIGHTS[UserBookCollection] * 2 ** -4
+
+_trending = BookTrending.__table__
+_periods = TrendingPeriod.__table__
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def half_life(period):
+    return WINDOWS[period] / 4
+
+
+def _timestamp(value, now):
+    # Naive UTC datetimes; a missing or future date counts as now
+    if value is None:
+        return now
+    return min((value - _UNIX_EPOCH).total_seconds(), now)
+
+
+def _upsert(connection):
+    insert_ = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    stmt = insert_(_trending).values(book_id=bindparam('b'), period=bindparam('p'), score=bindparam('d'))
+    return stmt.on_conflict_do_update(index_elements=['book_id', 'period'],
+                                      set_={'score': _trending.c.score + stmt.excluded.score})
+
+
+def _rebase(connection, period, epoch, now):
+    # Only the writer that moves the epoch rescales; the others see the new one
+    moved = connection.execute(update(_periods).where(_periods.c.period == period, _periods.c.epoch == epoch)
+                               .values(epoch=now)).rowcount
+    if not moved:
+        return connection.execute(select(_periods.c.epoch).where(_periods.c.period == period)).scalar()
+    factor = 2 ** ((epoch - now) / half_life(period))
+    connection.execute(update(_trending).where(_trending.c.period == period).values(score=_trending.c.score * factor))
+    connection.execute(delete(_trending).where(
+        _trending.c.period == period, _trending.c.score < 2 ** -HORIZON_HALF_LIVES))
+    return now
+
+
+def epochs(connection, now=None):
+    """{period: epoch}, creating missing periods and moving any that are due."""
+    now = time.time() if now is None else now
+    # Shared row locks on PostgreSQL: a rebase waits for writers using the old epoch
+    found = dict(connection.execute(select(_periods.c.period, _periods.c.epoch).with_for_update(read=True)).all())
+    missing = [{'period': period, 'epoch': now} for period in WINDOWS if period not in found]
+    if missing:
+        insert_ = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+        connection.execute(insert_(_periods).on_conflict_do_nothing(), missing)
+        found = dict(connection.execute(select(_periods.c.period, _periods.c.epoch)).all())
+    for period, epoch in found.items():
+        if period in WINDOWS and now - epoch > REBASE_HALF_LIVES * half_life(period):
+            found[period] = _rebase(connection, period, epoch, now)
+    return found
+
+
+def record(connection, events, now=None):
+    """Add activity: events are (book_id, unix time, weight); negative weights take it back."""
+    if not events:
+        return
+    now = time.time() if now is None else now
+    params = []
+    for period, epoch in epochs(connection, now).items():
+        if period not in WINDOWS:
+            continue
+        life = half_life(period)
+        deltas = defaultdict(float)
+        for book_id, at, weight in events:
+            deltas[book_id] += weight * 2 ** ((at - epoch) / life)
+        params.extend({'b': book_id, 'p': period, 'd': delta} for book_id, delta in deltas.items())
+    connection.execute(_upsert(connection), params)
+
+
+def rebuild_trending(connection, now=None):
+    """Recompute every window from reviews and shelf entries; returns the rows stored."""
+    now = time.time() if now is None else now
+    connection.execute(delete(_trending))
+    connection.execute(delete(_periods))
+    connection.execute(insert(_periods), [{'period': period, 'epoch': now} for period in WINDOWS])
+    longest = max(half_life(period) for period in WINDOWS)
+    since = datetime.utcfromtimestamp(now - HORIZON_HALF_LIVES * longest)
+    scores = {period: defaultdict(float) for period in WINDOWS}
+    for model, column in ((Review, Review.created_at), (UserBookCollection, UserBookCollection.date_added)):
+        weight = WEIGHTS[model]
+        result = connection.execute(select(model.book_id, column).where((column >= since) | column.is_(None))
+                                    .execution_options(yield_per=5000))
+        for book_id, created in result:
+            at = _timestamp(created, now)
+            for period, books in scores.items():
+                age = (now - at) / half_life(period)
+                if age <= HORIZON_HALF_LIVES:
+                    books[book_id] += weight * 2 ** -age
+    rows = [{'book_id': book_id, 'period': period, 'score': score}
+            for period, books in scores.items() for book_id, score in books.items()]
+    for start in range(0, len(rows), 5000):
+        connection.execute(insert(_trending), rows[start:start + 5000])
+    return len(rows)
+
+
+def trending_books_query(view, period, epoch, now=None):
+    now = time.time() if now is None else now
+    age = (now - epoch) / half_life(period)
+    query = (view.select()
+             .join(BookTrending, BookTrending.book_id == Book.id)
+             .order_by(BookTrending.score.desc(), BookTrending.book_id.desc()))
+    if age > REBASE_HALF_LIVES + HORIZON_HALF_LIVES:
+        # No write has moved the epoch for so long that every event stored is past the
+        # horizon (and the floor below would overflow a float)
+        return query.where(false())
+    # MIN_SCORE in stored units, which are 2^((now - epoch) / half life) times larger
+    return query.where(BookTrending.period == period, BookTrending.score >= MIN_SCORE * 2 ** age)
+
+
+# Keep the scores in step with review and shelf writes
+
+@event.listens_for(Session, 'after_flush')
+def _record_activity(session, flush_context):
+    plan = cascaded(session)
+    removed = set(plan['books']) if plan else set()
+    removed.update(obj.id for obj in session.deleted if isinstance(obj, Book))
+    now = time.time()
+    events = []
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            weight = WEIGHTS.get(type(obj))
+            if weight is None or obj.book_id in removed:
+                continue
+            created = obj.created_at if isinstance(obj, Review) else obj.date_added
+            events.append((obj.book_id, _timestamp(created, now), sign * weight))
+    for obj in session.dirty:
+        # A review or shelf entry moved to another book takes its weight along
+        weight = WEIGHTS.get(type(obj))
+        if weight is None:
+            continue
+        book = inspect(obj).attrs.book_id.history
+        if not book.has_changes():
+            continue
+        created = _timestamp(obj.created_at if isinstance(obj, Review) else obj.date_added, now)
+        for old in book.deleted:
+            if old not in removed:
+                events.append((old, created, -weight))
+        if obj.book_id not in removed:
+            events.append((obj.book_id, created, weight))
+    if events:
+        record(session.connection(), events, now)
@@ -0,0 +1,33 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from server.app import create_app
+from server.config import db
+from server.models import Author, Book, Category, User
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A throwaway SQLite file with the schema `flask init-db` creates
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    app = create_app({'TESTING': True})
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def catalog(app):
+    # Two readers, two authors and three books, written through the ORM like the API does
+    users = [User(username=f'reader{i}', email=f'reader{i}@example.com', password='password') for i in (1, 2)]
+    category = Category(name='Fiction')
+    authors = [Author(name=f'Author {i}') for i in (1, 2)]
+    books = [Book(title=f'Book {i}', author=authors[i % 2], category=category) for i in (1, 2, 3)]
+    db.session.add_all([*users, category, *authors, *books])
+    db.session.commit()
+    return {'users': [user.id for user in users], 'authors': [author.id for author in authors],
+            'category': category.id, 'books': [book.id for book in books]}
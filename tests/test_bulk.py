@@ -0,0 +1,95 @@
+# Standard library imports
+import json
+
+# Remote library imports
+from sqlalchemy import func, select
+
+# Local imports
+from server.config import db
+from server.models import Author, Review, User
+from server.passwords import verify_password
+
+
+def test_partial_create_commits_the_valid_items(app, catalog):
+    client = app.test_client()
+    response = client.post('/authors', json=[{'name': 'First'}, {'bio': 'no name'}, 'not an object',
+                                             {'name': 'Second'}])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [author['name'] for author in body['created']] == ['First', 'Second']
+    assert body['errors'] == [{'index': 1, 'error': "missing field 'name'"},
+                              {'index': 2, 'error': 'item must be a JSON object'}]
+    db.session.remove()
+    names = db.session.execute(select(Author.name).where(Author.id.in_(
+        [author['id'] for author in body['created']]))).scalars().all()
+    assert sorted(names) == ['First', 'Second']
+
+
+def test_ndjson_create_retries_each_item_after_a_failed_flush(app, catalog):
+    user_id, book_id = catalog['users'][0], catalog['books'][0]
+    lines = [{'rating': 5, 'content': 'Good', 'user_id': user_id, 'book_id': book_id},
+             {'rating': 9, 'content': 'Too good', 'user_id': user_id, 'book_id': book_id},
+             {'rating': 3, 'content': 'No such book', 'user_id': user_id, 'book_id': 999999},
+             {'rating': 4, 'content': 'Fine', 'user_id': user_id, 'book_id': book_id}]
+    response = app.test_client().post('/reviews', data='\n'.join(map(json.dumps, lines)),
+                                      content_type='application/x-ndjson')
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [review['content'] for review in body['created']] == ['Good', 'Fine']
+    assert body['errors'] == [{'index': 1, 'error': 'Rating must be between 1 and 5'},
+                              {'index': 2, 'error': 'FOREIGN KEY constraint failed'}]
+    db.session.remove()
+    assert db.session.execute(select(func.count()).select_from(Review)).scalar() == 2
+
+
+def test_users_that_break_unique_constraints(app, catalog):
+    client = app.test_client()
+    existing = db.session.get(User, catalog['users'][0])
+    response = client.post('/users', json=[
+        {'username': 'new1', 'email': 'new1@example.com', 'password': 'secret1'},
+        {'username': existing.username, 'email': 'taken-name@example.com', 'password': 'secret'},
+        {'username': 'new2', 'email': existing.email, 'password': 'secret'},
+        {'username': 'new3', 'email': 'new1@example.com', 'password': 'secret'},
+        {'username': 'new4', 'email': 'new4@example.com', 'password': 'secret4'},
+    ])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [user['username'] for user in body['created']] == ['new1', 'new4']
+    assert all('password' not in user for user in body['created'])
+    assert body['errors'] == [{'index': 1, 'error': 'UNIQUE constraint failed: users.username'},
+                              {'index': 2, 'error': 'UNIQUE constraint failed: users.email'},
+                              {'index': 3, 'error': 'UNIQUE constraint failed: users.email'}]
+    db.session.remove()
+    stored = dict(db.session.execute(select(User.username, User.password).where(
+        User.username.in_(['new1', 'new2', 'new3', 'new4']))).all())
+    assert sorted(stored) == ['new1', 'new4']
+    assert verify_password(stored['new1'], 'secret1')[0]
+
+
+def test_all_items_failing_is_a_400(app, catalog):
+    response = app.test_client().post('/authors', json=[{}, {'bio': 'x'}])
+    assert response.status_code == 400
+    assert response.get_json()['created'] == []
+    assert [error['index'] for error in response.get_json()['errors']] == [0, 1]
+
+
+def test_partial_update_and_delete(app, catalog):
+    client = app.test_client()
+    first, second = catalog['authors']
+    response = client.patch('/authors', json=[{'id': first, 'name': 'Renamed'}, {'id': 999999, 'name': 'Ghost'},
+                                              {'id': second, 'name': None}])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [author['name'] for author in body['updated']] == ['Renamed']
+    assert [error['index'] for error in body['errors']] == [1, 2]
+    assert body['errors'][0]['error'] == 'not found'
+    assert body['errors'][1]['error'] == 'NOT NULL constraint failed: authors.name'
+    db.session.remove()
+    assert db.session.get(Author, first).name == 'Renamed'
+    assert db.session.get(Author, second).name == 'Author 2'
+
+    response = client.delete(f'/authors?ids={first},999999')
+    assert response.status_code == 207
+    assert response.get_json() == {'deleted': [first], 'errors': [{'index': 1, 'error': 'not found'}]}
+    db.session.remove()
+    assert db.session.get(Author, first) is None
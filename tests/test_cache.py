@@ -0,0 +1,83 @@
+# Local imports
+from server.cache import MemoryBackend, get_cache
+from server.config import db
+from server.models import Author
+
+
+def test_row_versions_are_bounded_and_never_go_back():
+    backend = MemoryBackend(max_versions=100)
+    backend.bump(['books:1', 'books:1', 'books:1'])
+    key = backend.versions(['books:1'])
+    backend.bump([f'books:{id}' for id in range(2, 1002)])
+    assert len(backend._row_versions) == 100
+
+    # Evicted: reads as a version at least as new as its own, and its next bump moves past it
+    evicted = backend.versions(['books:1'])
+    assert evicted >= key
+    backend.bump(['books:1'])
+    assert backend.versions(['books:1']) > evicted
+    # Other tables and table tags are unaffected
+    backend.bump(['books', 'authors:1'])
+    assert backend.versions(['books', 'authors:1', 'authors:2']) == [1, 1, 0]
+
+
+def _versions(*tags):
+    return get_cache().backend.versions(tags)
+
+
+def test_write_is_seen_by_the_next_get(app, catalog):
+    client = app.test_client()
+    author = catalog['authors'][0]
+    assert client.get(f'/authors/{author}').get_json()['name'] == 'Author 1'
+    etag = client.get(f'/authors/{author}').headers['ETag']
+    assert client.get(f'/authors/{author}', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.patch(f'/authors/{author}', json={'name': 'Renamed'}).status_code == 200
+    response = client.get(f'/authors/{author}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'Renamed'
+    assert 'Renamed' in [row['name'] for row in client.get('/authors').get_json()]
+
+
+def test_rollback_leaves_versions_unchanged(app, catalog):
+    author = catalog['authors'][0]
+    before = _versions('authors', f'authors:{author}')
+    db.session.get(Author, author).name = 'Never committed'
+    db.session.flush()
+    db.session.rollback()
+    assert _versions('authors', f'authors:{author}') == before
+
+    # The next commit bumps only what it wrote
+    db.session.get(Author, catalog['authors'][1]).name = 'Committed'
+    db.session.commit()
+    assert _versions('authors', f'authors:{author}') == [before[0] + 1, before[1]]
+
+
+def test_savepoint_rollback_keeps_its_tags(app, catalog):
+    first, second = catalog['authors']
+    before = _versions(f'authors:{first}', f'authors:{second}')
+    db.session.get(Author, first).name = 'Outer'
+    db.session.flush()
+    with db.session.begin_nested() as savepoint:
+        db.session.get(Author, second).name = 'Inner'
+        db.session.flush()
+        savepoint.rollback()
+    db.session.commit()
+    # Bumping the rolled-back row too costs at most a miss
+    assert _versions(f'authors:{first}', f'authors:{second}') == [version + 1 for version in before]
+
+
+def test_review_move_bumps_both_books(app, catalog):
+    client = app.test_client()
+    first, second, third = catalog['books']
+    review = client.post('/reviews', json={'rating': 4, 'content': 'Good', 'user_id': catalog['users'][0],
+                                           'book_id': first}).get_json()['id']
+    assert client.get(f'/books/{first}').get_json()['review_count'] == 1
+    assert client.get(f'/books/{second}').get_json()['review_count'] == 0
+    before = _versions(f'books:{first}', f'books:{second}', f'books:{third}')
+
+    assert client.patch(f'/reviews/{review}', json={'book_id': second}).status_code == 200
+    after = _versions(f'books:{first}', f'books:{second}', f'books:{third}')
+    assert [a - b for a, b in zip(after, before)] == [1, 1, 0]
+    assert client.get(f'/books/{first}').get_json()['review_count'] == 0
+    assert client.get(f'/books/{second}').get_json()['review_count'] == 1
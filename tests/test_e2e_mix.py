@@ -0,0 +1,33 @@
+# Local imports
+from benchmarks.e2e_bench import compare, plan, scale_counts
+from server.config import db
+from server.synthetic import generate
+
+
+def test_benchmark_traffic_mix_succeeds(app):
+    # Every request the end-to-end benchmark replays is answered, so it times real pages
+    # and logins rather than error paths
+    counts = scale_counts(200, 2)
+    with db.engine.connect() as connection:
+        generate(connection, **counts, report=lambda line: None)
+    client = app.test_client()
+    for endpoint, method, url, body in plan(counts, 300, 42):
+        response = client.open(url, method=method, json=body)
+        assert response.status_code == 200, (endpoint, url)
+        assert response.get_json(), (endpoint, url)
+
+
+def test_baseline_comparison_flags_only_regressions_beyond_the_threshold():
+    def run(p95, throughput, rss):
+        return {'1k': {'gunicorn': {'GET /books': {'p95_ms': p95, 'p99_ms': 20.0, 'throughput': throughput,
+                                                   'peak_rss_mb': rss}}}}
+
+    baseline = run(10.0, 100.0, 50.0)
+    assert compare(run(11.9, 81.0, 59.0), baseline, 0.2) == []
+    # Faster and leaner is never a regression
+    assert compare(run(2.0, 500.0, 10.0), baseline, 0.2) == []
+    failures = compare(run(12.5, 79.0, 50.0), baseline, 0.2)
+    assert failures == ['1k gunicorn GET /books p95_ms: 10.0 -> 12.5 (+25%)',
+                        '1k gunicorn GET /books throughput: 100.0 -> 79.0 (-21%)']
+    # Scales, modes and endpoints the baseline lacks are not compared
+    assert compare({'10k': run(99.0, 1.0, 999.0)['1k']}, baseline, 0.2) == []
@@ -0,0 +1,84 @@
+# Remote library imports
+from sqlalchemy import select
+
+# Local imports
+from server import purge
+from server.config import db
+from server.models import Book, Review
+
+
+def _multiget(client, ids, include='', resource='books'):
+    response = client.get(f'/{resource}?ids={",".join(map(str, ids))}' + (f'&include={include}' if include else ''))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _row_hits(app):
+    return app.extensions['row_cache'].hits
+
+
+def _review(client, user_id, book_id):
+    response = client.post('/reviews', json={'rating': 4, 'content': 'Review', 'user_id': user_id,
+                                             'book_id': book_id})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_update_invalidates_cached_rows(app, catalog):
+    client = app.test_client()
+    books = catalog['books']
+    assert [book['title'] for book in _multiget(client, books)['items']] == ['Book 1', 'Book 2', 'Book 3']
+    hits = _row_hits(app)
+    _multiget(client, books)
+    assert _row_hits(app) == hits + 3
+
+    assert client.patch(f'/books/{books[0]}', json={'title': 'Renamed'}).status_code == 200
+    assert [book['title'] for book in _multiget(client, books)['items']] == ['Renamed', 'Book 2', 'Book 3']
+    # A review changes the book's rating aggregates and its nested reviews
+    _multiget(client, books, 'reviews')
+    _review(client, catalog['users'][0], books[1])
+    item = _multiget(client, books, 'reviews')['items'][1]
+    assert (item['review_count'], len(item['reviews'])) == (1, 1)
+
+
+def test_cascaded_delete_invalidates_cached_rows(app, catalog):
+    client = app.test_client()
+    books = catalog['books']
+    reviews = [_review(client, catalog['users'][0], books[0]), _review(client, catalog['users'][1], books[0])]
+    assert len(_multiget(client, books, 'reviews')['items'][0]['reviews']) == 2
+    assert len(_multiget(client, reviews, resource='reviews')['items']) == 2
+    hits = _row_hits(app)
+    _multiget(client, reviews, resource='reviews')
+    assert _row_hits(app) == hits + 2
+
+    # The user's reviews go by database cascade, which names none of them
+    assert client.delete(f'/users/{catalog["users"][0]}').status_code == 204
+    assert len(_multiget(client, books, 'reviews')['items'][0]['reviews']) == 1
+    assert _multiget(client, reviews, resource='reviews')['missing'] == reviews[:1]
+    # And an author's books
+    author = db.session.get(Book, books[1]).author_id
+    assert client.delete(f'/authors/{author}').status_code == 204
+    gone = [book for book in books if db.session.get(Book, book) is None]
+    assert gone
+    assert _multiget(client, books)['missing'] == gone
+
+
+def test_purge_batches_invalidate_cached_rows(app, catalog):
+    # The batches alone, without the ORM delete that ends a purge
+    client = app.test_client()
+    books = catalog['books']
+    reviews = [_review(client, catalog['users'][1], book) for book in books]
+    assert all(item['reviews'] for item in _multiget(client, books, 'reviews')['items'])
+    assert len(_multiget(client, reviews, resource='reviews')['items']) == 3
+
+    user_reviews = select(Review.id).where(Review.user_id == catalog['users'][1]).order_by(Review.id)
+    assert purge._each_batch(db.engine, user_reviews, purge._delete_reviews, 1) == 3
+    assert all(not item['reviews'] and item['review_count'] == 0
+               for item in _multiget(client, books, 'reviews')['items'])
+    assert _multiget(client, reviews, resource='reviews')['missing'] == reviews
+
+    author = catalog['authors'][0]
+    authored = select(Book.id).where(Book.author_id == author).order_by(Book.id)
+    assert purge._each_batch(db.engine, authored, purge._delete_books, 1)
+    remaining = _multiget(client, books)
+    assert remaining['missing'] and all(book['author_id'] != author for book in remaining['items'])
@@ -0,0 +1,31 @@
+# Local imports
+from server.config import db
+from server.models import User
+from server.passwords import hash_password, verify_password
+
+
+def test_password_that_looks_hashed_is_still_hashed(app):
+    client = app.test_client()
+    response = client.post('/users', json={'username': 'mallory', 'email': 'm@example.com',
+                                           'password': 'scrypt:hunter2'})
+    assert response.status_code == 201
+
+    stored = db.session.get(User, response.get_json()['id']).password
+    assert stored != 'scrypt:hunter2'
+    assert verify_password(stored, 'scrypt:hunter2') == (True, False)
+    login = client.post('/login', json={'username': 'mallory', 'password': 'scrypt:hunter2'})
+    assert login.status_code == 200
+
+    # Changing it to another hash-like value hashes that too
+    client.patch(f'/users/{response.get_json()["id"]}', json={'password': 'pbkdf2:sha256:1$a$b'})
+    login = client.post('/login', json={'username': 'mallory', 'password': 'pbkdf2:sha256:1$a$b'})
+    assert login.status_code == 200
+
+
+def test_stored_hash_is_kept_as_given(app):
+    stored = hash_password('correct horse')
+    user = User(username='internal', email='i@example.com', password=stored)
+    db.session.add(user)
+    db.session.commit()
+    assert user.password == stored
+    assert verify_password(user.password, 'correct horse')[0]
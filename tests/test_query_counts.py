@@ -0,0 +1,43 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from server.commands import _count_queries, include_budgets
+from server.config import db
+from server.synthetic import generate
+
+
+@pytest.fixture
+def seeded(app):
+    # Enough rows that every page, and every collection it includes, is non-empty: an empty
+    # page skips the collection queries and would pass any budget
+    with db.engine.connect() as connection:
+        generate(connection, users=50, categories=5, authors=20, books=200, reviews=1000, collections=500,
+                 report=lambda line: None)
+    # Count the queries themselves, not cache hits
+    app.extensions.pop('response_cache')
+    return app.test_client()
+
+
+def test_include_combinations_cost_fixed_queries(seeded):
+    counts = {}
+    for url, budget in include_budgets(limit=50):
+        response = seeded.get(url)
+        assert response.status_code == 200, url
+        assert response.get_json(), url
+        counts[url] = (_count_queries(seeded, url)[1], budget)
+    assert {url: queries for url, (queries, budget) in counts.items() if queries != budget} == {}
+
+
+def test_shelf_of_10k_books_costs_fixed_queries(app):
+    # One reader with every one of 10k books on their shelf and 2k reviews
+    with db.engine.connect() as connection:
+        generate(connection, users=1, categories=5, authors=50, books=10000, reviews=2000, collections=10000,
+                 report=lambda line: None)
+    app.extensions.pop('response_cache')
+    client = app.test_client()
+
+    shelf = client.get('/users/1/shelf?limit=100').get_json()
+    assert sum(shelf['counts'].values()) == 10000
+    assert _count_queries(client, '/users/1/shelf?limit=100') == (200, 4)
+    assert _count_queries(client, '/users/1/shelf?section=read&limit=100') == (200, 2)
@@ -0,0 +1,7 @@
+# Local imports
+from server.commands import HOT_QUERIES, check_query_plans
+
+
+def test_hot_queries_use_indexes(app):
+    assert HOT_QUERIES
+    assert check_query_plans() == {}
@@ -0,0 +1,86 @@
+# Remote library imports
+import pytest
+from sqlalchemy import select
+
+# Local imports
+from server import purge
+from server.config import db
+from server.models import RATING_COLUMNS, Book, User, recompute_rating_aggregates
+
+_books = Book.__table__
+AGGREGATES = ('review_count', 'rating_sum', 'average_rating', *RATING_COLUMNS)
+
+
+def _aggregates(connection):
+    return {book_id: values for book_id, *values in connection.execute(
+        select(_books.c.id, *(_books.c[column] for column in AGGREGATES)))}
+
+
+def assert_aggregates_match_reviews():
+    # The stored aggregates against a recount, which is rolled back
+    db.session.remove()
+    with db.engine.connect() as connection:
+        stored = _aggregates(connection)
+        recompute_rating_aggregates(connection)
+        assert stored == _aggregates(connection)
+        connection.rollback()
+
+
+@pytest.fixture
+def client(app, catalog):
+    return app.test_client()
+
+
+def _review(client, user_id, book_id, rating):
+    response = client.post('/reviews', json={'rating': rating, 'content': 'Review', 'user_id': user_id,
+                                             'book_id': book_id})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_review_insert_rating_change_and_delete(client, catalog):
+    first, second = catalog['books'][:2]
+    review = _review(client, catalog['users'][0], first, 4)
+    _review(client, catalog['users'][1], first, 2)
+    assert_aggregates_match_reviews()
+    assert client.get(f'/books/{first}').get_json()['review_count'] == 2
+
+    assert client.patch(f'/reviews/{review}', json={'rating': 5}).status_code == 200
+    assert_aggregates_match_reviews()
+    # Moved to another book, with and without a new rating
+    assert client.patch(f'/reviews/{review}', json={'book_id': second}).status_code == 200
+    assert_aggregates_match_reviews()
+    assert client.patch(f'/reviews/{review}', json={'book_id': first, 'rating': 1}).status_code == 200
+    assert_aggregates_match_reviews()
+
+    assert client.delete(f'/reviews/{review}').status_code == 204
+    assert_aggregates_match_reviews()
+    assert client.get(f'/books/{first}').get_json()['average_rating'] == 2
+
+
+def test_cascaded_deletes(client, catalog):
+    first, second, third = catalog['books']
+    for user_id in catalog['users']:
+        for book_id, rating in ((first, 5), (second, 3), (third, 1)):
+            _review(client, user_id, book_id, rating)
+
+    # The database deletes the user's reviews by cascade
+    assert client.delete(f'/users/{catalog["users"][0]}').status_code == 204
+    assert_aggregates_match_reviews()
+    assert client.get(f'/books/{first}').get_json()['review_count'] == 1
+    # A book's reviews go with it, and an author's books with the author
+    assert client.delete(f'/books/{second}').status_code == 204
+    assert_aggregates_match_reviews()
+    author = db.session.get(Book, third).author_id
+    assert client.delete(f'/authors/{author}').status_code == 204
+    assert_aggregates_match_reviews()
+
+
+def test_purged_reviews(client, catalog):
+    for book_id in catalog['books']:
+        _review(client, catalog['users'][0], book_id, 4)
+        _review(client, catalog['users'][1], book_id, 2)
+    # In batches of two, outside the session
+    assert purge.purge(User, catalog['users'][0], batch_size=2) == 4
+    assert_aggregates_match_reviews()
+    assert client.get(f'/books/{catalog["books"][0]}').get_json()['average_rating'] == 2
@@ -0,0 +1,52 @@
+# Remote library imports
+from sqlalchemy import select
+
+# Local imports
+from server import recommendations
+from server.config import db
+from server.models import Book, BookSimilarity, UserBookCollection
+from server.synthetic import generate
+
+
+def _stored(connection):
+    return {(a, b): (shared, round(score, 12)) for a, b, shared, score in connection.execute(
+        select(BookSimilarity.book_id, BookSimilarity.similar_book_id, BookSimilarity.shared, BookSimilarity.score))}
+
+
+def _unshelved(user_id):
+    return db.session.execute(select(Book.id).where(Book.id.not_in(
+        select(UserBookCollection.book_id).where(UserBookCollection.user_id == user_id)))).scalar()
+
+
+def test_shelf_writes_keep_stored_pairs_as_a_rebuild_scores_them(app):
+    with db.engine.connect() as connection:
+        generate(connection, users=100, categories=5, authors=10, books=60, reviews=0, collections=1500,
+                 report=lambda line: None)
+    with db.engine.begin() as connection:
+        recommendations.rebuild_recommendations(connection)
+    client = app.test_client()
+    response = client.post('/collections', json={'user_id': 1, 'book_id': _unshelved(1), 'status': 'read'})
+    assert response.status_code == 201
+    entry = db.session.execute(select(UserBookCollection.id).where(UserBookCollection.user_id == 2)).scalar()
+    assert client.delete(f'/collections/{entry}').status_code == 204
+    db.session.remove()
+
+    with db.engine.begin() as connection:
+        written = _stored(connection)
+        recommendations.rebuild_recommendations(connection)
+        rebuilt = _stored(connection)
+    # Lists are not backfilled until a rebuild, but every pair kept is scored the same
+    assert written
+    assert {pair: value for pair, value in written.items() if pair in rebuilt and rebuilt[pair] != value} == {}
+
+
+def test_shelf_write_recounts_a_bounded_number_of_pairs(app, monkeypatch):
+    with db.engine.connect() as connection:
+        generate(connection, users=1, categories=5, authors=10, books=600, reviews=0, collections=500,
+                 report=lambda line: None)
+    probed = []
+    probe = recommendations._probe
+    monkeypatch.setattr(recommendations, '_probe', lambda n: probed.append(n) or probe(n))
+    response = app.test_client().post('/collections', json={'user_id': 1, 'book_id': _unshelved(1), 'status': 'read'})
+    assert response.status_code == 201
+    assert sum(probed) == recommendations.MAX_SHELF_PAIRS
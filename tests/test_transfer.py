@@ -0,0 +1,98 @@
+# Remote library imports
+import pytest
+from sqlalchemy import func, select
+
+# Local imports
+from server import transfer
+from server.app import create_app
+from server.config import db
+from server.models import Author, Book, Category, Review, User, UserBookCollection
+from server.synthetic import generate
+from server.transfer import TABLES, export_catalog, import_catalog
+
+
+@pytest.fixture
+def source(app):
+    with db.engine.connect() as connection:
+        generate(connection, users=20, categories=3, authors=6, books=60, reviews=240, collections=180,
+                 report=lambda line: None)
+    return db.engine
+
+
+@pytest.fixture
+def target(tmp_path, monkeypatch):
+    # A second database that already has rows in every table, so every id is shifted
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "target.db"}')
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        # Inside its own context: the CLI runner would reuse the source app's
+        assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0
+        users = [User(username=f'target{i}', email=f'target{i}@example.com', password='password') for i in (1, 2)]
+        category = Category(name='Target shelf')
+        author = Author(name='Target author')
+        books = [Book(title=f'Target {i}', author=author, category=category, creator=users[0]) for i in (1, 2, 3)]
+        db.session.add_all([*users, category, author, *books,
+                            Review(rating=3, content='Existing', user=users[1], book=books[2]),
+                            UserBookCollection(user=users[1], book=books[1], status='read')])
+        db.session.commit()
+        engine = db.engine
+        yield engine
+        db.session.remove()
+        engine.dispose()
+
+
+def _rows(engine, table, after=0):
+    with engine.connect() as connection:
+        return [row._asdict() for row in connection.execute(
+            select(table).where(table.c.id > after).order_by(table.c.id))]
+
+
+def _highest(engine):
+    with engine.connect() as connection:
+        return {name: connection.execute(select(func.max(table.c.id))).scalar() for name, table in TABLES.items()}
+
+
+def _shifted(row, table, offsets):
+    # The source row as it should land in the target
+    row = dict(row, id=row['id'] + offsets[table.name])
+    for column, parent in transfer._foreign_keys(table).items():
+        if row[column] is not None:
+            row[column] += offsets[parent]
+    return row
+
+
+@pytest.mark.parametrize('fmt, compress', [('ndjson', False), ('csv', True)])
+def test_round_trip_into_a_non_empty_database_with_a_resume(source, target, tmp_path, monkeypatch, fmt, compress):
+    directory = str(tmp_path / 'export')
+    with source.begin() as connection:
+        manifest = export_catalog(connection, directory, fmt, compress, report=lambda line: None)
+    assert {entry['table']: entry['rows'] for entry in manifest['tables']}['reviews'] == 240
+    offsets = _highest(target)
+    assert all(offsets.values())
+
+    # Fail partway through the reviews file, after two batches of 50 have committed
+    read_rows = transfer._read_rows
+
+    def interrupted(path, *args):
+        for number, row in enumerate(read_rows(path, *args)):
+            if 'reviews' in path and number == 120:
+                raise RuntimeError('connection lost')
+            yield row
+
+    monkeypatch.setattr(transfer, '_read_rows', interrupted)
+    with pytest.raises(RuntimeError):
+        import_catalog(target, directory, batch_size=50, report=lambda line: None)
+    assert len(_rows(target, TABLES['reviews'], offsets['reviews'])) == 100
+
+    monkeypatch.setattr(transfer, '_read_rows', read_rows)
+    lines = []
+    inserted = import_catalog(target, directory, batch_size=50, report=lines.append)
+    assert inserted == {'reviews': 140, 'user_book_collections': 180}
+    assert any('resumed after id 100' in line for line in lines)
+
+    for name, table in TABLES.items():
+        expected = [_shifted(row, table, offsets) for row in _rows(source, table)]
+        assert _rows(target, table, offsets[name]) == expected, name
+    # The target's own rows are untouched, and a third run has nothing left to do
+    assert len(_rows(target, TABLES['books'])) == 3 + 60
+    assert import_catalog(target, directory, report=lambda line: None) == {}
@@ -0,0 +1,28 @@
+# Local imports
+from server import trending
+from server.config import db
+from server.models import Book, Review, TrendingPeriod
+from server.serializers import serializer_for
+
+
+def test_trending_lists_recent_activity(app, catalog):
+    db.session.add(Review(rating=5, content='Great', user_id=catalog['users'][0], book_id=catalog['books'][0]))
+    db.session.commit()
+    response = app.test_client().get('/books/trending?window=24h')
+    assert response.status_code == 200
+    assert [book['id'] for book in response.get_json()] == [catalog['books'][0]]
+
+
+def test_trending_long_after_the_last_write_is_empty(app, catalog, monkeypatch):
+    db.session.add(Review(rating=5, content='Great', user_id=catalog['users'][0], book_id=catalog['books'][0]))
+    db.session.commit()
+    epoch = db.session.get(TrendingPeriod, '24h').epoch
+    view = serializer_for(Book)
+    # Far enough that the stored-units floor would overflow a float
+    far = epoch + 2000 * trending.half_life('24h')
+    assert db.session.execute(trending.trending_books_query(view, '24h', epoch, now=far)).all() == []
+
+    monkeypatch.setattr(trending.time, 'time', lambda: far)
+    response = app.test_client().get('/books/trending?window=24h')
+    assert response.status_code == 200
+    assert response.get_json() == []